@@ -0,0 +1,150 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from skyfield.api import load, wgs84, EarthSatellite
+from pass_kernel import PASS_DTYPE, StationSet, station_mask, find_passes
+from pass_cache import SAME_TIME_DAYS
+
+#One row per pass of one satellite over one station. sat and station index the matrix's ids and stations.
+ACCESS_DTYPE = np.dtype([('sat', 'i4'), ('station', 'i4')] + [(name, PASS_DTYPE[name]) for name in PASS_DTYPE.names])
+#Below this many (satellite, station) pairs, starting worker processes costs more than it saves
+PARALLEL_MIN_PAIRS = 64
+
+# Every pass of every satellite over every station in one window, as one array of ACCESS_DTYPE,
+# sorted by satellite, then station, then AOS.
+class AccessMatrix():
+    def __init__(self, ids, tles, stations, start_tt, end_tt, intervals):
+        self.ids = ids
+        self.tles = tles #The TLE each satellite was computed from, in the same order as ids
+        self.stations = stations #Station dictionaries, as in the configuration's "Groundstations"
+        self.start_tt = start_tt
+        self.end_tt = end_tt
+        self.intervals = intervals
+    def station_index(self, name):
+        return [gs['Name'] for gs in self.stations].index(name)
+    def for_pair(self, sat_id, station_name):
+        intervals = self.intervals
+        return intervals[(intervals['sat'] == self.ids.index(sat_id)) & (intervals['station'] == self.station_index(station_name))]
+    #Number of passes of each satellite over each station, shaped [satellite, station]
+    def pass_counts(self):
+        counts = np.zeros((len(self.ids), len(self.stations)), dtype=int)
+        np.add.at(counts, (self.intervals['sat'], self.intervals['station']), 1)
+        return counts
+    #Seconds of access of each satellite over each station, shaped [satellite, station]
+    def access_seconds(self):
+        seconds = np.zeros((len(self.ids), len(self.stations)))
+        durations = (self.intervals['los'] - self.intervals['aos']) * 86400
+        np.add.at(seconds, (self.intervals['sat'], self.intervals['station']), durations)
+        return seconds
+    #Rows of each satellite are intervals[bounds[i]:bounds[i+1]]
+    def satellite_bounds(self):
+        return np.searchsorted(self.intervals['sat'], np.arange(len(self.ids) + 1))
+
+    #The same matrix cut down to [start_tt, end_tt], which must lie inside it. Passes that end before the
+    #start are dropped, and ones that straddle it are cut off there (keeping the whole pass's max_el).
+    def window(self, start_tt, end_tt):
+        intervals = self.intervals[(self.intervals['los'] > start_tt) & (self.intervals['aos'] < end_tt)].copy()
+        intervals['open_start'] |= intervals['aos'] < start_tt
+        intervals['open_end'] |= intervals['los'] > end_tt
+        intervals['tca'] = np.clip(intervals['tca'], start_tt, end_tt)
+        intervals['aos'] = np.maximum(intervals['aos'], start_tt)
+        intervals['los'] = np.minimum(intervals['los'], end_tt)
+        return AccessMatrix(self.ids, self.tles, self.stations, start_tt, end_tt, intervals)
+
+    #This matrix followed by later, a matrix of the same satellites and stations starting where this one
+    #ends. A pass cut off at the seam on both sides becomes one row again.
+    def joined(self, later):
+        earlier_rows = np.nonzero(self.intervals['open_end'] & (np.abs(self.intervals['los'] - self.end_tt) < SAME_TIME_DAYS))[0]
+        later_rows = np.nonzero(later.intervals['open_start'] & (np.abs(later.intervals['aos'] - later.start_tt) < SAME_TIME_DAYS))[0]
+        pair_key = lambda rows: rows['sat'] * len(self.stations) + rows['station']
+        keys, earlier_index, later_index = np.intersect1d(pair_key(self.intervals[earlier_rows]), pair_key(later.intervals[later_rows]),
+                                                          return_indices=True)
+        earlier_rows, later_rows = earlier_rows[earlier_index], later_rows[later_index]
+        intervals = self.intervals.copy()
+        seam = later.intervals[later_rows]
+        intervals['los'][earlier_rows] = seam['los']
+        intervals['open_end'][earlier_rows] = seam['open_end']
+        higher = seam['max_el'] > intervals['max_el'][earlier_rows]
+        intervals['tca'][earlier_rows[higher]] = seam['tca'][higher]
+        intervals['max_el'][earlier_rows[higher]] = seam['max_el'][higher]
+        intervals = np.concatenate([intervals, np.delete(later.intervals, later_rows)])
+        intervals = intervals[np.lexsort((intervals['aos'], intervals['station'], intervals['sat']))]
+        return AccessMatrix(self.ids, self.tles, self.stations, self.start_tt, later.end_tt, intervals)
+
+def skyfield_station(gs):
+    return wgs84.latlon(gs['Lat'], gs['Lon'])
+
+#Pass rows of one satellite over every station. Runs in a worker process (or in this one, for small matrices).
+#All the stations are searched together, so the satellite is only propagated once for all of them.
+def satellite_access(sat_index, tle, stations, start_tt, end_tt, ts = None):
+    ts = worker_timescale() if ts is None else ts
+    satellite = EarthSatellite(*tle, ts=ts)
+    station_set = StationSet([(skyfield_station(gs), station_mask(gs)) for gs in stations])
+    rows = []
+    for station_index, passes in enumerate(find_passes(satellite.model, ts, station_set, start_tt, end_tt)):
+        pair_rows = np.zeros(len(passes), dtype=ACCESS_DTYPE)
+        pair_rows['sat'] = sat_index
+        pair_rows['station'] = station_index
+        for name in PASS_DTYPE.names:
+            pair_rows[name] = passes[name]
+        rows.append(pair_rows)
+    return np.concatenate(rows) if len(rows) > 0 else np.zeros(0, dtype=ACCESS_DTYPE)
+
+#Each worker process loads its own timescale once
+_worker_timescale = None
+def worker_timescale():
+    global _worker_timescale
+    if _worker_timescale is None:
+        _worker_timescale = load.timescale()
+    return _worker_timescale
+
+#Pass rows of one satellite over every station, read from a PassCache and cut off at the window's edges
+def cached_satellite_access(pass_cache, sat_index, tle, stations, start, end):
+    rows = []
+    for station_index, gs in enumerate(stations):
+        passes = pass_cache.passes(tle, skyfield_station(gs), start, end, station_mask(gs))
+        pair_rows = np.zeros(len(passes), dtype=ACCESS_DTYPE)
+        pair_rows['sat'] = sat_index
+        pair_rows['station'] = station_index
+        for name in PASS_DTYPE.names:
+            pair_rows[name] = passes[name]
+        pair_rows['open_start'] |= pair_rows['aos'] < start.tt
+        pair_rows['open_end'] |= pair_rows['los'] > end.tt
+        pair_rows['aos'] = np.maximum(pair_rows['aos'], start.tt)
+        pair_rows['los'] = np.minimum(pair_rows['los'], end.tt)
+        rows.append(pair_rows)
+    return np.concatenate(rows) if len(rows) > 0 else np.zeros(0, dtype=ACCESS_DTYPE)
+
+#All passes of every satellite in tles ({ID: TLE}) over every station dictionary in stations, between
+#Skyfield Times start and end. Large matrices are split by satellite across a pool of processes.
+#Small ones are computed here, through pass_cache if one is given, so a sliding window stays cheap.
+#max_workers = 1 always computes here: the GUI's worker threads have to, since forking the multithreaded
+#Qt process for a pool can deadlock the children, and the pool would skip the shared pass cache.
+def compute_access_matrix(tles, stations, start, end, max_workers = None, pass_cache = None):
+    ids = list(tles.keys())
+    jobs = [(i, list(tles[sat_id]), stations, start.tt, end.tt) for i, sat_id in enumerate(ids)]
+    if max_workers == 1 or len(ids) * len(stations) < PARALLEL_MIN_PAIRS:
+        if pass_cache is not None:
+            results = [cached_satellite_access(pass_cache, i, tles[sat_id], stations, start, end) for i, sat_id in enumerate(ids)]
+        else:
+            results = [satellite_access(*job, ts=start.ts) for job in jobs]
+    else:
+        max_workers = os.cpu_count() if max_workers is None else max_workers
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(satellite_access, *zip(*jobs), chunksize=max(1, len(jobs) // (4 * max_workers))))
+    intervals = np.concatenate(results) if len(results) > 0 else np.zeros(0, dtype=ACCESS_DTYPE)
+    return AccessMatrix(ids, [tles[sat_id] for sat_id in ids], stations, start.tt, end.tt, intervals)
+
+#The access matrix for [start, end], reusing matrix, an earlier result for the same satellites and
+#stations. Only the time past matrix's end is computed. Anything else (a jump back in time, past the
+#end, new TLEs...) and the whole window is computed again.
+def slide_access_matrix(matrix, tles, stations, start, end, max_workers = None, pass_cache = None):
+    ids = list(tles.keys())
+    reusable = (matrix is not None and matrix.ids == ids and matrix.tles == [tles[sat_id] for sat_id in ids]
+                and matrix.stations == stations and matrix.start_tt <= start.tt <= matrix.end_tt <= end.tt)
+    if not reusable:
+        return compute_access_matrix(tles, stations, start, end, max_workers, pass_cache)
+    if end.tt > matrix.end_tt:
+        later = compute_access_matrix(tles, stations, start.ts.tt_jd(matrix.end_tt), end, max_workers, pass_cache)
+        matrix = matrix.joined(later)
+    return matrix.window(start.tt, end.tt)
@@ -0,0 +1,40 @@
+# Times the full access matrix (every pass of every satellite over every station) computed in this
+# process, against the same matrix split by satellite over a pool of worker processes.
+# Usage: python benchmarks/bench_access_matrix.py [satellites] [stations] [days] [worker processes]
+import os
+import sys
+import time
+import numpy as np
+from skyfield.api import load
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+from access_matrix import compute_access_matrix
+from synthetic import synthetic_tles, synthetic_stations
+
+def timed(tles, stations, start, end, max_workers):
+    begin = time.perf_counter()
+    matrix = compute_access_matrix(tles, stations, start, end, max_workers)
+    return matrix, time.perf_counter() - begin
+
+if __name__ == "__main__":
+    sat_count = int(sys.argv[1]) if len(sys.argv) > 1 else 150
+    station_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    days = float(sys.argv[3]) if len(sys.argv) > 3 else 1
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else os.cpu_count()
+    ts = load.timescale()
+    tles = synthetic_tles(sat_count)
+    stations = synthetic_stations(station_count)
+    start = ts.now()
+    end = start + days
+
+    serial, serial_time = timed(tles, stations, start, end, 1)
+    pooled, pooled_time = timed(tles, stations, start, end, workers)
+
+    print(f"{sat_count} satellites x {station_count} stations over {days} days: {len(serial.intervals)} passes")
+    print(f"  one process: {serial_time:.2f} s")
+    print(f"  {workers} worker processes: {pooled_time:.2f} s ({serial_time / pooled_time:.1f}x faster)")
+    same = len(serial.intervals) == len(pooled.intervals) and all(
+        np.array_equal(serial.intervals[name], pooled.intervals[name]) for name in serial.intervals.dtype.names)
+    print(f"  identical intervals: {same}")
+    counts = serial.pass_counts()
+    print(f"  passes per pair: min {counts.min()}, mean {counts.mean():.1f}, max {counts.max()}")
@@ -0,0 +1,70 @@
+# Plans contacts for a synthetic day of passes (many satellites over many stations, about 10000 passes
+# by default) with contact_plan.schedule_contacts, against the same greedy plan made by checking each
+# pass against every contact planned so far. Checks the two plans are the same and conflict-free.
+# Usage: python benchmarks/bench_contact_plan.py [satellites] [stations] [antennas per station] [worker processes]
+import os
+import sys
+import time
+import numpy as np
+from skyfield.api import load
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+from access_matrix import compute_access_matrix
+from contact_plan import CONTACT_DTYPE, DAY_S, ContactPlan, longest_gap, schedule_contacts
+from synthetic import synthetic_tles, synthetic_stations
+
+#The same plan as schedule_contacts (without committed contacts), looking through every planned contact
+#for the ones in the way of each pass
+def naive_schedule(matrix, antennas, priorities, min_duration_s, turnaround_s):
+    min_duration, turnaround = min_duration_s / DAY_S, turnaround_s / DAY_S
+    intervals = matrix.intervals
+    order = np.lexsort((intervals['aos'], intervals['los'], -priorities[intervals['sat']]))
+    contacts = []
+    for row in order:
+        sat, station, aos, los = intervals['sat'][row], intervals['station'][row], intervals['aos'][row], intervals['los'][row]
+        if los - aos < min_duration:
+            continue
+        sat_busy = [(c[3], c[4]) for c in contacts if c[0] == sat and c[3] < los and c[4] > aos]
+        best = None
+        for antenna in range(antennas[station]):
+            mine = [c for c in contacts if c[1] == station and c[2] == antenna]
+            busy = sat_busy + [(c[3] - turnaround, c[4] + turnaround) for c in mine if c[3] - turnaround < los and c[4] + turnaround > aos]
+            start, end = (aos, los) if len(busy) == 0 else longest_gap(aos, los, busy)
+            free_since = max([c[4] for c in mine if c[4] <= start], default=-np.inf)
+            if best is None or (end - start, free_since) > best[0]:
+                best = ((end - start, free_since), antenna, start, end)
+        if best[3] - best[2] >= min_duration:
+            contacts.append((sat, station, best[1], best[2], best[3], aos, los, intervals['max_el'][row]))
+    contacts = np.array(contacts, dtype=CONTACT_DTYPE)
+    return contacts[np.lexsort((contacts['start'], contacts['antenna'], contacts['station']))]
+
+if __name__ == "__main__":
+    sat_count = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    station_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    antenna_count = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else os.cpu_count()
+    ts = load.timescale()
+    tles = synthetic_tles(sat_count)
+    stations = synthetic_stations(station_count)
+    start = ts.now()
+    matrix = compute_access_matrix(tles, stations, start, start + 1, workers)
+    antennas = [antenna_count] * station_count
+    #A few satellites matter more than the rest
+    priorities = np.where(np.arange(sat_count) % 10 == 0, 3.0, 1.0)
+    print(f"{sat_count} satellites x {station_count} stations ({antenna_count} antennas each) over one day: {len(matrix.intervals)} passes")
+
+    begin = time.perf_counter()
+    plan = schedule_contacts(matrix, antennas, priorities, 60, 30)
+    plan_time = time.perf_counter() - begin
+    print(f"  contact_plan: {plan_time:.3f} s for {len(plan.contacts)} contacts, "
+          f"{len(plan.unscheduled)} passes unscheduled, {plan.conflicts()} conflicts")
+
+    begin = time.perf_counter()
+    naive = naive_schedule(matrix, antennas, priorities, 60, 30)
+    naive_time = time.perf_counter() - begin
+    print(f"  checking every contact: {naive_time:.3f} s ({naive_time / plan_time:.1f}x slower)")
+    naive_plan = ContactPlan(matrix, antennas, 30, naive, None)
+    same = len(naive) == len(plan.contacts) and all(np.array_equal(naive[name], plan.contacts[name]) for name in CONTACT_DTYPE.names)
+    print(f"  identical plans: {same}, conflicts {naive_plan.conflicts()}")
+    seconds = plan.satellite_seconds()
+    print(f"  contact time per satellite: min {seconds.min():.0f} s, mean {seconds.mean():.0f} s, max {seconds.max():.0f} s")
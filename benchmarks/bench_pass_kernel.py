@@ -0,0 +1,66 @@
+# Compares the pass kernel (pass_kernel.find_passes) against Skyfield's find_events, which the pass
+# searches used before, on the bundled TLEs: how long each takes, and how far apart their rises,
+# culminations and sets are.
+# Usage: python benchmarks/bench_pass_kernel.py [days] [number of stations] [elevation mask in degrees]
+import os
+import sys
+import time
+import numpy as np
+from skyfield.api import load, wgs84, EarthSatellite
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+from pass_kernel import StationSet, find_passes
+from synthetic import read_bundled_tle, synthetic_stations
+
+#Largest gap (s) between each time in found and the nearest time in reference
+def worst_gap_s(found, reference):
+    if len(found) == 0 or len(reference) == 0:
+        return 0
+    return np.abs(found[:, None] - reference[None, :]).min(axis=1).max() * 86400
+
+def compare(ts, ID_number, stations, t0, t1, mask_deg):
+    satellite = EarthSatellite(*read_bundled_tle(ID_number), ts=ts)
+    skyfield_stations = [wgs84.latlon(gs['Lat'], gs['Lon']) for gs in stations]
+
+    begin = time.perf_counter()
+    all_events = [satellite.find_events(gs, t0, t1, altitude_degrees=mask_deg) for gs in skyfield_stations]
+    events_time = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    all_passes = find_passes(satellite.model, ts, StationSet([(gs, mask_deg) for gs in skyfield_stations]), t0.tt, t1.tt)
+    kernel_time = time.perf_counter() - begin
+
+    gaps = {"AOS": 0, "TCA": 0, "LOS": 0}
+    worst_el = 0
+    missing = 0
+    for gs, (times, events), passes in zip(skyfield_stations, all_events, all_passes):
+        rises, culminations, sets = times.tt[events == 0], times[events == 1], times.tt[events == 2]
+        missing += abs(np.count_nonzero(~passes['open_start']) - len(rises))
+        missing += abs(np.count_nonzero(~passes['open_end']) - len(sets))
+        gaps["AOS"] = max(gaps["AOS"], worst_gap_s(passes['aos'][~passes['open_start']], rises))
+        gaps["LOS"] = max(gaps["LOS"], worst_gap_s(passes['los'][~passes['open_end']], sets))
+        whole = ~passes['open_start'] & ~passes['open_end']
+        if len(culminations) > 0:
+            gaps["TCA"] = max(gaps["TCA"], worst_gap_s(passes['tca'][whole], culminations.tt))
+            culmination_els = (satellite - gs).at(culminations).altaz()[0].degrees
+            for tca, max_el in zip(passes['tca'][whole], passes['max_el'][whole]):
+                worst_el = max(worst_el, abs(max_el - culmination_els[np.argmin(np.abs(culminations.tt - tca))]))
+
+    pass_count = sum(len(passes) for passes in all_passes)
+    print(f"{ID_number}: {pass_count} passes over {len(stations)} stations")
+    print(f"  find_events: {events_time:.3f} s")
+    print(f"  pass kernel: {kernel_time:.3f} s ({events_time / kernel_time:.1f}x faster)")
+    print("  largest differences: " + ", ".join(f"{name} {gap:.3f} s" for name, gap in gaps.items()) +
+          f", max elevation {worst_el:.2e} deg, unmatched rises/sets {missing}")
+
+if __name__ == "__main__":
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else 7
+    station_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    mask_deg = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+    ts = load.timescale()
+    stations = synthetic_stations(station_count)
+    t0 = ts.now()
+    t1 = t0 + days
+    #find_events only finds times to within half a second, so differences up to that are expected
+    for ID_number in 25544, 20580, 51850:
+        compare(ts, ID_number, stations, t0, t1, mask_deg)
@@ -0,0 +1,48 @@
+# Compares propagating a large constellation one satellite at a time through Skyfield (how the
+# modules used to do it) against one PropagationEngine call over the whole set.
+# Usage: python benchmarks/bench_propagation.py [number of satellites] [number of times]
+import os
+import sys
+import time
+import numpy as np
+from skyfield.api import wgs84
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+from resources import ResourceRegistry
+from propagation import PropagationEngine
+from synthetic import synthetic_tles
+
+def compare(resources, engine, tles, times):
+    begin = time.perf_counter()
+    per_satellite = []
+    for tle in tles.values():
+        lat, lon = wgs84.latlon_of(resources.satellite(tle).at(times))
+        per_satellite.append(lat.degrees)
+    loop_time = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    result = engine.propagate(tles, times)
+    engine_time = time.perf_counter() - begin
+
+    worst_error = np.abs(np.array(per_satellite).reshape(result.lat_deg.shape) - result.lat_deg).max()
+    print(f"{len(tles)} satellites x {len(result.t)} times")
+    print(f"  per-satellite Skyfield: {loop_time:.3f} s")
+    print(f"  PropagationEngine: {engine_time:.3f} s ({loop_time / engine_time:.1f}x faster)")
+    print(f"  largest latitude difference: {worst_error:.2e} deg")
+
+if __name__ == "__main__":
+    sat_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    time_count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    resources = ResourceRegistry()
+    engine = PropagationEngine(resources)
+    ts = resources.timescale
+    tles = synthetic_tles(sat_count)
+    start = ts.now()
+    #Build the satellites and the SatrecArray up front, as they are cached between ticks in the app
+    for tle in tles.values():
+        resources.satellite(tle)
+    engine.satrec_array(list(tles.values()))
+    #One time: the per-tick "where is everyone now" case
+    compare(resources, engine, tles, ts.tt_jd([start.tt]))
+    #A grid of times: ground tracks, eclipse timelines
+    compare(resources, engine, tles, ts.tt_jd(np.linspace(start.tt, start.tt + 0.1, time_count)))
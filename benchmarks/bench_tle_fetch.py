@@ -0,0 +1,68 @@
+# Compares fetching TLEs one at a time (the old load_config path, one session per satellite)
+# against load_tle.get_tles, which fetches them concurrently over one pooled session.
+# Runs against a local stand-in for Celestrak, so no network access is needed.
+# Usage: python benchmarks/bench_tle_fetch.py [number of satellites] [server latency in ms]
+import os
+import sys
+import time
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import load_tle
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+with open(os.path.join(REPO_DIR, "25544.tle")) as f:
+    TEMPLATE_TLE = f.read().split("\n")[:2]
+
+#Answers gp.php?CATNR=<id> like Celestrak does: a name line and two TLE lines, CRLF separated.
+#Every answer is the ISS TLE with the requested catalog number patched in.
+class StandInCelestrak(BaseHTTPRequestHandler):
+    latency = 0.0
+    def do_GET(self):
+        catnr = parse_qs(urlparse(self.path).query)["CATNR"][0].zfill(5)
+        lines = [line[:2] + catnr + line[7:] for line in TEMPLATE_TLE]
+        body = ("SAT " + catnr + "\r\n" + "\r\n".join(lines) + "\r\n").encode()
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, format, *args):
+        pass
+
+def start_server(latency):
+    StandInCelestrak.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInCelestrak)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:" + str(server.server_address[1]) + "/gp.php"
+
+def time_in_empty_dir(function):
+    start_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            start = time.perf_counter()
+            result = function()
+            return time.perf_counter() - start, result
+        finally:
+            os.chdir(start_dir)
+
+if __name__ == "__main__":
+    sat_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    server, url = start_server(latency_ms / 1000)
+    IDs = list(range(10000, 10000 + sat_count))
+
+    serial_time, serial_tles = time_in_empty_dir(lambda: {ID: load_tle.web_retrieve_tle(ID, url) for ID in IDs})
+    bulk_time, bulk_tles = time_in_empty_dir(lambda: load_tle.get_tles(IDs, base_url=url))
+    server.shutdown()
+
+    assert serial_tles == bulk_tles, "Bulk fetch returned different TLEs than the one-at-a-time path"
+    print(f"{sat_count} satellites, {latency_ms:.0f} ms simulated server latency")
+    print(f"  one at a time: {serial_time:.3f} s")
+    print(f"  get_tles ({load_tle.MAX_FETCH_WORKERS} workers): {bulk_time:.3f} s")
+    print(f"  speedup: {serial_time / bulk_time:.1f}x")
@@ -0,0 +1,36 @@
+# Helpers for building large synthetic scenarios for the benchmarks: many satellites made by
+# spreading copies of a real TLE around in RAAN and mean anomaly, and many ground stations.
+import os
+import numpy as np
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+
+def read_bundled_tle(ID_number):
+    with open(os.path.join(REPO_DIR, str(ID_number) + ".tle")) as f:
+        return f.read().split("\n")[:2]
+
+#Put a TLE's checksum digit back in place after editing the line
+def with_checksum(line):
+    checksum = sum(int(c) if c.isdigit() else (1 if c == "-" else 0) for c in line[:68]) % 10
+    return line[:68] + str(checksum)
+
+#Returns {ID: TLE} of sat_count satellites based on the given TLE, spread in RAAN and mean anomaly
+def synthetic_tles(sat_count, base_ID = 25544, seed = 0):
+    line1, line2 = read_bundled_tle(base_ID)
+    rng = np.random.default_rng(seed)
+    tles = {}
+    for i in range(sat_count):
+        ID = 70000 + i
+        raan = rng.uniform(0, 360)
+        mean_anomaly = rng.uniform(0, 360)
+        new_line1 = line1[:2] + str(ID).zfill(5) + line1[7:]
+        new_line2 = line2[:2] + str(ID).zfill(5) + line2[7:17] + f"{raan:8.4f}" + line2[25:43] + f"{mean_anomaly:8.4f}" + line2[51:]
+        tles[ID] = [with_checksum(new_line1), with_checksum(new_line2)]
+    return tles
+
+#Returns a list of station dictionaries, in the same form as the "Groundstations" config entry
+def synthetic_stations(station_count, seed = 0):
+    rng = np.random.default_rng(seed)
+    lats = np.degrees(np.arcsin(rng.uniform(-0.9, 0.9, station_count)))
+    lons = rng.uniform(-180, 180, station_count)
+    return [{"Name": "GS" + str(i), "Lat": float(lat), "Lon": float(lon)} for i, (lat, lon) in enumerate(zip(lats, lons))]
@@ -0,0 +1,165 @@
+import bisect
+import numpy as np
+from access_matrix import slide_access_matrix
+
+#One row per planned contact: a satellite on one antenna of one station, for all of a pass or part of it.
+#sat and station index the plan's AccessMatrix. aos, los and max_el are those of the whole pass.
+CONTACT_DTYPE = np.dtype([('sat', 'i4'), ('station', 'i4'), ('antenna', 'i4'), ('start', 'f8'), ('end', 'f8'),
+                          ('aos', 'f8'), ('los', 'f8'), ('max_el', 'f8')])
+#Contacts shorter than this (s) aren't worth setting up, unless the plan is given another minimum
+DEFAULT_MIN_DURATION_S = 60
+DAY_S = 86400
+
+# The contacts on one resource (one antenna, or one satellite, which talks to one station at a time).
+# They never overlap, so sorted by start they are also sorted by end, and the ones in the way of a new
+# contact are found by bisection instead of by looking at all of them.
+class Timeline():
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+    #(start, end) of the contacts overlapping [start, end], each widened by margin on both sides
+    def overlapping(self, start, end, margin = 0):
+        i = bisect.bisect_right(self.ends, start - margin)
+        busy = []
+        while i < len(self.starts) and self.starts[i] - margin < end:
+            busy.append((self.starts[i] - margin, self.ends[i] + margin))
+            i += 1
+        return busy
+    #End of the last contact that is over by start
+    def free_since(self, start):
+        i = bisect.bisect_right(self.ends, start)
+        return self.ends[i-1] if i > 0 else -np.inf
+    def add(self, start, end):
+        i = bisect.bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+
+#Longest stretch of [start, end] not covered by any of the busy (start, end) intervals
+def longest_gap(start, end, busy):
+    best_start, best_end = start, start
+    cursor = start
+    for busy_start, busy_end in sorted(busy):
+        if min(busy_start, end) - cursor > best_end - best_start:
+            best_start, best_end = cursor, min(busy_start, end)
+        cursor = max(cursor, busy_end)
+        if cursor >= end:
+            break
+    if end - cursor > best_end - best_start:
+        best_start, best_end = cursor, end
+    return best_start, best_end
+
+# A conflict-free assignment of passes to ground station antennas
+class ContactPlan():
+    def __init__(self, matrix, antennas, turnaround_s, contacts, unscheduled):
+        self.matrix = matrix #The AccessMatrix the passes came from
+        self.antennas = antennas #Number of antennas at each of matrix.stations
+        self.turnaround_s = turnaround_s
+        self.contacts = contacts #Array of CONTACT_DTYPE, sorted by station, antenna, then start
+        self.unscheduled = unscheduled #Rows of matrix.intervals that got no contact at all
+    #Seconds of contact of each satellite, in the order of matrix.ids
+    def satellite_seconds(self):
+        seconds = np.zeros(len(self.matrix.ids))
+        np.add.at(seconds, self.contacts['sat'], (self.contacts['end'] - self.contacts['start']) * DAY_S)
+        return seconds
+    #Number of contacts that overlap an earlier one on the same antenna (closer than the turnaround time)
+    #or of the same satellite. Always 0, unless something is wrong with the scheduler.
+    def conflicts(self):
+        count = 0
+        turnaround = self.turnaround_s / DAY_S
+        for keys, margin in ((('station', 'antenna'), turnaround), (('sat',), 0)):
+            contacts = self.contacts[np.lexsort([self.contacts['start']] + [self.contacts[key] for key in reversed(keys)])]
+            same = np.all([contacts[key][1:] == contacts[key][:-1] for key in keys], axis=0)
+            #Sorted by start, any overlap shows up between neighbours
+            count += np.count_nonzero(same & (contacts['start'][1:] < contacts['end'][:-1] + margin - 1e-9))
+        return count
+
+#(station, antenna) of every antenna, given the number at each station, in station order
+def antenna_rows(antennas):
+    return [(station, antenna) for station, count in enumerate(antennas) for antenna in range(count)]
+#Antennas at each station: its "Antennas" entry in the configuration, or 1
+def station_antennas(stations):
+    return [int(gs.get("Antennas", 1)) for gs in stations]
+#Priority of each satellite from a {"ID": priority} dictionary (JSON keys are strings). Unlisted ones get 1.
+def satellite_priorities(ids, priorities):
+    return np.array([float(priorities.get(str(sat_id), 1)) for sat_id in ids])
+
+#Assign the passes of an AccessMatrix to antennas, with no antenna or satellite in two contacts at once.
+#antennas is the number at each station, priorities a weight per satellite (higher goes first).
+#Passes are taken by priority, and within a priority by earliest LOS, which for a single priority is the
+#classic interval-graph greedy that fits the most passes onto the antennas. Each goes on the antenna that
+#has been free the shortest time (best fit), keeping long gaps open for later passes. A pass that is partly
+#taken is cut down to its longest free stretch, if that is at least min_duration_s long. Antennas need
+#turnaround_s between contacts. committed contacts (already under way...) are kept as they are.
+def schedule_contacts(matrix, antennas, priorities, min_duration_s = DEFAULT_MIN_DURATION_S, turnaround_s = 0, committed = None):
+    committed = np.zeros(0, dtype=CONTACT_DTYPE) if committed is None else committed
+    min_duration = min_duration_s / DAY_S
+    turnaround = turnaround_s / DAY_S
+    antenna_lines = [[Timeline() for antenna in range(count)] for count in antennas]
+    sat_lines = [Timeline() for sat_id in matrix.ids]
+    for contact in committed:
+        antenna_lines[contact['station']][contact['antenna']].add(contact['start'], contact['end'])
+        sat_lines[contact['sat']].add(contact['start'], contact['end'])
+
+    intervals = matrix.intervals
+    order = np.lexsort((intervals['aos'], intervals['los'], -priorities[intervals['sat']]))
+    order = order[(intervals['los'][order] - intervals['aos'][order]) >= min_duration]
+    #A pass that already has a committed contact isn't planned again
+    if len(committed) > 0:
+        held = np.zeros(len(intervals), dtype=bool)
+        for contact in committed:
+            held |= ((intervals['sat'] == contact['sat']) & (intervals['station'] == contact['station'])
+                     & (intervals['aos'] <= contact['end']) & (intervals['los'] >= contact['start']))
+        order = order[~held[order]]
+
+    contacts = []
+    scheduled = np.zeros(len(intervals), dtype=bool)
+    for row in order:
+        sat, station, aos, los = intervals['sat'][row], intervals['station'][row], intervals['aos'][row], intervals['los'][row]
+        sat_busy = sat_lines[sat].overlapping(aos, los)
+        best = None
+        for antenna, line in enumerate(antenna_lines[station]):
+            busy = sat_busy + line.overlapping(aos, los, turnaround)
+            start, end = (aos, los) if len(busy) == 0 else longest_gap(aos, los, busy)
+            #Longest contact first, then the antenna that freed up last
+            rank = (end - start, line.free_since(start))
+            if best is None or rank > best[0]:
+                best = (rank, antenna, start, end)
+        if best is None or best[3] - best[2] < min_duration:
+            continue
+        rank, antenna, start, end = best
+        antenna_lines[station][antenna].add(start, end)
+        sat_lines[sat].add(start, end)
+        contacts.append((sat, station, antenna, start, end, aos, los, intervals['max_el'][row]))
+        scheduled[row] = True
+
+    contacts = np.concatenate([committed, np.array(contacts, dtype=CONTACT_DTYPE)])
+    contacts = contacts[np.lexsort((contacts['start'], contacts['antenna'], contacts['station']))]
+    return ContactPlan(matrix, list(antennas), turnaround_s, contacts, np.nonzero(~scheduled)[0])
+
+#The contact plan for [start, end], made from the access matrix slid along from plan's (see
+#slide_access_matrix). Contacts of the old plan that are under way at start are kept, if the
+#satellites and stations are the same.
+def slide_contact_plan(plan, tles, stations, start, end, priorities, min_duration_s = DEFAULT_MIN_DURATION_S,
+                       turnaround_s = 0, max_workers = None, pass_cache = None):
+    old_matrix = plan.matrix if plan is not None else None
+    matrix = slide_access_matrix(old_matrix, tles, stations, start, end, max_workers, pass_cache)
+    committed = None
+    if old_matrix is not None and old_matrix.ids == matrix.ids and old_matrix.stations == matrix.stations:
+        contacts = plan.contacts
+        committed = contacts[(contacts['start'] <= start.tt) & (contacts['end'] > start.tt)].copy()
+        committed['start'] = np.maximum(committed['start'], start.tt)
+        committed['end'] = np.minimum(committed['end'], end.tt)
+    antennas = station_antennas(stations)
+    return schedule_contacts(matrix, antennas, satellite_priorities(matrix.ids, priorities),
+                             min_duration_s, turnaround_s, committed)
+
+#Contacts as UTC datetimes, in time order
+def export_contacts(plan, ts):
+    contacts = plan.contacts[np.argsort(plan.contacts['start'], kind='stable')]
+    return [{"Satellite": plan.matrix.ids[contact['sat']],
+             "Station": plan.matrix.stations[contact['station']]['Name'],
+             "Antenna": int(contact['antenna']) + 1,
+             "Start": ts.tt_jd(contact['start']).utc_datetime(),
+             "End": ts.tt_jd(contact['end']).utc_datetime(),
+             "Whole pass": bool(contact['start'] == contact['aos'] and contact['end'] == contact['los']),
+             "Max elevation": float(contact['max_el'])} for contact in contacts]
@@ -0,0 +1,113 @@
+import numpy as np
+from access_matrix import compute_access_matrix
+
+#Kinds of event, and how they are shown
+AOS, MAX_EL, LOS, ECLIPSE_ENTRY, ECLIPSE_EXIT = range(5)
+EVENT_NAMES = ["AOS", "Max elevation", "LOS", "Eclipse entry", "Eclipse exit"]
+#One row per event. sat and station index the index's ids and stations; station is -1 for eclipse events.
+#max_el is that of the pass the event belongs to (NaN for eclipse events).
+EVENT_DTYPE = np.dtype([('tt', 'f8'), ('sat', 'i4'), ('station', 'i4'), ('kind', 'i1'), ('max_el', 'f8')])
+#An index reaches this far (days) back from the time it is built for, and this far ahead
+INDEX_LOOKBACK_DAYS = 0.5
+INDEX_HORIZON_DAYS = 2
+#Once time is this close (days) to the end of the index, a new one is built
+REBUILD_MARGIN_DAYS = 0.5
+#Sunlight is sampled this often (s), and each change found by bisection to within ECLIPSE_TOLERANCE_S
+ECLIPSE_STEP_S = 30
+ECLIPSE_TOLERANCE_S = 0.1
+#Satellites propagated together when sampling sunlight, which keeps the arrays small for big fleets
+ECLIPSE_BATCH = 16
+DAY_S = 86400
+
+# Every AOS, max elevation, LOS, and eclipse entry and exit of a set of satellites over a set of stations,
+# in one array sorted by time. Finding what comes next at any time in [start_tt, end_tt] is a bisection,
+# so moving through time (or jumping around in it) costs nothing until the index runs out.
+class EventIndex():
+    def __init__(self, ids, tles, stations, start_tt, end_tt, events):
+        self.ids = ids
+        self.tles = tles #The TLE each satellite was computed from, in the same order as ids
+        self.stations = stations
+        self.start_tt = start_tt
+        self.end_tt = end_tt
+        self.events = events #Array of EVENT_DTYPE, sorted by tt
+    #Whether the index was built from these TLEs ({ID: TLE}) and stations
+    def matches(self, tles, stations):
+        return self.ids == list(tles.keys()) and self.tles == list(tles.values()) and self.stations == stations
+    def covers(self, tt):
+        return self.start_tt <= tt <= self.end_tt
+    #Position of the first event after TT time tt
+    def position(self, tt):
+        return int(np.searchsorted(self.events['tt'], tt, side='right'))
+    def next_events(self, tt, count):
+        first = self.position(tt)
+        return self.events[first:first + count]
+
+#Events of the passes in an access matrix. Ends cut off by the edges of its window aren't events.
+def pass_events(intervals):
+    parts = []
+    tca_inside = (intervals['tca'] > intervals['aos']) & (intervals['tca'] < intervals['los'])
+    for kind, name, keep in ((AOS, 'aos', ~intervals['open_start']), (MAX_EL, 'tca', tca_inside), (LOS, 'los', ~intervals['open_end'])):
+        rows = intervals[keep]
+        events = np.zeros(len(rows), dtype=EVENT_DTYPE)
+        events['tt'] = rows[name]
+        events['sat'] = rows['sat']
+        events['station'] = rows['station']
+        events['kind'] = kind
+        events['max_el'] = rows['max_el']
+        parts.append(events)
+    return np.concatenate(parts)
+
+#Eclipse entries and exits of every satellite in tles ({ID: TLE}) between Skyfield Times start and end.
+#Sunlight is sampled on a grid for a batch of satellites at once, and every change of sunlight in the
+#batch is then narrowed down by bisection together: each step propagates the batch at all the midpoints
+#in one call, so the expensive earth orientation and sun position are only worked out once per step.
+def eclipse_events(propagator, tles, start, end, eph):
+    ts = start.ts
+    ids = list(tles.keys())
+    grid = ts.tt_jd(np.arange(start.tt, end.tt, ECLIPSE_STEP_S / DAY_S))
+    bisections = int(np.ceil(np.log2(ECLIPSE_STEP_S / ECLIPSE_TOLERANCE_S)))
+    parts = [np.zeros(0, dtype=EVENT_DTYPE)]
+    for first in range(0, len(ids), ECLIPSE_BATCH):
+        batch = {sat_id: tles[sat_id] for sat_id in ids[first:first + ECLIPSE_BATCH]}
+        #Each batch is only used here, so it's kept out of the propagator's shared cache
+        satrecs = propagator.build_satrec_array(list(batch.values()))
+        sunlit = propagator.propagate(batch, grid, eph, satrecs).sunlit
+        sats, steps = np.nonzero(sunlit[:, 1:] != sunlit[:, :-1])
+        if len(steps) == 0:
+            continue
+        lo, hi = grid.tt[steps], grid.tt[steps + 1]
+        lit_before = sunlit[sats, steps]
+        for bisection in range(bisections):
+            mid = (lo + hi) / 2
+            #Each satellite's own midpoints, out of the whole batch at every midpoint
+            lit_mid = propagator.propagate(batch, ts.tt_jd(mid), eph, satrecs).sunlit[sats, np.arange(len(mid))]
+            same = lit_mid == lit_before
+            lo = np.where(same, mid, lo)
+            hi = np.where(same, hi, mid)
+        events = np.zeros(len(steps), dtype=EVENT_DTYPE)
+        events['tt'] = (lo + hi) / 2
+        events['sat'] = first + sats
+        events['station'] = -1
+        events['kind'] = np.where(lit_before, ECLIPSE_ENTRY, ECLIPSE_EXIT)
+        events['max_el'] = np.nan
+        parts.append(events)
+    return np.concatenate(parts)
+
+#The event index for the days around Skyfield Time time. Passes come from the access matrix (through
+#pass_cache for small fleets, or always with max_workers = 1). Doesn't touch any widgets, so it can run
+#on a worker thread, given max_workers = 1.
+def build_event_index(propagator, pass_cache, tles, stations, time, eph, eclipses = True, max_workers = None):
+    start, end = time - INDEX_LOOKBACK_DAYS, time + INDEX_HORIZON_DAYS
+    matrix = compute_access_matrix(tles, stations, start, end, max_workers, pass_cache)
+    events = pass_events(matrix.intervals)
+    if eclipses:
+        events = np.concatenate([events, eclipse_events(propagator, tles, start, end, eph)])
+    events = events[np.argsort(events['tt'], kind='stable')]
+    return EventIndex(matrix.ids, matrix.tles, stations, start.tt, end.tt, events)
+
+#Events as UTC datetimes and names
+def export_events(index, events, ts):
+    return [{"Time": ts.tt_jd(event['tt']).utc_datetime(),
+             "Event": EVENT_NAMES[event['kind']],
+             "Satellite": index.ids[event['sat']],
+             "Station": index.stations[event['station']]['Name'] if event['station'] >= 0 else None} for event in events]
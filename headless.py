@@ -0,0 +1,69 @@
+import time
+#Custom script for grabbing TLE updates
+import load_tle
+from resources import ResourceRegistry
+from propagation import PropagationEngine
+from pass_cache import PassCache
+from pass_export import export_passes
+#The same lazily computed "now" that the GUI's scheduler hands to modules
+from scheduler import TickState
+from optasat_main import Window, read_config, config_start_time, import_module_file, write_export
+
+# Stands in for the main window when running without a display (optasat_main.py config.json --headless out.json).
+# No widgets are built. Instead, each module file may provide a function
+#   headless_export(window, initparams)
+# which does the module's computation for the configuration's start time and returns the same kind of
+# dictionary its export_data would. Modules without one are skipped.
+class HeadlessWindow():
+    def __init__(self):
+        self.cross_module_vars = {}
+        self.resources = ResourceRegistry()
+        self.propagator = PropagationEngine(self.resources)
+        self.pass_cache = PassCache(self.resources)
+        self.module_data = {}
+        self.module_times = {}
+        self._state = None
+    def load_config(self, chosen_config_file):
+        print("Loading configuration")
+        self.params = read_config(chosen_config_file)
+        TLES = load_tle.get_tles(self.params['Spacecraft_IDS'])
+        self.cross_module_vars["TLES"] = TLES
+        self.resources.clear_satellites()
+        self.pass_cache.clear()
+        self.cross_module_vars['globaltime'] = config_start_time(self.params)
+    def compute_modules(self):
+        self.module_data = {}
+        self.module_times = {}
+        for module in self.params['modules']:
+            name = module['initparams']['name']
+            imported_module = import_module_file(module['source_file'])
+            if not hasattr(imported_module, "headless_export"):
+                print(name + ": no headless mode, skipped")
+                continue
+            start = time.perf_counter()
+            self.module_data[name] = imported_module.headless_export(self, module['initparams'])
+            self.module_times[name] = time.perf_counter() - start
+            print(name + ": done in " + f"{self.module_times[name]:.3f}" + " s")
+    #Shared state for globaltime (its Skyfield Time, every satellite's position), like the scheduler's
+    @property
+    def state(self):
+        globaltime = self.cross_module_vars['globaltime']
+        if self._state is None or self._state.globaltime != globaltime:
+            self._state = TickState(self, globaltime, False)
+        return self._state
+    #Stream every pass of every satellite over every ground station in the configuration, from its start
+    #time for days, to pass_file (.csv, .parquet or .arrow). Nothing is held in memory but one day of passes.
+    def export_passes(self, pass_file, days):
+        start = self.state.time
+        print("Exporting passes to " + pass_file)
+        begin = time.perf_counter()
+        count = export_passes(pass_file, self.cross_module_vars['TLES'], self.params['Groundstations'], start, start + days)
+        print(str(count) + " passes over " + str(days) + " days, done in " + f"{time.perf_counter() - begin:.3f}" + " s")
+    def export_module_data(self, savefile):
+        data_dump_dict = {"Cross module vars":self.cross_module_vars}
+        data_dump_dict["Resources"] = self.resources.export_data()
+        data_dump_dict["Headless compute times (s)"] = self.module_times
+        data_dump_dict.update(self.module_data)
+        write_export(data_dump_dict, savefile)
+    #Same bookkeeping as the main window
+    set_tle = Window.set_tle
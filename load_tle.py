@@ -1,35 +1,85 @@
 import os
 import requests
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+#Every TLE we have fetched is kept in one indexed catalog file
+from tle_catalog import TLECatalog
+
+CELESTRAK_URL = "https://www.celestrak.com/NORAD/elements/gp.php"
+#The catalog file lives in the working directory, where the per-satellite .tle files used to go
+CATALOG_FILE = "tle_catalog.db"
+#How many TLE requests get_tles will have in flight at once
+MAX_FETCH_WORKERS = 8
+#Seconds to wait on Celestrak (to connect, and between bytes) before giving up on one TLE
+FETCH_TIMEOUT_S = 10
+
+#Open catalogs, keyed by their absolute path
+open_catalogs = {}
+def default_catalog():
+    path = os.path.abspath(CATALOG_FILE)
+    if path not in open_catalogs:
+        open_catalogs[path] = TLECatalog(path)
+    return open_catalogs[path]
 
 #ID_number must be an int which is the sat id number.
 #25544 for ISS, for example.
 #acceptable_age tells how old a tle can be before we choose to re-fetch
 def get_tle(ID_number, acceptable_age = 3):
-    ID_number = str(ID_number)
-    if not os.path.exists(ID_number + ".tle"):
-        return web_retrieve_tle(ID_number)
-    else:
-        with open(ID_number + ".tle") as f:
-            loaded_tle = f.readlines()
-            loaded_tle = [line[:-1] for line in loaded_tle]
-        current_year = datetime.utcnow().timetuple().tm_year
-        current_day_of_year = datetime.utcnow().timetuple().tm_yday
-        current_epoch_day = str(current_year) + str(current_day_of_year).zfill(3)
-        loaded_tle_epoch = "20" + loaded_tle[0][18:23]
-        tle_age = float(current_epoch_day) - float(loaded_tle_epoch)
-        if tle_age > acceptable_age:
-            return web_retrieve_tle(ID_number)
-        return loaded_tle
-def web_retrieve_tle(ID_number):
+    return get_tles([ID_number], acceptable_age).get(ID_number)
+
+#Bulk version of get_tle. Takes a list of IDs and returns a dictionary of {ID: TLE}, keyed the same way
+#the IDs were passed in. Every stale TLE is fetched concurrently over one pooled session, and the
+#catalog is updated with all of them in one go. IDs Celestrak has no TLE for are reported and skipped:
+#the catalog's older TLE is used if it has one, and otherwise the ID is left out.
+def get_tles(ID_numbers, acceptable_age = 3, base_url = CELESTRAK_URL, max_workers = MAX_FETCH_WORKERS, catalog = None):
+    catalog = default_catalog() if catalog is None else catalog
+    #Satellites we have an old-style .tle file for, but which aren't in the catalog yet
+    known = catalog.get_many(ID_numbers)
+    for ID_number in ID_numbers:
+        if int(ID_number) not in known:
+            catalog.import_tle_file(ID_number)
+    stale_IDs = catalog.stale_ids(ID_numbers, acceptable_age)
+    fetched_tles = web_retrieve_tles(stale_IDs, base_url, max_workers)
+    bad_IDs = catalog.upsert(fetched_tles)
+    tles = catalog.get_many(ID_numbers)
+    for ID_number in bad_IDs:
+        print("No TLE could be fetched for", ID_number, "- using the older one" if int(ID_number) in tles else "- leaving it out")
+    return {ID_number : tles[int(ID_number)] for ID_number in ID_numbers if int(ID_number) in tles}
+
+def web_retrieve_tle(ID_number, base_url = CELESTRAK_URL, catalog = None):
+    catalog = default_catalog() if catalog is None else catalog
     ID_number = str(ID_number)
     session = requests.session()
-    url = "https://www.celestrak.com/NORAD/elements/gp.php?CATNR=" + ID_number
-    page = session.get(url)
-    sat_tle = page.text[:-2].split("\r\n")[1:]
-    with open(ID_number + ".tle","w") as f:
-        f.write("\n".join(sat_tle))
+    sat_tle = fetch_tle(session, ID_number, base_url)
+    if len(catalog.upsert({ID_number: sat_tle})) > 0:
+        print("No TLE could be fetched for", ID_number)
+        return None
     return sat_tle
 
+#Fetch many TLEs at once, with a bounded pool of threads sharing one session (and so its connection pool).
+#Returns {ID: TLE} without touching the catalog.
+def web_retrieve_tles(ID_numbers, base_url = CELESTRAK_URL, max_workers = MAX_FETCH_WORKERS):
+    if len(ID_numbers) == 0:
+        return {}
+    session = requests.session()
+    #Keep one connection open per worker, so they can all be reused instead of reconnecting
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        fetched = executor.map(lambda ID_number: fetch_tle(session, str(ID_number), base_url), ID_numbers)
+        return dict(zip(ID_numbers, fetched))
+
+#Fetch a single TLE (as a list of its two lines) using an existing session. A failed request gives an
+#empty list instead of raising, so the rest of a batch is still fetched and stored; the catalog rejects it.
+def fetch_tle(session, ID_number, base_url = CELESTRAK_URL):
+    url = base_url + "?CATNR=" + ID_number
+    try:
+        page = session.get(url, timeout=FETCH_TIMEOUT_S)
+        page.raise_for_status()
+    except requests.RequestException as error:
+        print("Fetching the TLE for", ID_number, "failed:", error)
+        return []
+    return page.text[:-2].split("\r\n")[1:]
+
 if __name__ == "__main__":
     print(get_tle(25544))
@@ -4,6 +4,10 @@ from PyQt5.QtWidgets import QPushButton,QDateTimeEdit, QLabel, QGridLayout, QSiz
 import pyqtgraph as pg
 import datetime
 
+#Without a window there is nothing to compute, but the module is still listed in the export
+def headless_export(window, initparams):
+    return {"Name":initparams['name']}
+
 class Timecontrol():
     def __init__(self,window,initparams):
         #Iterate over everything in initparams.
@@ -54,21 +58,24 @@ class Timecontrol():
         self.mainwidgetbutton.setStyleSheet("background-color:#bbbbbb")
         self.mainwidgetbutton.clicked.connect(lambda:self.window.set_largeCentralPanel(self))
 
-        #Set up QTimer, every time it runs its cycle (set by self_update_ms) it will run self.update, which updates map
-        self.updater = QtCore.QTimer()
-        self.updater.timeout.connect(self.update)
-        self.updater.start(self.self_update_ms)
+        #The window's scheduler moves globaltime forward one second every self_update_ms.
+        #This module runs first on each tick, to show the new time.
+        self.window.scheduler.drive_clock(self.self_update_ms)
+        self.window.scheduler.register(self, self.update, self.self_update_ms, priority=0)
         self.update()
     def toggle_pause(self):
         self.paused = not self.paused
+        self.window.scheduler.clock_paused = self.paused
         self.pauseButton.setText("Unpause" if self.paused else "Pause Time")
     def set_time(self, new_datetime):
         self.window.cross_module_vars['globaltime'] = new_datetime
     def set_time_now(self):
         self.dateTimeEdit.setDateTime(datetime.datetime.utcnow())
     def update(self):
-        if not self.paused:
-            self.dateTimeEdit.setDateTime(self.window.cross_module_vars['globaltime']+ datetime.timedelta(seconds=1))
+        #Show the time without it being written straight back to globaltime
+        self.dateTimeEdit.blockSignals(True)
+        self.dateTimeEdit.setDateTime(self.window.cross_module_vars['globaltime'])
+        self.dateTimeEdit.blockSignals(False)
     def export_data(self):
         return {"Name":self.name}
     #Go back to normal size and location when something else becomes the big widget
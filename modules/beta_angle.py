@@ -1,13 +1,11 @@
-from PyQt5 import QtCore, QtGui
+from PyQt5 import QtGui
 from PyQt5.QtWidgets import QPushButton, QAction, QGraphicsEllipseItem, QSlider
 import pyqtgraph.opengl as gl
 import pyqtgraph as pg
 import numpy as np
 
-from skyfield.api import load, EarthSatellite, wgs84, Star, utc
+from skyfield.api import wgs84
 from skyfield.elementslib import osculating_elements_of
-from skyfield.framelib import ecliptic_frame
-from skyfield.data import hipparcos
 
 def sigmoid_shader(x):
     W = 10#Intensity of the cutoff at 0.5. High = sharp shadow
@@ -26,8 +24,6 @@ class beta_angle():
         self.view3D.setBackgroundColor('black')
 
         self.window.grid.addWidget(self.view3D, self.grid_y, self.grid_x, self.grid_h, self.grid_w)
-
-        self.render3DView()
                 
         #Expansion button to make the main widget thing
         self.mainwidgetbutton = QPushButton("⛶",self.view3D)
@@ -36,20 +32,20 @@ class beta_angle():
         self.mainwidgetbutton.setStyleSheet("background-color:#bbbbbb")
         self.mainwidgetbutton.clicked.connect(lambda:self.window.set_largeCentralPanel(self))
 
-        #Set up QTimer, every time it runs its cycle (set by self_update_ms) it will run self.update, which updates map
-        self.updater = QtCore.QTimer()
-        self.updater.timeout.connect(self.update)
-        self.updater.start(self.self_update_ms)
+    #The slow part of setup (ephemeris, star catalog, building the scene), run by the window once it is on screen
+    def deferred_init(self):
+        self.render3DView()
+        #Register with the window's scheduler, which will run self.update every self_update_ms
+        self.window.scheduler.register(self, self.update, self.self_update_ms)
         self.update()
 
     def update(self):
         self.update3DView()
 
     def update3DView(self):
-        ts = load.timescale()
-        time = ts.from_datetime(self.window.cross_module_vars['globaltime'].replace(tzinfo=utc))
+        time = self.window.scheduler.state.time
 
-        eph = load('de421.bsp')
+        eph = self.window.resources.ephemeris
         earth_ephemeris = eph['earth']
         earthat = earth_ephemeris.at(time)
         earth_r = earthat.position.km
@@ -82,8 +78,7 @@ class beta_angle():
         for sat in self.drawn_sats:
             sat.update(time)
     def render3DView(self):
-        ts = load.timescale()
-        time = ts.from_datetime(self.window.cross_module_vars['globaltime'].replace(tzinfo=utc))
+        time = self.window.scheduler.state.time
         self.oldtime = time
         #This whole 3D plot is done in units of megameters. Therefore earth's radius of 6371km is 6.371 units.
 
@@ -98,7 +93,7 @@ class beta_angle():
         self.view3D.addItem(self.earthmesh)
 
         #Determine orientation of the axis using the location of the earth
-        eph = load('de421.bsp')
+        eph = self.window.resources.ephemeris
         earth_ephemeris = eph['earth']
         earthat = earth_ephemeris.at(time)
         earth_r = earthat.position.km
@@ -146,8 +141,7 @@ class beta_angle():
         self.view3D.addItem(gl.GLLinePlotItem(pos=[[0,0,0],self.norm_sun*10],color=[1,1,1,1], width=5, antialias=False))
         
         #Plot stars, makes it easier to track rotation
-        with load.open(hipparcos.URL) as f:
-            df = hipparcos.load_dataframe(f)
+        df = self.window.resources.hipparcos
         df_filtered = df[df['magnitude'] <= 2.5]
         starlist = df_filtered.values.tolist()
 
@@ -168,7 +162,7 @@ class beta_angle():
         self.drawn_sats = []
         #Plot the orbit for one revolution
         for sat in self.SATS:
-            sat_obj = rendered_satellite(self,self.view3D,self.window.cross_module_vars['TLES'][sat["ID"]],sat["Color"])
+            sat_obj = rendered_satellite(self,self.view3D,sat["ID"],sat["Color"])
             self.drawn_sats.append(sat_obj)
             show_hide_checkbox = QAction("Show sat: " + str(sat["ID"]),self.window,checkable=True)
             self.window.modulesMenu.addAction(show_hide_checkbox)
@@ -183,18 +177,19 @@ class beta_angle():
         self.window.grid.addWidget(self.view3D, new_geometry[1], new_geometry[0], new_geometry[3], new_geometry[2])
        
 class rendered_satellite():
-    def __init__(self,parent,GLRenderer,TLE,color):
+    def __init__(self,parent,GLRenderer,ID,color):
         self.parent = parent
         self.GLRenderer = GLRenderer
-        self.TLE = TLE
+        self.ID = ID
         self.orbit_plot = gl.GLLinePlotItem(pos=[], color=color, width=5, antialias=False)
         self.angmom_line = gl.GLLinePlotItem(pos=[], color=color, width=5, antialias=False)
         #Line indicating sun vector projected onto orbital plane
         self.beta_vec = gl.GLLinePlotItem(pos=[], color=color, width=5, antialias=False)
 
     def update(self,time):
-        ts = load.timescale()
-        skyfield_sat = EarthSatellite(*self.TLE)
+        ts = self.parent.window.resources.timescale
+        TLE = self.parent.window.cross_module_vars['TLES'][self.ID]
+        skyfield_sat = self.parent.window.resources.satellite(TLE)
         sat_state = skyfield_sat.at(time)
         sat_period_minutes = osculating_elements_of(sat_state).period_in_days*1440
         one_period = ts.utc(*time.utc[:3],0,range(int(sat_period_minutes)+1))
@@ -0,0 +1,111 @@
+from PyQt5.QtWidgets import QPushButton
+import pyqtgraph as pg
+import numpy as np
+from pass_cache import unix_time
+from access_matrix import compute_access_matrix
+from contact_plan import (DEFAULT_MIN_DURATION_S, schedule_contacts, slide_contact_plan, antenna_rows, station_antennas,
+                          satellite_priorities, export_contacts)
+from modules.gs_access import planned_stations
+
+#How a schedule row is labelled
+def antenna_label(gs, antenna, count):
+    return gs['Name'] if count == 1 else gs['Name'] + " #" + str(antenna + 1)
+def export_plan(plan, ts):
+    return {"Contact plan": export_contacts(plan, ts), "Unscheduled passes": len(plan.unscheduled)}
+#Without a window: the contact plan for one day (or the "days" initparam) from globaltime
+def headless_export(window, initparams):
+    stations = planned_stations(window.params, initparams)
+    startTime = window.state.time
+    matrix = compute_access_matrix(window.cross_module_vars['TLES'], stations, startTime, startTime + initparams.get("days", 1),
+                                   pass_cache=window.pass_cache)
+    plan = schedule_contacts(matrix, station_antennas(stations), satellite_priorities(matrix.ids, initparams.get("priorities", {})),
+                             initparams.get("min_duration_s", DEFAULT_MIN_DURATION_S), initparams.get("turnaround_s", 0))
+    return export_plan(plan, window.resources.timescale)
+
+# Shows which satellite each ground station antenna talks to over the next day, as planned by contact_plan.py.
+# Usually placed next to a gs_access module, which shows all the passes the plan was made from.
+class contact_schedule():
+    #How often the plan moves along with globaltime, unless set in initparams
+    self_update_ms = 60000
+    priorities = {}
+    min_duration_s = DEFAULT_MIN_DURATION_S
+    turnaround_s = 0
+    def __init__(self,window,initparams):
+        #Iterate over everything in initparams.
+        for key,value in initparams.items():
+            #This does self.key = value, where key is a string.
+            setattr(self, key, value)
+        self.window = window
+        self.box = pg.GraphicsLayoutWidget(window)
+        self.window.grid.addWidget(self.box, self.grid_y, self.grid_x, self.grid_h, self.grid_w)
+        self.box.setStyleSheet("border:2px solid black; border-radius: 5px;")
+        self.box.setBackground(self.color)
+
+        self.schedule_plot = self.box.addPlot(axisItems = {'bottom': pg.DateAxisItem()})
+        self.legend = self.schedule_plot.addLegend()
+
+        self.stations = planned_stations(self.window.params, initparams)
+        antennas = station_antennas(self.stations)
+        #One row per antenna
+        ticks = [(row + 1, antenna_label(self.stations[station], antenna, antennas[station]))
+                 for row, (station, antenna) in enumerate(antenna_rows(antennas))]
+        self.schedule_plot.getAxis("left").setTicks((ticks,[]))
+
+        #Planning runs in the background, with a placeholder shown until it's done
+        self.plan = None
+        #One BarGraphItem per satellite ID, holding all its contacts
+        self.bars = {}
+        self.placeholder = pg.TextItem("Planning contacts...", anchor=(0.5,0.5))
+        self.schedule_plot.addItem(self.placeholder)
+        self.job_key = self.name + ": contact plan"
+        #Register with the window's scheduler, which will run self.update every self_update_ms
+        self.window.scheduler.register(self, self.update, self.self_update_ms)
+        self.update()
+
+        #Expansion button to make the main widget thing
+        self.mainwidgetbutton = QPushButton("⛶",self.box)
+        self.mainwidgetbutton.resize(30, 30)
+        self.mainwidgetbutton.move(10,0)
+        self.mainwidgetbutton.setStyleSheet("background-color:#bbbbbb")
+        self.mainwidgetbutton.clicked.connect(lambda:self.window.set_largeCentralPanel(self))
+    #Plan the day from globaltime again, in the background. The passes are slid along like gs_access's,
+    #and contacts already under way stay on their antennas.
+    def update(self):
+        if self.window.workers.is_pending(self.job_key):
+            return
+        startTime = self.window.scheduler.state.time
+        self.window.workers.submit(self.job_key, slide_contact_plan, self.draw_plan,
+                                   self.plan, dict(self.window.cross_module_vars['TLES']), self.stations,
+                                   startTime, startTime + 1, self.priorities, self.min_duration_s, self.turnaround_s,
+                                   1, self.window.pass_cache, on_cancel=self.update, follows_time=True)
+    def draw_plan(self, plan):
+        self.schedule_plot.removeItem(self.placeholder)
+        self.plan = plan
+        ts = self.window.resources.timescale
+        contacts = plan.contacts
+        #Schedule row of each contact
+        first_rows = np.concatenate([[0], np.cumsum(plan.antennas)])
+        rows = first_rows[contacts['station']] + contacts['antenna'] + 1
+        #Satellites that are gone take their bars (and legend entries) with them
+        for sat_id in [sat_id for sat_id in self.bars if sat_id not in plan.matrix.ids]:
+            self.schedule_plot.removeItem(self.bars.pop(sat_id))
+        for i, sat_id in enumerate(plan.matrix.ids):
+            chosen = contacts['sat'] == i
+            bar_data = dict(x0=unix_time(ts, contacts['start'][chosen]), x1=unix_time(ts, contacts['end'][chosen]), y=rows[chosen])
+            if sat_id in self.bars:
+                self.bars[sat_id].setOpts(**bar_data)
+            else:
+                self.bars[sat_id] = pg.BarGraphItem(height=0.6, brush=pg.intColor(i, hues=max(len(plan.matrix.ids), 1)), name=str(sat_id), **bar_data)
+                self.schedule_plot.addItem(self.bars[sat_id])
+        self.schedule_plot.setTitle(str(len(contacts)) + " contacts, " + str(len(plan.unscheduled)) + " passes unscheduled")
+    def export_data(self):
+        if self.plan is None:
+            return {"Contact plan": [], "Unscheduled passes": 0}
+        return export_plan(self.plan, self.window.resources.timescale)
+    #Go back to normal size and location when something else becomes the big widget
+    def return_to_normal(self):
+        self.window.grid.removeWidget(self.box)
+        self.window.grid.addWidget(self.box, self.grid_y, self.grid_x, self.grid_h, self.grid_w)
+    def enlarge(self,new_geometry):
+        self.window.grid.removeWidget(self.box)
+        self.window.grid.addWidget(self.box, new_geometry[1], new_geometry[0], new_geometry[3], new_geometry[2])
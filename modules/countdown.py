@@ -0,0 +1,139 @@
+from PyQt5 import QtCore
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QPushButton, QLabel, QGridLayout, QTableWidget, QTableWidgetItem, QHeaderView, QSizePolicy
+import pyqtgraph as pg
+from event_index import EVENT_NAMES, REBUILD_MARGIN_DAYS, build_event_index, export_events
+from modules.gs_access import planned_stations
+
+#"in 1d 02:03:04" style countdown to an event seconds away
+def countdown_text(seconds):
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return (str(days) + "d " if days > 0 else "") + f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+#Without a window: the next event_count events after globaltime
+def headless_export(window, initparams):
+    stations = planned_stations(window.params, initparams)
+    time = window.state.time
+    index = build_event_index(window.propagator, window.pass_cache, window.cross_module_vars['TLES'], stations, time,
+                              window.resources.ephemeris, initparams.get("eclipses", True))
+    events = index.next_events(time.tt, initparams.get("event_count", countdown.event_count))
+    return {"Next events": export_events(index, events, window.resources.timescale)}
+
+# Counts down to the next AOS, LOS, max elevation and eclipse entry/exit of every satellite, over every
+# station (or the ones in the "groundstation" initparam). The events of the next couple of days are kept
+# in an event_index.EventIndex, so each tick, and each jump of globaltime within those days, only looks
+# up where globaltime falls in it.
+class countdown():
+    #Rows shown, unless set in initparams
+    event_count = 10
+    eclipses = True
+    #The countdowns are to the second
+    self_update_ms = 1000
+    def __init__(self,window,initparams):
+        #Iterate over everything in initparams.
+        for key,value in initparams.items():
+            #This does self.key = value, where key is a string.
+            setattr(self, key, value)
+        self.window = window
+        self.box = pg.GraphicsLayoutWidget(window)
+        self.window.grid.addWidget(self.box, self.grid_y, self.grid_x, self.grid_h, self.grid_w)
+        self.box.setStyleSheet("border:2px solid black; border-radius: 5px;")
+        self.box.setBackground(self.color)
+
+        grid = QGridLayout(self.box)
+        self.title = QLabel(self.box)
+        self.title.setText("Finding events...")
+        self.title.setAlignment(QtCore.Qt.AlignCenter)
+        self.title.setStyleSheet("border:0px")
+        self.title.setFont(QFont("Helvetica",14))
+        self.title.setSizePolicy(QSizePolicy.Minimum, QSizePolicy.Minimum)
+        grid.addWidget(self.title, 0, 0)
+
+        self.table = QTableWidget(self.event_count, 4, self.box)
+        self.table.setHorizontalHeaderLabels(["In", "Event", "Satellite", "Station"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        for row in range(self.event_count):
+            for column in range(4):
+                self.table.setItem(row, column, QTableWidgetItem(""))
+        grid.addWidget(self.table, 1, 0)
+
+        self.stations = planned_stations(self.window.params, initparams)
+        self.index = None
+        #The index position and index the table rows were last filled from
+        self.shown = None
+        self.job_key = self.name + ": events"
+
+        #Expansion button to make the main widget thing
+        self.mainwidgetbutton = QPushButton("⛶",self.box)
+        self.mainwidgetbutton.resize(30, 30)
+        self.mainwidgetbutton.move(10,0)
+        self.mainwidgetbutton.setStyleSheet("background-color:#bbbbbb")
+        self.mainwidgetbutton.clicked.connect(lambda:self.window.set_largeCentralPanel(self))
+
+        #Register with the window's scheduler, which will run self.update every self_update_ms
+        self.window.scheduler.register(self, self.update, self.self_update_ms)
+        self.update()
+    def update(self):
+        time = self.window.scheduler.state.time
+        tles = self.window.cross_module_vars['TLES']
+        usable = self.index is not None and self.index.matches(tles, self.stations) and self.index.covers(time.tt)
+        #Building the next index starts well before this one runs out, so the countdown never stops
+        if not usable or time.tt > self.index.end_tt - REBUILD_MARGIN_DAYS:
+            self.rebuild(time, tles)
+        if usable:
+            self.show_events(time.tt)
+        else:
+            self.title.setText("Finding events...")
+            self.clear_rows()
+    def rebuild(self, time, tles):
+        if self.window.workers.is_pending(self.job_key):
+            return
+        #Load the ephemeris here, not in the worker thread
+        eph = self.window.resources.ephemeris if self.eclipses else None
+        self.window.workers.submit(self.job_key, build_event_index, self.set_index,
+                                   self.window.propagator, self.window.pass_cache, dict(tles), self.stations, time, eph, self.eclipses, 1,
+                                   on_cancel=self.update, follows_time=True)
+    def set_index(self, index):
+        self.index = index
+        self.update()
+    #Empty the table, so events of an index that no longer covers globaltime aren't left showing
+    def clear_rows(self):
+        if self.shown is None:
+            return
+        self.shown = None
+        for row in range(self.event_count):
+            for column in range(4):
+                self.table.item(row, column).setText("")
+    def show_events(self, tt):
+        events = self.index.next_events(tt, self.event_count)
+        position = self.index.position(tt)
+        #The rows only change when an event goes by (or the index is replaced); otherwise just the countdowns do
+        if self.shown != (self.index, position):
+            self.shown = (self.index, position)
+            for row in range(self.event_count):
+                texts = ["", "", "", ""]
+                if row < len(events):
+                    event = events[row]
+                    station = self.index.stations[event['station']]['Name'] if event['station'] >= 0 else ""
+                    texts[1:] = [EVENT_NAMES[event['kind']], str(self.index.ids[event['sat']]), station]
+                for column in range(4):
+                    self.table.item(row, column).setText(texts[column])
+        self.title.setText("Next events")
+        for row, event in enumerate(events):
+            self.table.item(row, 0).setText(countdown_text((event['tt'] - tt) * 86400))
+    def export_data(self):
+        if self.index is None:
+            return {"Next events": []}
+        tt = self.window.scheduler.state.time.tt
+        return {"Next events": export_events(self.index, self.index.next_events(tt, self.event_count), self.window.resources.timescale)}
+    #Go back to normal size and location when something else becomes the big widget
+    def return_to_normal(self):
+        self.window.grid.removeWidget(self.box)
+        self.window.grid.addWidget(self.box, self.grid_y, self.grid_x, self.grid_h, self.grid_w)
+    def enlarge(self,new_geometry):
+        self.window.grid.removeWidget(self.box)
+        self.window.grid.addWidget(self.box, new_geometry[1], new_geometry[0], new_geometry[3], new_geometry[2])
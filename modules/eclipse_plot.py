@@ -1,9 +1,36 @@
 from PyQt5.QtWidgets import QPushButton
-from PyQt5 import QtCore
 
 import pyqtgraph as pg
-from skyfield.api import load, EarthSatellite, wgs84, utc
 import numpy as np
+import datetime
+
+#Returns the [start, end] unix times of each sunlit stretch in the days after startTime, sampled every second.
+#Doesn't touch any widgets, so it can run on a worker thread or without a window.
+def find_sunlit_bars(propagator, sat_id, TLE, startTime, eph, days = 1):
+    ts = propagator.resources.timescale
+    endTime = startTime + days
+    timespan = ts.tt_jd(np.linspace(startTime.tt,endTime.tt,int(86400 * days)))
+    
+    lit_state = propagator.propagate({sat_id: TLE}, timespan, eph).sunlit[0]
+    #Unix timestamps for the time axis
+    timestamps = startTime.utc_datetime().timestamp() + (timespan.tt - startTime.tt) * 86400
+    
+    # list of start and end times for each bar. A bar starts where we go from dark to lit
+    # (or right away if we start lit), and ends where we go from lit to dark.
+    was_lit = np.concatenate([[False], lit_state[:-1]])
+    bar_starts = timestamps[lit_state & ~was_lit]
+    bar_ends = timestamps[~lit_state & was_lit]
+    return list(zip(bar_starts, bar_ends))
+#Sunlit stretches as UTC datetimes
+def export_sunlit(bar_pairs):
+    return [[datetime.datetime.fromtimestamp(x, datetime.timezone.utc) for x in bp] for bp in bar_pairs]
+#Without a window: sunlit stretches over one day (or the "days" initparam) from globaltime
+def headless_export(window, initparams):
+    sat_id = initparams['sat_id']
+    TLE = window.cross_module_vars['TLES'][sat_id]
+    bar_pairs = find_sunlit_bars(window.propagator, sat_id, TLE, window.state.time,
+                                 window.resources.ephemeris, initparams.get("days", 1))
+    return {"Sunlit": export_sunlit(bar_pairs)}
 
 class eclipse_plot():
     def __init__(self,window,initparams):
@@ -18,10 +45,13 @@ class eclipse_plot():
         self.box.setBackground(self.color)
 
         self.sunlight_plot = self.box.addPlot(axisItems = {'bottom': pg.DateAxisItem()})
+        #The day-long timeline is computed in the background. Until the first one is ready, show a placeholder.
+        self.sunlight_plot.addItem(pg.TextItem("Computing sunlight times...", anchor=(0.5,0.5)))
+        self.job_key = self.name + ": sunlight"
+        self.bar_pairs = []
         
-        self.updater = QtCore.QTimer()
-        self.updater.timeout.connect(self.update)
-        self.updater.start(self.self_update_ms)
+        #Register with the window's scheduler, which will run self.update every self_update_ms
+        self.window.scheduler.register(self, self.update, self.self_update_ms)
         self.update()
 
         
@@ -32,40 +62,25 @@ class eclipse_plot():
         self.mainwidgetbutton.setStyleSheet("background-color:#bbbbbb")
         self.mainwidgetbutton.clicked.connect(lambda:self.window.set_largeCentralPanel(self))
     def update(self):
-        self.sunlight_plot.clear()
-        ts = load.timescale()
-        
+        #Wait for the previous timeline before asking for another one
+        if self.window.workers.is_pending(self.job_key):
+            return
         TLE = self.window.cross_module_vars['TLES'][self.sat_id]
-        sat = EarthSatellite(*TLE)
-        startTime = ts.from_datetime(self.window.cross_module_vars['globaltime'].replace(tzinfo=utc))
-        endTime = startTime + 1 #calculate one day
-        timespan = ts.tt_jd(np.linspace(startTime.tt,endTime.tt,86400))
-        
-        eph = load('de421.bsp')
-        lit_state = sat.at(timespan).is_sunlit(eph)
-        
-        
-        # list of start and end times for each bar
-        bar_pairs = []
-        was_lit = lit_state[0]
-        if was_lit: #if we start lit, start the first bar right away
-            current_barpair = [float(timespan[0].utc_strftime("%s"))]
-        else:
-            current_barpair = []
-        for time, islit in zip(timespan,lit_state):
-            if islit and not was_lit:
-                current_barpair = [float(time.utc_strftime("%s"))]
-                was_lit = True
-            elif not islit and was_lit:
-                current_barpair.append(float(time.utc_strftime("%s")))
-                bar_pairs.append(current_barpair)
-                current_barpair = []
-                was_lit = False
+        startTime = self.window.scheduler.state.time
+        #Load the ephemeris here, not in the worker thread
+        eph = self.window.resources.ephemeris
+        self.window.workers.submit(self.job_key, find_sunlit_bars, self.draw_sunlit_bars,
+                                   self.window.propagator, self.sat_id, TLE, startTime, eph, follows_time=True)
+    def draw_sunlit_bars(self, bar_pairs):
+        self.sunlight_plot.clear()
+        self.bar_pairs = bar_pairs
         for bp in bar_pairs:
             bar = pg.BarGraphItem(x0=[bp[0]], x1 = [bp[1]], y = 1, height=0.5,brush = 'orange')
             self.sunlight_plot.addItem(bar)
         ticks = [(1, f"Sunlight times for {self.sat_id}")]
         self.sunlight_plot.getAxis("left").setTicks((ticks,[]))
+    def export_data(self):
+        return {"Sunlit": export_sunlit(self.bar_pairs)}
     #Go back to normal size and location when something else becomes the big widget
     def return_to_normal(self):
         self.window.grid.removeWidget(self.box)
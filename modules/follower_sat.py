@@ -26,6 +26,31 @@ def get_TLE_velocity(tle_in):
     SMA = np.cbrt(earth_mu * period**2 / (4*np.pi**2)) # in meters
     velocity = 2 * np.pi * SMA / period
     return velocity
+# Follower's TLE will be just like the leader's, but in order to follow, we change
+# the mean anomaly. To know the difference in mean anomaly, we need the
+# period of the orbit, since fraction of period is equal to mean anomaly fraction of 360.
+def follower_TLE(leader_tle, separation_time):
+    leader_period = get_TLE_period(leader_tle)
+    # Now we know the time, convert to orbit fraction.
+    orb_time_fraction = separation_time / leader_period
+    mean_anomaly_diff = orb_time_fraction * 360
+    # Now generate the new TLE. Use the old one, just subbing in the ID and new mean anomaly.
+    old_mean_anomaly = float(leader_tle[1][43:51])
+    new_mean_anomaly = old_mean_anomaly - mean_anomaly_diff
+    if new_mean_anomaly < 0:
+        new_mean_anomaly += 360
+    #start by copying old TLE into a list of characters (lists are mutable)
+    new_tle = [list(x) for x in leader_tle]
+    new_tle[1][43:51] = list(f'{new_mean_anomaly:.4f}')
+    #convert back to a list of 2 strings
+    return ["".join(x) for x in new_tle]
+#Without a window: place the follower, separation_time seconds (an optional initparam, default 0) behind its leader.
+#Put this module before the ones that use the follower in the configuration.
+def headless_export(window, initparams):
+    separation_time = initparams.get("separation_time", 0)
+    leader_tle = window.cross_module_vars['TLES'][initparams['leader_ID']]
+    window.set_tle(initparams['sat_ID'], follower_TLE(leader_tle, separation_time))
+    return {"separation_time": separation_time}
 
 class follower_sat():
     def __init__(self,window,initparams):
@@ -34,12 +59,10 @@ class follower_sat():
             #This does self.key = value, where key is a string.
             setattr(self, key, value)
         self.window = window
-        #initialize follower's TLE to match leader's
+        #Initialize following to the separation_time initparam, or 0 (right on the leader)
+        self.separation_time = initparams.get("separation_time", 0)
         leader_tle = self.window.cross_module_vars['TLES'][self.leader_ID]
-        self.window.cross_module_vars['TLES'][self.sat_ID] = leader_tle
-
-        #Initialize following to 0 (right on the leader)
-        self.separation_time = 0
+        self.window.set_tle(self.sat_ID, follower_TLE(leader_tle, self.separation_time))
         #need velocity to convert between distances and times
         self.leader_velocity = get_TLE_velocity(leader_tle)
 
@@ -63,25 +86,9 @@ class follower_sat():
 
     def recalculate_TLE(self):
         leader_tle = self.window.cross_module_vars['TLES'][self.leader_ID]
-        # Follower's TLE will be just like the leader's, but in order to follow, we change
-        # the mean anomaly. To know the difference in mean anomaly, we need the
-        # period of the orbit, since fraction of period is equal to mean anomaly fraction of 360.
-        leader_period = get_TLE_period(leader_tle)
-        # Now we know the time, convert to orbit fraction.
-        orb_time_fraction = self.separation_time / leader_period
-        mean_anomaly_diff = orb_time_fraction * 360
-        # Now generate the new TLE. Use the old one, just subbing in the ID and new mean anomaly.
-        old_mean_anomaly = float(leader_tle[1][43:51])
-        new_mean_anomaly = old_mean_anomaly - mean_anomaly_diff
-        if new_mean_anomaly < 0:
-            new_mean_anomaly += 360
-        #start by copying old TLE into a list of characters (lists are mutable)
-        new_tle = [list(x) for x in leader_tle]
-        new_tle[1][43:51] = list(f'{new_mean_anomaly:.4f}')
-        #convert back to a list of 2 strings
-        new_tle = ["".join(x) for x in new_tle]
+        new_tle = follower_TLE(leader_tle, self.separation_time)
         #Give that TLE to the window for other modules to use. self.sat_ID comes from config file!
-        self.window.cross_module_vars['TLES'][self.sat_ID] = new_tle
+        self.window.set_tle(self.sat_ID, new_tle)
     # Get a QGridLayout holding all the UI elements for this module
     def control_layout(self, parent=None):
         if self.moduleMode:
@@ -1,9 +1,8 @@
-from PyQt5 import QtCore
 from PyQt5.QtWidgets import QPushButton, QVBoxLayout
 import pyqtgraph as pg
 import shapefile
 import os
-from skyfield.api import load, EarthSatellite, wgs84, utc
+from skyfield.api import wgs84
 from skyfield.constants import ERAD #earth radius
 
 import matplotlib
@@ -14,25 +13,13 @@ from matplotlib.patches import Polygon
 from matplotlib.collections import PatchCollection
 
 import numpy as np
+from small_circle import angular_distance
 
-#The haversine function
-def hav(value):
-    return (1 - np.cos(value)) / 2
-
-#The archaversine function
-def archav(value):
-    if 0 < value < 1:
-        return np.arccos(1 - 2 * value)
-    return None
-
-def angular_SSP_distance(SSP, ground_point):
-    #This uses the Haversine Formula.
-    lat1,lon1 = SSP
-    lon2,lat2 = ground_point #shapefile specifies lon first!
-    lat1,lon1,lon2,lat2 = [x * np.pi/180 for x in [lat1,lon1,lon2,lat2]] #All to radians 
-    hav_theta = hav(lat2-lat1) + np.cos(lat1) * np.cos(lat2) * hav(lon2-lon1)
-    theta = archav(hav_theta)
-    return theta
+def angular_SSP_distance(SSP, ground_points):
+    #Angles from the subsatellite point to an array of shapefile points, by the haversine formula
+    lat1,lon1 = np.radians(SSP)
+    lon2,lat2 = np.radians(ground_points).T #shapefile specifies lon first!
+    return angular_distance(lat1, lon1, lat2, lon2)
 
 class ground_view():
     def __init__(self,window,initparams):
@@ -46,11 +33,6 @@ class ground_view():
         self.box.setStyleSheet("border:2px solid black; border-radius: 5px;")
         self.box.setBackground(self.color)
 
-        #load relative file path from this script
-        self.shape_file = shapefile.Reader(os.path.dirname(os.path.realpath(__file__))  + "/" + 
-                                           "shapefile/ne_50m_admin_0_countries.cpg")
-        self.TLE = self.window.cross_module_vars['TLES'][self.sat_id]
-
         self.fig, self.ax = plt.subplots()
         self.ax.set_facecolor("lightblue")
         self.plotWidget = FigureCanvas(self.fig)
@@ -68,17 +50,24 @@ class ground_view():
         self.mainwidgetbutton.setStyleSheet("background-color:#bbbbbb")
         self.mainwidgetbutton.clicked.connect(lambda:self.window.set_largeCentralPanel(self))
 
-        #Set up QTimer, every time it runs its cycle (set by self_update_ms) it will run self.update, which updates map
-        self.updater = QtCore.QTimer()
-        self.updater.timeout.connect(self.update)
-        self.updater.start(self.self_update_ms)
+    #The slow part of setup, run by the window once it is on screen
+    def deferred_init(self):
+        #load relative file path from this script
+        self.shape_file = shapefile.Reader(os.path.dirname(os.path.realpath(__file__))  + "/" + 
+                                           "shapefile/ne_50m_admin_0_countries.cpg")
+        self.drawn_countries = []
+
+        #Register with the window's scheduler, which will run self.update every self_update_ms
+        self.window.scheduler.register(self, self.update, self.self_update_ms)
         self.update()
     def update(self):
-        # remove all patches, to generate new ones
-        self.ax.patches.clear()
-        sat = EarthSatellite(*self.TLE)
-        ts = load.timescale()
-        time = ts.from_datetime(self.window.cross_module_vars['globaltime'].replace(tzinfo=utc))
+        # remove all the countries, to generate new ones
+        for country in self.drawn_countries:
+            country.remove()
+        self.drawn_countries = []
+        TLE = self.window.cross_module_vars['TLES'][self.sat_id]
+        sat = self.window.resources.satellite(TLE)
+        time = self.window.scheduler.state.time
         
         satpos = sat.at(time)
         now_lat,now_lon = wgs84.latlon_of(satpos)
@@ -107,20 +96,13 @@ class ground_view():
         for shape in shapes:
             ptchs = []
             pts = np.array(shape.points)
-            points_in = []
-            for point in pts:
-                dist = angular_SSP_distance(SSP,point)
-                if dist < angle_B:
-                    points_in.append(point)
-                # if it's on the "back" side of earth, just abandon the whole shape
-                elif dist > np.pi/2:
-                    continue
+            points_in = pts[angular_SSP_distance(SSP,pts) < angle_B]
             prt = shape.parts
             par = list(prt) + [pts.shape[0]]
             for pij in range(len(prt)):
                  ptchs.append(Polygon(pts[par[pij]:par[pij+1]]))
             if len(points_in) > 0:
-                self.ax.add_collection(PatchCollection(ptchs,facecolor="lightgreen",edgecolor='k', linewidths=1))
+                self.drawn_countries.append(self.ax.add_collection(PatchCollection(ptchs,facecolor="lightgreen",edgecolor='k', linewidths=1)))
         footprint_radius_deg = angle_B * 180/np.pi
         self.ax.set_xlim(SSP[1] - footprint_radius_deg,SSP[1] + footprint_radius_deg)
         self.ax.set_ylim(SSP[0] - footprint_radius_deg,SSP[0] + footprint_radius_deg)
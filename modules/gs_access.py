@@ -1,8 +1,43 @@
 from PyQt5.QtWidgets import QPushButton
 import pyqtgraph as pg
-from skyfield.api import load, EarthSatellite, wgs84, utc
+import numpy as np
+from pass_cache import unix_time
+from access_matrix import compute_access_matrix, slide_access_matrix
+
+#Access windows as UTC datetimes, keyed by satellite ID (and station, if there are several)
+def export_access(matrix, ts):
+    access = {}
+    for i, sat_id in enumerate(matrix.ids):
+        for j, gs in enumerate(matrix.stations):
+            rows = matrix.intervals[(matrix.intervals['sat'] == i) & (matrix.intervals['station'] == j)]
+            bar_pairs = zip(ts.tt_jd(rows['aos']).utc_datetime(), ts.tt_jd(rows['los']).utc_datetime()) if len(rows) > 0 else []
+            key = sat_id if len(matrix.stations) == 1 else row_label(sat_id, gs, matrix.stations)
+            access[key] = [list(bp) for bp in bar_pairs]
+    return access
+#How a (satellite, station) row is labelled
+def row_label(sat_id, gs, stations):
+    return str(sat_id) if len(stations) == 1 else str(sat_id) + " @ " + gs['Name']
+#The station dictionaries named by a groundstation initparam, which is one name or a list of them
+def find_stations(params, groundstation):
+    names = groundstation if isinstance(groundstation, list) else [groundstation]
+    stations = {gs['Name']: gs for gs in params['Groundstations']}
+    return [stations[name] for name in names]
+#The stations a module covers: its "groundstation" initparam (one name or a list), or all of them if it has none
+def planned_stations(params, initparams):
+    if "groundstation" in initparams:
+        return find_stations(params, initparams['groundstation'])
+    return params['Groundstations']
+#Without a window: access windows of every satellite over one day (or the "days" initparam) from globaltime
+def headless_export(window, initparams):
+    stations = find_stations(window.params, initparams['groundstation'])
+    startTime = window.state.time
+    matrix = compute_access_matrix(window.cross_module_vars['TLES'], stations, startTime, startTime + initparams.get("days", 1),
+                                   pass_cache=window.pass_cache)
+    return {"Access windows": export_access(matrix, window.resources.timescale)}
 
 class gs_access():
+    #How often the day of access windows moves along with globaltime, unless set in initparams
+    self_update_ms = 60000
     def __init__(self,window,initparams):
         #Iterate over everything in initparams.
         for key,value in initparams.items():
@@ -15,47 +50,75 @@ class gs_access():
         self.box.setBackground(self.color)
 
         self.access_plot = self.box.addPlot(axisItems = {'bottom': pg.DateAxisItem()})
-        ts = load.timescale()
         
-        #Load in all ground stations registered to the window
-        gs_data = self.window.params['Groundstations']
-        for gs in gs_data:
-            #Filter for the one matching the name we're seeking
-            if gs['Name'] == self.groundstation:
-                gs_data = gs
-                break
-        groundstation = wgs84.latlon(gs_data['Lat'],gs_data['Lon'])
-        for i, tle in enumerate(self.window.cross_module_vars['TLES'].values()):
-            sat = EarthSatellite(*tle)
-            startTime = ts.from_datetime(self.window.cross_module_vars['globaltime'].replace(tzinfo=utc))
-            endTime = startTime + 1 #calculate one day
-            t,events = sat.find_events(groundstation, startTime, endTime)
-            # list of start and end times for each bar
-            bar_pairs = []
-            curr_barpair = []
-            for time, event_type in zip(t,events):
-                if event_type == 0:
-                    curr_barpair = [float(time.utc_strftime("%s"))]
-                if event_type == 2:
-                    #handle the case where we are currently in a pass, and there was no start
-                    if curr_barpair == []:
-                        curr_barpair.append(float(startTime.utc_strftime("%s")))
-                    curr_barpair.append(float(time.utc_strftime("%s")))
-                    bar_pairs.append(curr_barpair)
-            for bp in bar_pairs:
-                bar = pg.BarGraphItem(x0=[bp[0]], x1 = [bp[1]], y = i+1, height=0.5,brush = 'r')
-                self.access_plot.addItem(bar)
-        ticks = [(i+1, str(tle)) for i, tle in enumerate(self.window.cross_module_vars['TLES'].keys())]
-        self.access_plot.getAxis("left").setTicks((ticks,[]))
+        #The ground stations registered to the window that we show: one name, or a list of them.
+        #Each satellite gets a row per station.
+        self.stations = find_stations(self.window.params, self.groundstation)
+        self.set_row_labels(list(self.window.cross_module_vars['TLES'].keys()))
 
+        #Searching every satellite takes a while, so it runs in the background, with a placeholder shown until it's done
+        self.matrix = None
+        #One BarGraphItem per satellite ID, holding the bars of all its stations
+        self.bars = {}
+        self.placeholder = pg.TextItem("Computing access times...", anchor=(0.5,0.5))
+        self.access_plot.addItem(self.placeholder)
+        self.job_key = self.name + ": access"
+        #Register with the window's scheduler, which will run self.update every self_update_ms
+        self.window.scheduler.register(self, self.update, self.self_update_ms)
+        self.update()
 
-        
         #Expansion button to make the main widget thing
         self.mainwidgetbutton = QPushButton("⛶",self.box)
         self.mainwidgetbutton.resize(30, 30)
         self.mainwidgetbutton.move(10,0)
         self.mainwidgetbutton.setStyleSheet("background-color:#bbbbbb")
         self.mainwidgetbutton.clicked.connect(lambda:self.window.set_largeCentralPanel(self))
+    #Move the day of access windows along to start at globaltime, in the background. Only the newly
+    #exposed end of the day is computed; the rest is kept from last time, and bars that scrolled out are
+    #dropped. Passes all come through the window's pass cache, shared with the other modules.
+    #If globaltime jumps before the job is done, it is cancelled and this is called again for the new time,
+    #which computes the whole day again unless the jump was a small step forward.
+    def update(self):
+        if self.window.workers.is_pending(self.job_key):
+            return
+        startTime = self.window.scheduler.state.time
+        self.window.workers.submit(self.job_key, slide_access_matrix, self.draw_access_bars,
+                                   self.matrix, dict(self.window.cross_module_vars['TLES']), self.stations,
+                                   startTime, startTime + 1, 1, self.window.pass_cache,
+                                   on_cancel=self.update, follows_time=True)
+    def set_row_labels(self, sat_ids):
+        ticks = [(i*len(self.stations) + j + 1, row_label(sat_id, gs, self.stations))
+                 for i, sat_id in enumerate(sat_ids) for j, gs in enumerate(self.stations)]
+        self.access_plot.getAxis("left").setTicks((ticks,[]))
+    #Bars stay in the plot between updates. Each satellite's item is only given new data if its bars changed.
+    def draw_access_bars(self, matrix):
+        self.access_plot.removeItem(self.placeholder)
+        old_matrix, self.matrix = self.matrix, matrix
+        ts = self.window.resources.timescale
+        bounds = matrix.satellite_bounds()
+        old_bounds = old_matrix.satellite_bounds() if old_matrix is not None else None
+        #Satellites added since the labels were made (a follower satellite...)
+        if old_matrix is None or old_matrix.ids != matrix.ids:
+            self.set_row_labels(matrix.ids)
+        #Satellites that are gone take their bars with them
+        for sat_id in [sat_id for sat_id in self.bars if sat_id not in matrix.ids]:
+            self.access_plot.removeItem(self.bars.pop(sat_id))
+        for i, sat_id in enumerate(matrix.ids):
+            intervals = matrix.intervals[bounds[i]:bounds[i+1]]
+            if sat_id in self.bars and old_matrix is not None and old_matrix.ids == matrix.ids:
+                if np.array_equal(intervals, old_matrix.intervals[old_bounds[i]:old_bounds[i+1]]):
+                    continue
+            rows = intervals['sat'] * len(matrix.stations) + intervals['station'] + 1
+            bar_data = dict(x0=unix_time(ts, intervals['aos']), x1=unix_time(ts, intervals['los']), y=rows)
+            if sat_id in self.bars:
+                self.bars[sat_id].setOpts(**bar_data)
+            else:
+                self.bars[sat_id] = pg.BarGraphItem(height=0.5, brush='r', **bar_data)
+                self.access_plot.addItem(self.bars[sat_id])
+    def export_data(self):
+        if self.matrix is None:
+            return {"Access windows": {}}
+        return {"Access windows": export_access(self.matrix, self.window.resources.timescale)}
     #Go back to normal size and location when something else becomes the big widget
     def return_to_normal(self):
         self.window.grid.removeWidget(self.box)
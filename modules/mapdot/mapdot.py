@@ -1,27 +1,88 @@
 from PyQt5 import QtCore, QtGui
-from PyQt5.QtWidgets import QPushButton,QWidget,QAction, QDialog, QGridLayout, QLabel, QInputDialog, QSpinBox
+from PyQt5.QtWidgets import QPushButton,QWidget,QAction, QDialog, QGridLayout, QLabel, QInputDialog, QSpinBox, QCheckBox
 import pyqtgraph as pg
 import numpy as np
 #For loading image file
 import os
-from skyfield.api import load, EarthSatellite, wgs84, utc
-from skyfield.elementslib import osculating_elements_of
+from skyfield.api import wgs84
 from skyfield.framelib import itrs
-import datetime
+from propagation import WGS84_RADIUS_KM, WGS84_E2, geodetic_of
+from small_circle import small_circle, break_at_wrap
 
 EARTH_RADIUS = 6371
-HALFPI = np.pi/2
 TWOPI = np.pi*2
+#Ground tracks are sampled this many times per orbit
+TRACK_SAMPLES_PER_ORBIT = 100
+#The cached track reaches this many orbits either side of the current time, more than the one orbit
+#drawn each way, so as time moves on it only needs samples added at the front and dropped at the back
+TRACK_BUFFER_ORBITS = 1.25
+#In constellation mode, satellites not in SATS are drawn in this color, and names are only shown once
+#zooming in leaves no more than this many satellites in view
+CONSTELLATION_COLOR = "white"
+MAX_LABELS = 25
+
+#Without a window: where each satellite is at globaltime. Sensors are taken as nadir pointing.
+def headless_export(window, initparams):
+    positions = window.state.positions
+    sats_data = []
+    for sat in shown_satellites(window.cross_module_vars['TLES'], initparams.get('SATS', []), initparams.get('constellation', False)):
+        i = positions.index(sat["ID"])
+        sat_data = {"Name":sat["Name"],
+                    "Lat": positions.lat_deg[i, 0],
+                    "Lon": positions.lon_deg[i, 0],
+                    "Off-nadir mag":0,
+                    "Off-nadir dir":0}
+        sats_data.append(sat_data)
+    return {"sats":sats_data}
+
+#The SATS entries to draw. In constellation mode that's every satellite with a TLE, using its SATS entry
+#(name, color, FOV) if it has one.
+def shown_satellites(tles, sats, constellation):
+    if not constellation:
+        return sats
+    listed = {sat["ID"]: sat for sat in sats}
+    return [listed.get(sat_id, {"Name": str(sat_id), "ID": sat_id, "Color": CONSTELLATION_COLOR}) for sat_id in tles]
+
+# The ground track of one satellite around the current time, kept from tick to tick. Samples sit on a fixed
+# grid of times, so when time moves on, the ones still in range are kept and only the new ones at the
+# edges are propagated. Everything is thrown away when the TLE changes or globaltime jumps.
+class GroundTrackCache():
+    def __init__(self, propagator):
+        self.propagator = propagator
+        self.tle = None
+        self.indices = np.zeros(0, dtype=np.int64) #Grid index of each sample: its time is index * step
+        self.lat = np.zeros(0)
+        self.lon = np.zeros(0)
+    def update(self, sat_id, tle, time, jumped):
+        if tle != self.tle or jumped:
+            self.tle = tle
+            #Orbital period in days, from the mean motion (radians/minute)
+            self.period = TWOPI / self.propagator.resources.satellite(tle).model.no_kozai / 1440
+            self.step = self.period / TRACK_SAMPLES_PER_ORBIT
+            self.indices = np.zeros(0, dtype=np.int64)
+        reach = TRACK_BUFFER_ORBITS * self.period
+        indices = np.arange(np.floor((time.tt - reach) / self.step), np.ceil((time.tt + reach) / self.step) + 1).astype(np.int64)
+        #Where each sample was in the buffer
+        old_positions = indices - (self.indices[0] if len(self.indices) > 0 else 0)
+        kept = (old_positions >= 0) & (old_positions < len(self.indices))
+        lat = np.empty(len(indices))
+        lon = np.empty(len(indices))
+        lat[kept] = self.lat[old_positions[kept]]
+        lon[kept] = self.lon[old_positions[kept]]
+        if not kept.all():
+            new_times = time.ts.tt_jd(indices[~kept] * self.step)
+            positions = self.propagator.propagate({sat_id: tle}, new_times)
+            lat[~kept], lon[~kept] = positions.lat_deg[0], positions.lon_deg[0]
+        self.indices, self.lat, self.lon = indices, lat, lon
+    #Lon and lat of the samples between TT times start and end (end can be before start), in time order from start
+    def between(self, start, end):
+        times = self.indices * self.step
+        chosen = (times > min(start, end)) & (times <= max(start, end))
+        lon, lat = self.lon[chosen], self.lat[chosen]
+        if end < start:
+            return lon[::-1], lat[::-1]
+        return lon, lat
 
-#The haversine function
-def hav(value):
-    return (1 - np.cos(value)) / 2
-    
-#The archaversine function
-def archav(value):
-    if 0 < value < 1:
-        return np.arccos(1 - 2 * value)
-    
 class plotted_satellite():
     def __init__(self,name,ID,color,fov,plot_obj,window):
         self.name = name
@@ -32,15 +93,10 @@ class plotted_satellite():
         self.window = window
         self.dot = self.plot_obj.plot([0],[0],symbolBrush=color)
 
-        # 2 for each to account for wraparound at +/- 180
-        self.forwardline1 = self.plot_obj.plot(pen=pg.mkPen(color=color,width=2))
-        self.forwardline2 = self.plot_obj.plot(pen=pg.mkPen(color=color,width=2))
-        self.backwardline1 = self.plot_obj.plot(pen=pg.mkPen(color=color, style=QtCore.Qt.DashLine,width=2))
-        self.backwardline2 = self.plot_obj.plot(pen=pg.mkPen(color=color, style=QtCore.Qt.DashLine,width=2))
-
-        # Also 2 in case we need them for east/west
-        self.footprint_plot1 = self.plot_obj.plot(pen=pg.mkPen(color=color))
-        self.footprint_plot2 = self.plot_obj.plot(pen=pg.mkPen(color=color))
+        # Lines are broken with NaNs wherever they wrap around at +/- 180, so one item each is enough
+        self.forwardline = self.plot_obj.plot(pen=pg.mkPen(color=color,width=2), connect='finite')
+        self.backwardline = self.plot_obj.plot(pen=pg.mkPen(color=color, style=QtCore.Qt.DashLine,width=2), connect='finite')
+        self.footprint_plot = self.plot_obj.plot(pen=pg.mkPen(color=color), connect='finite')
         
         #Make a plot object for the sensor view patch
         self.sensor_plot = pg.ScatterPlotItem(size=4,pen=pg.mkPen(None),brush=pg.mkBrush(color=color))
@@ -51,69 +107,54 @@ class plotted_satellite():
         
         self.offaxis_mag = 0 #angle between boresight and nadir
         self.offaxis_dir = 0 #direction in which the boresight angle is away from nadir
+        self.ellipsoid = False #whether the sensor footprint is found on the WGS84 ellipsoid instead of a sphere
+
+        self.track_cache = GroundTrackCache(self.window.propagator)
         
     def update(self):
         TLE = self.window.cross_module_vars['TLES'][self.ID]
-        sat = EarthSatellite(*TLE)
-        ts = load.timescale()
-        time = ts.from_datetime(self.window.cross_module_vars['globaltime'].replace(tzinfo=utc))
+        sat = self.window.resources.satellite(TLE)
+        state = self.window.scheduler.state
+        time = state.time
         satpos = sat.at(time)
         self.now_lat,self.now_lon = wgs84.latlon_of(satpos)
         self.dot.setData([self.now_lon.degrees],[self.now_lat.degrees])
         self.plotted_name.setPos(self.now_lon.degrees, self.now_lat.degrees)
-        sat_period_minutes = osculating_elements_of(satpos).period_in_days*1440
-        
-        # Plotting the ground track for the next orbit
-        next_period = time + datetime.timedelta(minutes=sat_period_minutes)
-        timerange = ts.tt_jd(np.linspace(time.tt,next_period.tt,100))
-        geocentric = sat.at(timerange)
-        lat, lon = wgs84.latlon_of(geocentric)
-        points = list(zip(lon.degrees,lat.degrees))
-        #detect, for each point, whether it's a jump (wrap at 180) from the previous point
-        has_jump = [abs(points[i][0] - points[i-1][0]) > 20 for i in range(1,len(points))]
-        if any(has_jump):
-            jump_index = has_jump.index(True)+1
-            self.forwardline1.setData(*list(zip(*points[:jump_index])))
-            self.forwardline2.setData(*list(zip(*points[jump_index:])))
-        else:
-            self.forwardline1.setData(*list(zip(*points)))
-            self.forwardline2.setData([],[])
 
-        last_period = time - datetime.timedelta(minutes=sat_period_minutes)
-        timerange = ts.tt_jd(np.linspace(time.tt,last_period.tt,100))
-        geocentric = sat.at(timerange)
-        lat, lon = wgs84.latlon_of(geocentric)
-        points = list(zip(lon.degrees,lat.degrees))
-        #detect, for each point, whether it's a jump (wrap at 180) from the previous point
-        has_jump = [abs(points[i][0] - points[i-1][0]) > 20 for i in range(1,len(points))]
-        if any(has_jump):
-            jump_index = has_jump.index(True)+1
-            self.backwardline1.setData(*list(zip(*points[:jump_index])))
-            self.backwardline2.setData(*list(zip(*points[jump_index:])))
-        else:
-            self.backwardline1.setData(*list(zip(*points)))
-            self.backwardline2.setData([],[])
+        # The ground track for the next orbit and the last one, from the cache
+        self.track_cache.update(self.ID, TLE, time, state.jumped)
+        period = self.track_cache.period
+        for end, line in ((time.tt + period, self.forwardline), (time.tt - period, self.backwardline)):
+            lon, lat = self.track_cache.between(time.tt, end)
+            #Start the line at the satellite itself
+            lon = np.concatenate([[self.now_lon.degrees], lon])
+            lat = np.concatenate([[self.now_lat.degrees], lat])
+            line.setData(*break_at_wrap(lon, lat, -180, 360))
         #Now draw the (potentially displaced) sensor footprint
         #Note: Using -1 * position to get a nadir pointing vector
         if self.fov != 0:
             satpos_ECEF = satpos.frame_xyz(itrs).km
             nadir = -1 * satpos_ECEF
-            boresight = angle_offset_vector(nadir, self.offaxis_mag, self.offaxis_dir)
-            footprint = get_footprint_points(satpos_ECEF,self.fov, boresight)
-            self.sensor_plot.setData(*list(zip(*footprint)))
+            boresight = angle_offset_vectors(nadir, self.offaxis_mag, self.offaxis_dir)[0]
+            lat, lon = get_footprint_points(satpos_ECEF, self.fov, boresight, self.ellipsoid)
+            self.sensor_plot.setData(lon, lat)
+        else:
+            self.sensor_plot.setData([], [])
 
         #orbital distance from center of earth
-        altitude = wgs84.height_of(geocentric[0]).km + EARTH_RADIUS
+        altitude = wgs84.height_of(satpos).km + EARTH_RADIUS
         # size in lat/long degrees of the footprint
         # this is the angle, at center of earth, between the sat and horizon
         footprint_size = np.arccos(EARTH_RADIUS/altitude) #comes from trig
-        #List of polygons that need to be drawn
-        footprint = get_footprint_polygons(self.now_lat.radians,self.now_lon.radians,footprint_size) #0.1 radians
-        first_footprint = np.array(footprint[0])*180/np.pi
-        self.footprint_plot1.setData(*list(zip(*first_footprint)))
-        second_footprint = np.array(footprint[1])*180/np.pi
-        self.footprint_plot2.setData(*list(zip(*second_footprint)))
+        #The ring around the satellite, in as many pieces as it takes to stay on the map
+        lat, lon = small_circle(self.now_lat.radians,self.now_lon.radians,footprint_size)
+        self.footprint_plot.setData(*np.degrees(break_at_wrap(lon, lat)))
         
+    #Take everything this satellite drew off the map
+    def remove(self):
+        for item in (self.dot, self.forwardline, self.backwardline, self.footprint_plot, self.sensor_plot, self.plotted_name):
+            self.plot_obj.removeItem(item)
+
     def show_controls(self):
         class BoresightControlDialog(QDialog):
             def __init__(self, sat_to_control):
@@ -144,9 +185,14 @@ class plotted_satellite():
                 self.fovInput.setMaximum(180)
                 self.grid.addWidget(self.fovInput,2,1)
 
+                self.ellipsoidInput = QCheckBox("Project onto the WGS84 ellipsoid")
+                self.ellipsoidInput.setChecked(self.sat.ellipsoid)
+                self.grid.addWidget(self.ellipsoidInput,3,0,1,2)
+
                 self.magInput.valueChanged.connect(self.update_vals)
                 self.dirInput.valueChanged.connect(self.update_vals)
                 self.fovInput.valueChanged.connect(self.update_vals)
+                self.ellipsoidInput.stateChanged.connect(self.update_vals)
                 self.setLayout(self.grid)
             def update_vals(self):
                 new_mag = int(self.magInput.value())
@@ -155,11 +201,18 @@ class plotted_satellite():
                 self.sat.offaxis_mag = new_mag
                 self.sat.offaxis_dir = new_dir
                 self.sat.fov = new_fov
+                self.sat.ellipsoid = self.ellipsoidInput.isChecked()
         settingsWindow = BoresightControlDialog(self)
         settingsWindow.exec()
         
         
+# A world map with satellites on it. Each satellite in SATS gets its dot, name, ground track and footprints.
+# With the "constellation" initparam, every satellite with a TLE is instead one point of a single scatter
+# plot, placed from the tick's shared propagation. Tracks and footprints are then only drawn for the
+# satellites that are clicked on (selected) or hovered over, and names once zoomed in far enough.
 class mapdot():
+    SATS = []
+    constellation = False
     def __init__(self,window,initparams):
         #Iterate over everything in initparams.
         for key,value in initparams.items():
@@ -185,7 +238,10 @@ class mapdot():
         for sat in self.SATS:
             if "FOV" not in sat: #if no sensor is specified, make it zero
                 sat["FOV"] = 0
-            self.satellites.append(plotted_satellite(sat["Name"],sat["ID"],sat["Color"], sat["FOV"],self.map_plot,self.window))
+            if not self.constellation:
+                self.satellites.append(plotted_satellite(sat["Name"],sat["ID"],sat["Color"], sat["FOV"],self.map_plot,self.window))
+        if self.constellation:
+            self.setup_constellation()
 
         # Plot ground stations
         if 'Groundstations' in self.window.params:
@@ -217,18 +273,29 @@ class mapdot():
             sat_control_button = QAction(sat.name, self.window)
             offset_submenu.addAction(sat_control_button)
             sat_control_button.triggered.connect(sat.show_controls)
+        if self.constellation:
+            clear_selection = QAction(self.name + ": Clear selected satellites",self.window)
+            self.window.modulesMenu.addAction(clear_selection)
+            clear_selection.triggered.connect(self.clear_selection)
 
 
-        #Set up QTimer, every time it runs its cycle (set by self_update_ms) it will run self.update, which updates map
-        self.updater = QtCore.QTimer()
-        self.updater.timeout.connect(self.update)
-        self.updater.start(self.self_update_ms)
+        #Register with the window's scheduler, which will run self.update every self_update_ms
+        self.window.scheduler.register(self, self.update, self.self_update_ms)
         self.update()
 
     def update(self):
+        if self.constellation:
+            self.update_constellation()
         for sat in self.satellites:
             sat.update()
     def export_data(self):
+        if self.constellation:
+            positions = self.window.scheduler.state.positions
+            return {"sats":[{"Name":sat["Name"],
+                             "Lat": positions.lat_deg[i, 0],
+                             "Lon": positions.lon_deg[i, 0],
+                             "Off-nadir mag":0,
+                             "Off-nadir dir":0} for i, sat in enumerate(self.shown)]}
         sats_data = []
         for sat in self.satellites:
             sat_data = {"Name":sat.name,
@@ -238,6 +305,82 @@ class mapdot():
                         "Off-nadir dir":sat.offaxis_dir}
             sats_data.append(sat_data)
         return {"sats":sats_data}
+
+    def setup_constellation(self):
+        self.shown = [] #SATS entries of the points, in the order of the propagation's satellites
+        self.shown_ids = None #The IDs self.shown was made for
+        self.selected = [] #IDs clicked on
+        self.hovered = None
+        #plotted_satellite of each selected or hovered satellite, by ID
+        self.details = {}
+        self.dots = pg.ScatterPlotItem(size=7, pen=pg.mkPen(None), hoverable=True,
+                                       tip=lambda x, y, data: self.shown[data]["Name"])
+        self.map_plot.addItem(self.dots)
+        self.dots.sigClicked.connect(self.dot_clicked)
+        self.dots.sigHovered.connect(self.dot_hovered)
+        #Names are shown with a few reused text items, not one per satellite
+        self.labels = []
+        self.lon = self.lat = np.zeros(0)
+        self.map_plot.getViewBox().sigRangeChanged.connect(self.update_labels)
+    def update_constellation(self):
+        positions = self.window.scheduler.state.positions
+        #Every satellite is placed from the one propagation the whole tick shares
+        if self.shown_ids != positions.ids:
+            self.shown_ids = list(positions.ids)
+            self.shown = shown_satellites(dict.fromkeys(positions.ids), self.SATS, True)
+            brushes = {}
+            self.brushes = np.array([brushes.setdefault(sat["Color"], pg.mkBrush(sat["Color"])) for sat in self.shown], dtype=object)
+            self.selected = [sat_id for sat_id in self.selected if sat_id in self.shown_ids]
+            self.update_details()
+        self.lon = positions.lon_deg[:, 0]
+        self.lat = positions.lat_deg[:, 0]
+        #Satellites SGP4 failed for have no position
+        placed = np.nonzero(np.isfinite(self.lon) & np.isfinite(self.lat))[0]
+        self.dots.setData(x=self.lon[placed], y=self.lat[placed], data=placed, brush=self.brushes[placed])
+        self.update_labels()
+    def dot_clicked(self, item, points, ev):
+        sat_id = self.shown[points[0].data()]["ID"]
+        if sat_id in self.selected:
+            self.selected.remove(sat_id)
+        else:
+            self.selected.append(sat_id)
+        self.update_details()
+    def dot_hovered(self, item, points, ev):
+        hovered = self.shown[points[0].data()]["ID"] if len(points) > 0 else None
+        if hovered != self.hovered:
+            self.hovered = hovered
+            self.update_details()
+    def clear_selection(self):
+        self.selected = []
+        self.update_details()
+    #Draw tracks and footprints for the selected and hovered satellites, and stop drawing them for the rest
+    def update_details(self):
+        wanted = self.selected + ([self.hovered] if self.hovered is not None and self.hovered not in self.selected else [])
+        for sat_id in list(self.details):
+            if sat_id not in wanted:
+                self.details.pop(sat_id).remove()
+        for sat in self.shown:
+            if sat["ID"] in wanted and sat["ID"] not in self.details:
+                detail = plotted_satellite(sat["Name"],sat["ID"],sat["Color"], sat.get("FOV", 0),self.map_plot,self.window)
+                detail.update()
+                self.details[sat["ID"]] = detail
+        self.satellites = list(self.details.values())
+    #Names of the satellites in view, if zoomed in far enough that there aren't too many
+    def update_labels(self):
+        (x_min, x_max), (y_min, y_max) = self.map_plot.getViewBox().viewRange()
+        in_view = np.nonzero((self.lon >= x_min) & (self.lon <= x_max) & (self.lat >= y_min) & (self.lat <= y_max))[0]
+        if len(in_view) > MAX_LABELS:
+            in_view = in_view[:0]
+        while len(self.labels) < len(in_view):
+            label = pg.TextItem(anchor=(0.5,0.1))
+            self.map_plot.addItem(label)
+            self.labels.append(label)
+        for label, i in zip(self.labels, in_view):
+            label.setText(self.shown[i]["Name"], color=self.shown[i]["Color"])
+            label.setPos(self.lon[i], self.lat[i])
+            label.setVisible(True)
+        for label in self.labels[len(in_view):]:
+            label.setVisible(False)
     #Go back to normal size and location when something else becomes the big widget
     def return_to_normal(self):
         self.window.grid.removeWidget(self.box)
@@ -245,114 +388,55 @@ class mapdot():
     def enlarge(self,new_geometry):
         self.window.grid.removeWidget(self.box)
         self.window.grid.addWidget(self.box, new_geometry[1], new_geometry[0], new_geometry[3], new_geometry[2])
-def get_footprint_points(sat_pos, fov_deg, boresight_vec):
-    cone_vectors = []
-    for angle in np.linspace(0,360,100):
-        cone_vector = angle_offset_vector(boresight_vec, fov_deg / 2, angle)
-        cone_vectors.append(cone_vector)
-    #Now we have our cone describing the boresight. For each vector, find where it hits the earth.
-    intersect_latlongs = []
-    for v in cone_vectors:
-        #attempt to find an earth intersect
-        intersect = find_earth_intersect(sat_pos, v)
-        if intersect:
-            intersect_latlongs.append(intersect)
-    return intersect_latlongs
-        
-def find_earth_intersect(sat_pos,projected_vector):
+#Lat and lon (degrees) where the edge of a sensor's field of view meets the ground: a cone of rays fov_deg
+#wide around boresight_vec, from sat_pos (ITRS, km). The whole cone is built and intersected at once.
+def get_footprint_points(sat_pos, fov_deg, boresight_vec, ellipsoid = False, samples = 100):
+    cone_vectors = angle_offset_vectors(boresight_vec, fov_deg / 2, np.linspace(0,360,samples))
+    return find_earth_intersects(sat_pos, cone_vectors, ellipsoid)
+
+#Where rays from sat_pos along each of directions ([ray, xyz]) first hit the earth, as lat and lon arrays
+#(degrees). Rays that miss are left out. All rays are solved as one vectorized quadratic.
+#The earth is a sphere, unless ellipsoid is True: then it is the WGS84 ellipsoid (squashed into a sphere by
+#stretching z), and the latitudes are geodetic.
+def find_earth_intersects(sat_pos, directions, ellipsoid = False):
     #https://math.stackexchange.com/questions/1939423/calculate-if-vector-intersects-sphere
     #"suppose the line passes through the point P", P is the satellite's location.
     # Since the sphere is centered at C, and that's our origin, we can simplify a bit.
-    a = np.dot(projected_vector,projected_vector)
-    b = 2 * np.dot(sat_pos,projected_vector)
-    c = np.dot(sat_pos,sat_pos) - EARTH_RADIUS*EARTH_RADIUS
-    quad_solutions = np.roots([a,b,c])
-    # We will get complex solutions if the vector does not intersect the earth. Filter those out.
-    real_solutions = [x for x in quad_solutions if not np.iscomplex(x)]
-    if len(real_solutions):
-        #There are two solutions - one when the vector enters the earth, and one when it exits the other side.
-        entry_solution = min(real_solutions)
-        entry_location = sat_pos + entry_solution * projected_vector
-        _, entry_lat, entry_lon = cart_to_sph(entry_location, toDeg = True)
-        return entry_lon,entry_lat
-#Given a cartesian vector (X, Y, Z), return a spherical vector(R, lat, long)
-#We use a spherical convention where 0 lat is on equator; this differs from some other conventions.
-#give toDeg=True to convert to degrees.
-def cart_to_sph(cart_in, toDeg = False):
-    x,y,z = cart_in
-    R = np.linalg.norm(cart_in)
-    lat = np.arcsin(z/R)
-    lon = np.arctan2(y,x)
-    if toDeg:
-        lat *= (180/np.pi)
-        lon *= (180/np.pi)
-    return [R,lat,lon]
-#Given a spherical vector(R, lat, lon), return a cartesian vector (X, Y, Z)
-def sph_to_cart(sph_in, isDeg = False):
-    if isDeg:
-        lat = sph_in[1] * np.pi/180
-        lon = sph_in[2] * np.pi/180
-    else:
-        lat = sph_in[1]
-        lon = sph_in[2]
-    lat = np.pi/2 - lat #handle the change of convention
-    R = sph_in[0]
-    x = R * np.sin(lat) * np.cos(lon)
-    y = R * np.sin(lat) * np.sin(lon)
-    z = R * np.cos(lat)
-    return [x,y,z]
+    radius, stretch = (WGS84_RADIUS_KM, np.array([1, 1, 1 / np.sqrt(1 - WGS84_E2)])) if ellipsoid else (EARTH_RADIUS, np.ones(3))
+    p = sat_pos * stretch
+    d = directions * stretch
+    a = np.sum(d * d, axis=1)
+    b = 2 * (d @ p)
+    c = p @ p - radius * radius
+    discriminant = b * b - 4 * a * c
+    #No real solutions: the ray does not intersect the earth
+    hit = discriminant >= 0
+    #Of the two solutions, the smaller is where the ray enters the earth. It has to be in front of the satellite.
+    entry = (-b[hit] - np.sqrt(discriminant[hit])) / (2 * a[hit])
+    in_front = entry > 0
+    entry_locations = sat_pos + entry[in_front, None] * directions[hit][in_front]
+    if ellipsoid:
+        lat, lon, height = geodetic_of(entry_locations)
+        return lat, lon
+    x, y, z = entry_locations.T
+    return np.degrees(np.arcsin(z / np.linalg.norm(entry_locations, axis=1))), np.degrees(np.arctan2(y, x))
 
-#Given a cartesian vector (X,Y,Z), return a vector which is offset from that vector, by a particular angle.
+#Given a cartesian vector (X,Y,Z), return vectors which are offset from that vector by a particular angle,
+#one for each of an array of directions, shaped [direction, xyz].
 #Magnitude = how far the vector is turned, direction = compass direction of that turning.
 #Best example: Start with a nadir vector, then generate a vector which is 10 degrees from it, off-nadir toward the southwest.
 #magnitude is 10 degrees, direction is 225 degrees.
-#Start_vec can be any XYZ vector, magnitude and direction are degrees.
-def angle_offset_vector(start_vec, magnitude, direction):
+#Start_vec can be any XYZ vector, magnitude and directions are degrees.
+def angle_offset_vectors(start_vec, magnitude, directions):
     start_unitvec = start_vec / np.linalg.norm(start_vec)
-    start_unitvec_sph = cart_to_sph(start_unitvec, toDeg = True)
-    #we now have a spherical unit vector pointing along our start vector.
     #Due to spherical coordinates having consistent latitude angles, we can generate a vector diverted from the start toward the north, by just adding the magnitude to the latitude component.
-    north_diverted_sph = [1, start_unitvec_sph[1] + magnitude, start_unitvec_sph[2]]
-    north_diverted_cart = sph_to_cart(north_diverted_sph, isDeg = True)
-    #Now, to rotate to an arbitrary angle, we can use the axis-angle rotation matrix. We take our diverted vector and revolve it around the initial unit vector.
-    #https://en.wikipedia.org/wiki/Rotation_matrix#Rotation_matrix_from_axis_and_angle
-    ux, uy, uz = start_unitvec
-    angle = direction * np.pi/180 #convert to radians
-    #Precalculate the cosine and sine of theta, for the sake of conciseness
-    ct = np.cos(angle)
-    st = np.sin(angle)
-    rot_matrix = np.matrix([[ct + ux*ux*(1-ct),    ux*uy*(1-ct)-uz*st,   ux*uz*(1-ct) + uy*st],
-                            [uy*ux*(1-ct) + uz*st, ct+uy*uy*(1-ct),      uy*uz*(1-ct) - ux*st],
-                            [uz*ux*(1-ct) - uy*st, uz*uy*(1-ct) + ux*st, ct + uz*uz*(1-ct)]])
-    resulting_vector = np.array(np.matmul(rot_matrix, north_diverted_cart)).flatten()
-    return resulting_vector
-
-def get_footprint_polygons(center_lat, center_lon, radius):
-    #Use the haversine formula, inverted.
-    points_left_of_center = []
-    points_right_of_center = []
-    # generate latitudes which are above and below the center. For each, find the longitude.
-    for lat in np.linspace(-HALFPI, HALFPI, 1000): #last arg is the resolution of the circle
-        numerator = hav(radius) - hav(lat - center_lat)
-        denom = np.cos(center_lat) * np.cos(lat)
-        lon_shift = archav( numerator / denom ) #will be None if out of bounds of archav
-        if lon_shift is not None:
-            points_right_of_center.append([(center_lon + lon_shift + np.pi)%TWOPI-np.pi,lat])
-            points_left_of_center.append([(center_lon - lon_shift + np.pi)%TWOPI-np.pi,lat])
-    # This will generate points that go clockwise around, going up the left and down the right.
-    points_to_plot = [*points_left_of_center, *reversed(points_right_of_center)]
-    #append the last one, so that we form a complete closed shape
-    points_to_plot.append(points_to_plot[0])
-
-    # If the polygon crosses any of the limits of the map, we get literal edge cases to deal with.
-    # This is detectable by comparing our coordinates.
-    # but if we aren't near the edge, then put everything in one polygon (arbitrarily, left)
-    # We can't cross both 0-longitude and 180-longitude, so if we're closer to 0 (under pi/2)
-    # then just build it as one polygon.
-    if abs(center_lon) < np.pi/2:
-        left_polygon = points_to_plot
-        right_polygon = []
-    else:
-        left_polygon = [p for p in points_to_plot if p[0] < 0]
-        right_polygon = [p for p in points_to_plot if p[0] > 0]
-    return [left_polygon, right_polygon]
\ No newline at end of file
+    lat = np.arcsin(start_unitvec[2]) + np.radians(magnitude)
+    lon = np.arctan2(start_unitvec[1], start_unitvec[0])
+    north_diverted = np.array([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+    #Now, to rotate to each angle, we revolve the diverted vector around the initial unit vector (Rodrigues' rotation formula,
+    #the same rotation as the axis-angle matrix), for all the angles at once.
+    #https://en.wikipedia.org/wiki/Rodrigues%27_rotation_formula
+    angles = np.radians(np.atleast_1d(directions))[:, None]
+    along_axis = start_unitvec * np.dot(start_unitvec, north_diverted)
+    return (north_diverted * np.cos(angles) + np.cross(start_unitvec, north_diverted) * np.sin(angles)
+            + along_axis * (1 - np.cos(angles)))
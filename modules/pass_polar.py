@@ -1,8 +1,8 @@
-from PyQt5 import QtCore
 from PyQt5.QtWidgets import QPushButton, QGraphicsEllipseItem
 import pyqtgraph as pg
 import numpy as np
-from skyfield.api import load, EarthSatellite, wgs84, utc
+from skyfield.api import wgs84
+from pass_kernel import StationSet, satellite_itrs
 
 # Transform alt, az numbers to the xy native plot coordinates
 def polar_plot_coords(alt, az):
@@ -15,11 +15,116 @@ def polar_plot_coords(alt, az):
     x = r_value * np.cos(theta_value)
     y = r_value * np.sin(theta_value)
     return x,y
-# The reverse of the prior function, used for exporting
-def xy_to_altaz(x, y):
-    alt = 90 - np.sqrt(x**2 + y**2)
-    az = (90 - np.arctan2(y,x) * 180/np.pi) % 360
+#Sky arcs are sampled on a fixed grid of times this far apart (s), so one tick's samples still fit the next
+ARC_STEP_S = 20
+#The arc reaches this far (s) either side of the current time
+ARC_HALF_S = 600
+#Grid indices of the arc samples from 10 minutes before time to 10 minutes after
+def arc_indices(time):
+    seconds = time.tt * 86400
+    return np.arange(np.ceil((seconds - ARC_HALF_S) / ARC_STEP_S), np.floor((seconds + ARC_HALF_S) / ARC_STEP_S) + 1)
+#Alt/az (degrees) of a satellite at grid indices, in one vectorized call. NaN where it's below the horizon,
+#so the arc can be drawn with gaps (connect='finite') from arrays that always have the same layout.
+def arc_samples(sight_diff, ts, indices):
+    alt, az, dist = sight_diff.at(ts.tt_jd(indices * ARC_STEP_S / 86400)).altaz()
+    alt, az = alt.degrees, az.degrees
+    below = alt <= 0
+    alt[below] = np.nan
+    az[below] = np.nan
     return alt, az
+def sky_arc(sight_diff, time, ts):
+    return arc_samples(sight_diff, ts, arc_indices(time))
+#(alt, az) pairs of the parts of an arc above the horizon, for exporting
+def arc_altaz_pairs(alt, az):
+    above = np.isfinite(alt)
+    return list(zip(alt[above].tolist(), az[above].tolist()))
+
+# The arc of one satellite across the sky, kept from tick to tick. When time moves on, the samples still
+# in range are shifted along, and only the ones newly in range are computed.
+class SkyArc():
+    def __init__(self):
+        self.key = None
+        self.indices = np.zeros(0)
+        self.alt = np.zeros(0)
+        self.az = np.zeros(0)
+    #key says what the arc is of (satellite and ground station objects); if it changes, everything is recomputed
+    def update(self, key, sight_diff, time, ts):
+        indices = arc_indices(time)
+        #Where each sample was in the last arc
+        old_positions = (indices - (self.indices[0] if len(self.indices) > 0 else 0)).astype(int)
+        kept = (old_positions >= 0) & (old_positions < len(self.indices)) & (key == self.key)
+        alt = np.empty(len(indices))
+        az = np.empty(len(indices))
+        alt[kept] = self.alt[old_positions[kept]]
+        az[kept] = self.az[old_positions[kept]]
+        if not kept.all():
+            alt[~kept], az[~kept] = arc_samples(sight_diff, ts, indices[~kept])
+        self.key, self.indices, self.alt, self.az = key, indices, alt, az
+#Spacing (s) of the samples in a pass track. Very long passes (high orbits) get at most TRACK_MAX_SAMPLES.
+TRACK_STEP_S = 1
+TRACK_MAX_SAMPLES = 20000
+#Passes are looked for from this far (days) before the current time, to find one already under way,
+#to this far after it
+TRACK_LOOKBACK_DAYS = 0.25
+TRACK_LOOKAHEAD_DAYS = 1
+
+# Alt/az, range and range rate through one whole pass, sampled densely once when the pass is found.
+# Each tick only interpolates into it.
+class PassTrack():
+    def __init__(self, satrec, ts, station_set, pass_row):
+        self.pass_row = pass_row #The pass, as PASS_DTYPE
+        aos, los = pass_row['aos'], pass_row['los']
+        count = int(min(np.ceil((los - aos) * 86400 / TRACK_STEP_S), TRACK_MAX_SAMPLES - 1)) + 1
+        self.tt = np.linspace(aos, los, count)
+        position, velocity = satellite_itrs(satrec, ts, self.tt)
+        self.alt, self.az, self.range_km, self.range_rate = station_set.look_angles(0, position, velocity)
+        #Azimuth without jumps at north, so it can be interpolated
+        self.unwrapped_az = np.degrees(np.unwrap(np.radians(self.az)))
+    #Alt and az (degrees) at TT time tt, or None outside the pass
+    def altaz(self, tt):
+        if not self.tt[0] <= tt <= self.tt[-1]:
+            return None
+        return np.interp(tt, self.tt, self.alt), np.interp(tt, self.tt, self.unwrapped_az) % 360
+    def export(self, ts):
+        return {"AOS": ts.tt_jd(self.pass_row['aos']).utc_datetime(),
+                "TCA": ts.tt_jd(self.pass_row['tca']).utc_datetime(),
+                "LOS": ts.tt_jd(self.pass_row['los']).utc_datetime(),
+                "Max elevation": float(self.pass_row['max_el']),
+                "Seconds from AOS": ((self.tt - self.tt[0]) * 86400).tolist(),
+                "ALT": self.alt.tolist(),
+                "AZ": self.az.tolist(),
+                "RANGE_KM": self.range_km.tolist(),
+                "RANGE_RATE_KM_S": self.range_rate.tolist()}
+
+#The track of the pass under way at time, or else the next one (None if there's none within a day),
+#and the TT times between which that is still the right pass
+def find_pass_track(pass_cache, satellite, tle, skyfield_groundstation, station_set, time):
+    ts = time.ts
+    search_start = time - TRACK_LOOKBACK_DAYS
+    search_end = time + TRACK_LOOKAHEAD_DAYS
+    passes = pass_cache.passes(tle, skyfield_groundstation, search_start, search_end)
+    earlier, later = passes[passes['los'] < time.tt], passes[passes['los'] >= time.tt]
+    valid_from = earlier['los'][-1] if len(earlier) > 0 else search_start.tt
+    if len(later) == 0:
+        return None, valid_from, search_end.tt
+    return PassTrack(satellite.model, ts, station_set, later[0]), valid_from, later['los'][0]
+
+#Without a window: each satellite's arc across the sky around globaltime
+def headless_export(window, initparams):
+    for gs in window.params['Groundstations']:
+        if gs['Name'] == initparams['groundstation']:
+            groundstation = wgs84.latlon(gs['Lat'],gs['Lon'])
+            break
+    data_out = {}
+    data_out['satellites'] = []
+    for sat in initparams['SATS']:
+        TLE = window.cross_module_vars['TLES'][sat["ID"]]
+        satellite = window.resources.satellite(TLE)
+        alt, az = sky_arc(satellite - groundstation, window.state.time, window.resources.timescale)
+        track = find_pass_track(window.pass_cache, satellite, TLE, groundstation, StationSet([(groundstation, 0.0)]), window.state.time)[0]
+        data_out['satellites'].append({"ID": sat["ID"], "ALT/AZ": arc_altaz_pairs(alt, az),
+                                       "Pass track": track.export(window.resources.timescale) if track is not None else None})
+    return data_out
 class plotted_satellite():
     def __init__(self,ID,color,plot_obj,window, skyfield_gs):
         self.ID = ID
@@ -31,30 +136,33 @@ class plotted_satellite():
         self.dot = self.plot_obj.plot([],[],symbolBrush=color)
         # path of sat across sky
         self.arc = self.plot_obj.plot([],[],pen=pg.mkPen(color))
+        self.sky_arc = SkyArc()
+        self.station_set = StationSet([(skyfield_gs, 0.0)])
+        #Track of the current or next pass, found through the window's pass cache. It stays the right
+        #one while time is within track_valid, and the TLE is the same.
+        self.track = None
+        self.track_tle = None
+        self.track_valid = (np.inf, -np.inf)
 
     def update(self):
         TLE = self.window.cross_module_vars['TLES'][self.ID]
-        sat = EarthSatellite(*TLE)
-        ts = load.timescale()
-        time = ts.from_datetime(self.window.cross_module_vars['globaltime'].replace(tzinfo=utc))
-        sight_diff = sat - self.gs
-        sight_vector = sight_diff.at(time)
-        alt,az,dist = sight_vector.altaz()
-        if alt.degrees > 0:
-            plotcoords = polar_plot_coords(alt.degrees,az.degrees)
+        sat = self.window.resources.satellite(TLE)
+        ts = self.window.resources.timescale
+        time = self.window.scheduler.state.time
+        if TLE != self.track_tle or not self.track_valid[0] <= time.tt <= self.track_valid[1]:
+            self.track, valid_from, valid_until = find_pass_track(self.window.pass_cache, sat, TLE, self.gs, self.station_set, time)
+            self.track_tle = TLE
+            self.track_valid = (valid_from, valid_until)
+        altaz = self.track.altaz(time.tt) if self.track is not None else None
+        if altaz is not None:
+            plotcoords = polar_plot_coords(*altaz)
             self.dot.setData([plotcoords[0]],[plotcoords[1]])
         else:
             self.dot.setData([],[])
-        #draw the line starting 10 minutes before
-        line_starttime = time.tt - 600/86400
-        line_xy = []
-        for i in range(0,1200,20):
-            line_time = ts.tt_jd(line_starttime + i/86400)
-            sight_vector = sight_diff.at(line_time)
-            alt,az,dist = sight_vector.altaz()
-            if alt.degrees > 0:
-                line_xy.append(polar_plot_coords(alt.degrees,az.degrees))
-        self.arc.setData(*zip(*line_xy))
+        sight_diff = sat - self.gs
+        #draw the line starting 10 minutes before, with gaps where the satellite is below the horizon
+        self.sky_arc.update((sat, self.gs), sight_diff, time, ts)
+        self.arc.setData(*polar_plot_coords(self.sky_arc.alt, self.sky_arc.az), connect='finite')
 
 class pass_polar():
     def __init__(self,window,initparams):
@@ -100,10 +208,8 @@ class pass_polar():
         for sat in self.SATS:
             self.satellites.append(plotted_satellite(sat["ID"],sat["Color"],self.polar_plot,self.window, self.groundstation))
 
-        #Set up QTimer, every time it runs its cycle (set by self_update_ms) it will run self.update, which updates map
-        self.updater = QtCore.QTimer()
-        self.updater.timeout.connect(self.update)
-        self.updater.start(self.self_update_ms)
+        #Register with the window's scheduler, which will run self.update every self_update_ms
+        self.window.scheduler.register(self, self.update, self.self_update_ms)
         self.update()
         
         #Expansion button to make the main widget thing
@@ -118,8 +224,9 @@ class pass_polar():
         for sat in self.satellites:
             sat_data = {}
             sat_data['ID'] = sat.ID
-            altaz = [xy_to_altaz(x,y) for x,y in zip(*sat.arc.getData())]
-            sat_data["ALT/AZ"] = altaz
+            sat_data["ALT/AZ"] = arc_altaz_pairs(sat.sky_arc.alt, sat.sky_arc.az)
+            #The whole current (or next) pass, as computed, not just what's on screen
+            sat_data["Pass track"] = sat.track.export(self.window.resources.timescale) if sat.track is not None else None
             data_out['satellites'].append(sat_data)
         return data_out
     #Go back to normal size and location when something else becomes the big widget
@@ -1,14 +1,87 @@
 from PyQt5.QtWidgets import QPushButton, QVBoxLayout
 import pyqtgraph as pg
 
+import datetime
+import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvas
 
-from skyfield.api import load,EarthSatellite,wgs84
+from skyfield.api import wgs84
+from pass_cache import PASS_DTYPE, unix_time
+from pass_kernel import station_mask
+from pass_export import export_passes
 
 tracking_days = 14
+#The mouse counts as over a marker this many pixels outside its edge too, like matplotlib's own picking
+pick_radius_px = 5
+
+#Passes over the next days from start_time, from the window's pass cache. Only whole passes are kept,
+#not ones already under way at start_time or still going at the end.
+#Doesn't touch any widgets, so it can run on a worker thread or without a window.
+def find_passes(pass_cache, TLE, skyfield_groundstation, start_time, days = tracking_days, mask = 0.0):
+    passes = pass_cache.passes(TLE, skyfield_groundstation, start_time, start_time + days, mask)
+    return passes[~passes['open_start'] & ~passes['open_end']]
+# Convert the times in a pass to human readable UTC times
+def export_pass(ts, p):
+    exported_pass = {}
+    exported_pass['start'] = ts.tt_jd(p['aos']).utc_datetime()
+    exported_pass['max_el'] = float(p['max_el'])
+    exported_pass['end'] = ts.tt_jd(p['los']).utc_datetime()
+    return exported_pass
+#Without a window: search passes from globaltime, over tracking_days or the "days" initparam
+def headless_export(window, initparams):
+    for gs in window.params['Groundstations']:
+        if gs['Name'] == initparams['groundstation']:
+            gs_data = gs
+            break
+    skyfield_groundstation = wgs84.latlon(gs_data["Lat"],gs_data["Lon"])
+    TLE = window.cross_module_vars['TLES'][initparams['sat_id']]
+    #Long horizons go straight to a pass file instead of the export JSON
+    if "pass_file" in initparams:
+        start = window.state.time
+        count = export_passes(initparams['pass_file'], {initparams['sat_id']: TLE}, [gs_data],
+                              start, start + initparams.get("days", tracking_days))
+        return {"Pass_file": initparams['pass_file'], "Pass_count": count}
+    passes = find_passes(window.pass_cache, TLE, skyfield_groundstation, window.state.time,
+                         initparams.get("days", tracking_days), station_mask(gs_data))
+    return {"All_passes": [export_pass(window.resources.timescale, p) for p in passes]}
+
+# Finds the pass under the mouse without testing every marker on the calendar. Passes are sorted by day
+# column and then time of day, so only the few in the columns next to the mouse are looked at.
+class CalendarIndex():
+    #columns and hours are each pass's place on the calendar, radii_pt the radius of its marker in points
+    def __init__(self, columns, hours, radii_pt):
+        self.order = np.lexsort((hours, columns))
+        self.columns = columns[self.order]
+        self.hours = hours[self.order]
+        self.radii_pt = radii_pt[self.order]
+
+    #Index (into the passes the index was built from) of the marker under display point (x, y), or None
+    def pass_at(self, ax, x, y):
+        if len(self.order) == 0:
+            return None
+        radii_px = self.radii_pt * ax.figure.dpi / 72 + pick_radius_px
+        #How far in data units the biggest marker reaches from its center
+        max_radius_px = radii_px.max()
+        to_data = ax.transData.inverted()
+        (x_data, y_data), (x_reach, y_reach) = to_data.transform([(x, y), (x + max_radius_px, y + max_radius_px)])
+        dx, dy = abs(x_reach - x_data), abs(y_reach - y_data)
+        first = np.searchsorted(self.columns, x_data - dx, 'left')
+        last = np.searchsorted(self.columns, x_data + dx, 'right')
+        near = first + np.nonzero(np.abs(self.hours[first:last] - y_data) <= dy)[0]
+        if len(near) == 0:
+            return None
+        #Exact test, in display pixels, on the few that are left
+        centers = ax.transData.transform(np.stack([self.columns[near], self.hours[near]], axis=1))
+        distances = np.hypot(centers[:, 0] - x, centers[:, 1] - y)
+        inside = distances <= radii_px[near]
+        if not np.any(inside):
+            return None
+        return int(self.order[near[inside][np.argmin(distances[inside])]])
 
 class passfinder():
+    #How often to check whether the calendar needs to move on, unless set in initparams
+    self_update_ms = 60000
     def __init__(self,window,initparams):
         #Iterate over everything in initparams.
         for key,value in initparams.items():
@@ -21,9 +94,13 @@ class passfinder():
         self.box.setBackground(self.color)
 
         self.fig, self.ax = plt.subplots()
-        # Invert Y axis, so time flows down, like a Google Calendar
-        self.ax.set_ylim(self.ax.get_ylim()[::-1])
         self.plotWidget = FigureCanvas(self.fig)
+        #These give passes labels on mouseover, and jump to them on click
+        self.fig.canvas.mpl_connect("motion_notify_event", self.hover)
+        self.fig.canvas.mpl_connect("button_press_event", self.click)
+        #The mouseover label is blitted over a saved copy of the calendar, taken after every full draw
+        self.fig.canvas.mpl_connect("draw_event", self.save_background)
+        self.background = None
 
         #Create a plot holder and place the plot inside of it
         self.plotHolder = QVBoxLayout(self.box)
@@ -37,9 +114,22 @@ class passfinder():
             if gs['Name'] == self.groundstation:
                 self.gs_data = gs
                 break
+        self.skyfield_groundstation = wgs84.latlon(self.gs_data["Lat"],self.gs_data["Lon"])
         
-        self.TLE = self.window.cross_module_vars['TLES'][self.sat_id]
-        self.plot_passes()
+        #The pass search takes a while, so it runs in the background. Show a placeholder until it's done.
+        self.passes = np.zeros(0, dtype=PASS_DTYPE)
+        self.scatter = None
+        self.index = None
+        self.annot = None
+        self.highlighted = None
+        self.placeholder = self.ax.text(0.5, 0.5, "Computing passes...", transform=self.ax.transAxes, ha='center', va='center')
+        #The calendar starts at midnight (UTC) of this day, and moves on when globaltime reaches a new day
+        self.shown_day = None
+        self.shown_TLE = None
+        self.job_key = self.name + ": passes"
+        #Register with the window's scheduler, which will run self.update every self_update_ms
+        self.window.scheduler.register(self, self.update, self.self_update_ms)
+        self.update()
 
         #Expansion button to make the main widget thing
         self.mainwidgetbutton = QPushButton("⛶",self.box)
@@ -47,110 +137,121 @@ class passfinder():
         self.mainwidgetbutton.move(10,0)
         self.mainwidgetbutton.setStyleSheet("background-color:#bbbbbb")
         self.mainwidgetbutton.clicked.connect(lambda:self.window.set_largeCentralPanel(self))
-    def plot_passes(self):
+    #Ask for the calendar's passes again. Only the newest days are actually searched, the rest comes from the pass cache.
+    def update(self):
+        day = self.window.cross_module_vars['globaltime'].date()
+        TLE = self.window.cross_module_vars['TLES'][self.sat_id]
+        if day == self.shown_day and TLE == self.shown_TLE:
+            return
+        if self.window.workers.is_pending(self.job_key):
+            return
+        self.shown_day = day
+        self.shown_TLE = TLE
+        #The first column of the calendar the search is for
+        self.calendar_day = day
+        ts = self.window.resources.timescale
+        start_time = ts.utc(day.year, day.month, day.day)
+        self.window.workers.submit(self.job_key, find_passes, self.plot_passes,
+                                   self.window.pass_cache, TLE, self.skyfield_groundstation, start_time,
+                                   tracking_days, station_mask(self.gs_data))
+    #Called with the result of find_passes, once the background search finishes.
+    #Draws on self.ax directly, since by now pyplot's current figure may belong to another module.
+    #Everything drawn here stays until the passes change. Mouseover only redraws the label.
+    def plot_passes(self, passes):
+        #Nothing new to draw
+        if self.scatter is not None and np.array_equal(passes, self.passes):
+            return
+        self.passes = passes
+        self.ax.clear()
         #color-code passes using the autumn color map
         cmap = plt.get_cmap('autumn')
-        self.passes = self.get_passes()
-        starts = [p["start"] for p in self.passes]
-        maxels = [p["max_el"] for p in self.passes]
-        #Split the date and time of each of the starts. We plot x as date and y as time.
-        pass_dates = [] #day
-        pass_tods = []  #time of day
-        for start_time in starts:
-            start_date = "/".join(str(x) for x in [start_time.utc.year,start_time.utc.month,start_time.utc.day])
-            #normalize the time into decimal hours
-            start_hours = start_time.utc.hour + (start_time.utc.minute + (start_time.utc.second)/60)/60
-            pass_dates.append(start_date)
-            pass_tods.append(start_hours)
+        maxels = self.passes['max_el']
+        #Each pass goes in the column of the day it starts on, at its time of day (decimal hours)
+        unix_starts = unix_time(self.window.resources.timescale, self.passes['aos'])
+        first_day = (self.calendar_day - datetime.date(1970, 1, 1)).days
+        columns = np.floor(unix_starts / 86400) - first_day
+        pass_tods = (unix_starts % 86400) / 3600
         #Plot the points! Color them based on their maximum elevation, and size them the same way.
         colors = [cmap(m/90) for m in maxels]
-        self.scatter = plt.scatter(pass_dates, pass_tods, c = colors, s=[a**2/7 for a in maxels])
+        sizes = maxels**2/7
+        self.scatter = self.ax.scatter(columns, pass_tods, c = colors, s=sizes)
         #Plot all the numbers inside their circles. Center the marks on their points and size to fit.
         for i,n in enumerate(maxels):
-            plt.annotate(int(n), (pass_dates[i],pass_tods[i]),ha='center',va='center',c="black",weight='bold',size=n/4)
+            self.ax.annotate(int(n), (columns[i],pass_tods[i]),ha='center',va='center',c="black",weight='bold',size=n/4)
+        #Marker sizes are areas in points squared
+        self.index = CalendarIndex(columns, pass_tods, np.sqrt(sizes)/2)
 
-        #These will give passes labels on mouseover
+        #These will give passes labels on mouseover. The label is animated, so full draws leave it out.
         self.annot = self.ax.annotate("", xy=(0,0), xytext=(20,20),textcoords="offset points",
                     bbox=dict(boxstyle="round", fc="w"),
-                    arrowprops=dict(arrowstyle="->",color='w'))
+                    arrowprops=dict(arrowstyle="->",color='w'), animated=True)
         self.annot.set_visible(False)
-        self.fig.canvas.mpl_connect("motion_notify_event", self.hover)
-        self.fig.canvas.mpl_connect("button_press_event", self.click)
-        
-        #Rotate dates sideways so they all fit
-        plt.xticks(rotation=90)
-        plt.yticks(list(range(25)),labels = [str(i) + ":00" for i in range(25)]) 
-        plt.title("GS: " + self.groundstation)
-        plt.ylabel("Time of day (UTC)")
+        self.highlighted = None
+
+        #One column per day, with the dates sideways so they all fit
+        days = [self.calendar_day + datetime.timedelta(days=i) for i in range(tracking_days)]
+        self.ax.set_xticks(list(range(tracking_days)), labels = [f"{d.year}/{d.month}/{d.day}" for d in days])
+        self.ax.set_xlim(-0.5, tracking_days - 0.5)
+        self.ax.tick_params(axis='x', labelrotation=90)
+        self.ax.set_yticks(list(range(25)),labels = [str(i) + ":00" for i in range(25)])
+        # Invert Y axis, so time flows down, like a Google Calendar
+        self.ax.set_ylim(24, 0)
+        self.ax.set_title("GS: " + self.groundstation)
+        self.ax.set_ylabel("Time of day (UTC)")
 
         #Draw the vertical lines between dates for ease of viewing dates of the top passes
         for xc in [0.5 + i for i in range(tracking_days)]:
-            plt.axvline(x=xc, color='k', linestyle='--')
-        self.ax.set_transform(self.ax.transData)
-    #Standard Skyfield code for getting passes.
-    #Generate a list of passes with start times, end times, and max-elevations.
-    def get_passes(self):
-        ts = load.timescale()
-        start_time = ts.now()
-        end_time = ts.tt_jd(start_time.tt + tracking_days)
-        satellite = EarthSatellite(*self.TLE)
-        skyfield_groundstation = wgs84.latlon(self.gs_data["Lat"],self.gs_data["Lon"])
-        times, events = satellite.find_events(skyfield_groundstation, start_time,end_time)
-        passes = []
-        curr_pass = {}
-        for t, event_type in zip(times,events):
-            if event_type == 0:
-                curr_pass = {"start":t}
-            if event_type == 1: # this is the moment of maximum elevation; calculate that value.
-                if "start" not in curr_pass:
-                    continue
-                max_el = (satellite - skyfield_groundstation).at(t).altaz()[0].degrees
-                curr_pass["max_el"] = max_el
-            if event_type == 2:
-                if "start" not in curr_pass:
-                    continue
-                curr_pass["end"] = t
-                if all(x in curr_pass for x in ["start","max_el"]):
-                    passes.append(curr_pass)
-        return passes
-    def update_annot(self,ind):
-        pos = self.scatter.get_offsets()[ind["ind"][0]]
-        self.annot.xy = pos
-        pass_to_label = self.passes[ind["ind"][0]]
-        text = pass_to_label["start"].utc_strftime()
-        self.annot.set_text(text)
+            self.ax.axvline(x=xc, color='k', linestyle='--')
+        self.plotWidget.draw_idle()
+    def save_background(self, event):
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        if self.annot is not None and self.annot.get_visible():
+            self.fig.draw_artist(self.annot)
+    #Label the pass with this index (or none, for None). Only the label is redrawn, over the saved calendar.
+    def highlight(self, index):
+        if index == self.highlighted:
+            return
+        self.highlighted = index
+        if index is not None:
+            pass_to_label = self.passes[index]
+            self.annot.xy = self.scatter.get_offsets()[index]
+            self.annot.set_text(self.window.resources.timescale.tt_jd(pass_to_label["aos"]).utc_strftime())
+        self.annot.set_visible(index is not None)
+        if self.background is None:
+            self.plotWidget.draw_idle()
+            return
+        self.fig.canvas.restore_region(self.background)
+        if index is not None:
+            self.fig.draw_artist(self.annot)
+        self.fig.canvas.blit(self.fig.bbox)
 
     def hover(self,event):
-        vis = self.annot.get_visible()
+        if self.scatter is None:
+            return
         if event.inaxes == self.ax:
-            cont, ind = self.scatter.contains(event)
-            if cont:
-                self.update_annot(ind)
-                self.annot.set_visible(True)
-                self.fig.canvas.draw_idle()
-            else:
-                if vis:
-                    self.annot.set_visible(False)
+            self.highlight(self.index.pass_at(self.ax, event.x, event.y))
+        else:
+            self.highlight(None)
     #Respond to clicking on a point in the scatterplot
     def click(self,event):
+        if self.scatter is None:
+            return
         if event.inaxes == self.ax:
-            cont, ind = self.scatter.contains(event)
-            if cont:
-                self.clicked_pass = self.passes[ind["ind"][0]]
-                selected_time = self.clicked_pass["start"].utc_datetime()
-                #Convert to a Python datetime and jump globaltime to that time
+            index = self.index.pass_at(self.ax, event.x, event.y)
+            if index is not None:
+                self.clicked_pass = self.passes[index]
+                #Convert to a (naive, UTC) Python datetime and jump globaltime to that time
+                selected_time = self.window.resources.timescale.tt_jd(self.clicked_pass["aos"]).utc_datetime().replace(tzinfo=None)
                 self.window.cross_module_vars['globaltime'] = selected_time
-    # Convert the Skyfield times in a pass to human readable UTC times
-    def export_pass(self, p):
-        exported_pass = {}
-        exported_pass['start'] = p['start'].utc_datetime()
-        exported_pass['max_el'] = p['max_el']
-        exported_pass['end'] = p['end'].utc_datetime()
-        return exported_pass
+                #Keep showing the same calendar, rather than starting it from the clicked day
+                self.shown_day = selected_time.date()
     def export_data(self):
+        ts = self.window.resources.timescale
         data_out = {}
-        data_out["Chosen_pass"] = self.export_pass(self.clicked_pass)
-        data_out["All_passes"] = [self.export_pass(p) for p in self.passes]
+        #No pass has been clicked yet
+        if hasattr(self, "clicked_pass"):
+            data_out["Chosen_pass"] = export_pass(ts, self.clicked_pass)
+        data_out["All_passes"] = [export_pass(ts, p) for p in self.passes]
         return data_out
     #Go back to normal size and location when something else becomes the big widget
     def return_to_normal(self):
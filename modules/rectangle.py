@@ -1,6 +1,10 @@
 from PyQt5.QtWidgets import QPushButton
 import pyqtgraph as pg
 
+#Without a window there is nothing to compute, but the module is still listed in the export
+def headless_export(window, initparams):
+    return {"Name":initparams['name']}
+
 class rectangle():
     def __init__(self,window,initparams):
         #Iterate over everything in initparams.
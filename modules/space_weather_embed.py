@@ -2,7 +2,12 @@ from PyQt5.QtWidgets import QPushButton, QLabel, QSizePolicy
 from PyQt5.QtGui import QPixmap
 import pyqtgraph as pg
 
-import urllib
+import urllib.request
+
+IMAGE_URL = "https://services.swpc.noaa.gov/images/notifications-timeline.png"
+
+def fetch_image(image_url):
+    return urllib.request.urlopen(image_url).read()
 
 class space_weather_embed():
     def __init__(self,window,initparams):
@@ -12,16 +17,12 @@ class space_weather_embed():
             setattr(self, key, value)
 
         self.window = window
-        
-        image_url = "https://services.swpc.noaa.gov/images/notifications-timeline.png"
-        image_bytes = urllib.request.urlopen(image_url).read()
 
-        self.image_holder = QLabel(self.window)
-        self.pixmap = QPixmap()
-        self.pixmap.loadFromData(image_bytes)
+        self.image_holder = QLabel("Loading space weather...", self.window)
         self.image_holder.setScaledContents(True)
         self.image_holder.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
-        self.image_holder.setPixmap(self.pixmap)
+        #Download the image in the background, rather than holding up startup
+        self.window.workers.submit(self.name + ": image", fetch_image, self.show_image, IMAGE_URL)
 
         self.window.grid.addWidget(self.image_holder, self.grid_y, self.grid_x, self.grid_h, self.grid_w)
 
@@ -31,6 +32,10 @@ class space_weather_embed():
         self.mainwidgetbutton.move(10,0)
         self.mainwidgetbutton.setStyleSheet("background-color:#bbbbbb")
         self.mainwidgetbutton.clicked.connect(lambda:self.window.set_largeCentralPanel(self))
+    def show_image(self, image_bytes):
+        self.pixmap = QPixmap()
+        self.pixmap.loadFromData(image_bytes)
+        self.image_holder.setPixmap(self.pixmap)
     #Go back to normal size and location when something else becomes the big widget
     def return_to_normal(self):
         self.window.grid.removeWidget(self.image_holder)
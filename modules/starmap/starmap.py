@@ -1,6 +1,5 @@
 from PyQt5.QtWidgets import QPushButton, QVBoxLayout, QLineEdit
 from PyQt5.QtGui import QFont
-from PyQt5 import QtCore
 import pyqtgraph as pg
 import numpy as np
 import os
@@ -14,58 +13,45 @@ from matplotlib.patches import Polygon
 from matplotlib.widgets import TextBox
 
 #skyfield space dynamics
-from skyfield.api import Star, load, wgs84, EarthSatellite, utc
-from skyfield.data import hipparcos
+from skyfield.api import Star, wgs84
 from skyfield import named_stars
 from skyfield.units import Angle
 from skyfield.framelib import ecliptic_frame
 
 #constants
 from skyfield.constants import ERAD, RAD2DEG
+from small_circle import map_polygons
 TWOPI = 2 * np.pi
 HALFPI = np.pi / 2
 SUN_IMAGE =  plt.imread(os.path.dirname(os.path.realpath(__file__))  +'/sun.png')
 MOON_IMAGE = plt.imread(os.path.dirname(os.path.realpath(__file__))  +'/moon.png')
 
-#how many points to use when drawing the earth occlusion shape
-VERTICAL_RESOLUTION = 1000
 #How large to draw the images of the sun and moon. Note this is much larger than real-life.
 SUN_SIZE = 0.15
 MOON_SIZE = 0.15
 
-#The haversine function
-def hav(value):
-    return (1 - np.cos(value)) / 2
-    
-#The archaversine function
-def archav(value):
-    if 0 < value < 1:
-        return np.arccos(1 - 2 * value)
-    return None
-
-#Get a set of stars, and a parallel list of their normal-English names. Optional mag_limit
+#Get a set of stars, and a parallel list of their normal-English names. df is the Hipparcos
+#dataframe (shared through the window's resources). Optional mag_limit
 #will result in only returning stars with magnitudes that are below that limit.
-def get_stars_with_names(mag_limit=100):
-    with load.open(hipparcos.URL) as f:
-        df = hipparcos.load_dataframe(f)
-        df_filtered = df[df['magnitude'] <= mag_limit]
-        hip_numbers = df_filtered.index.values.tolist()
-        #Produce a dictionary that takes HIP numbers as keys and returns names
-        name_dict = {v: k for k, v in named_stars.named_star_dict.items()}
-        star_names = []
-        for star in hip_numbers:
-            if star in name_dict:
-                star_names.append(name_dict[star])
-            else:
-                star_names.append("HIP " + str(star))
-        stars = df_filtered.values.tolist()
-        stars_to_return = []
-        for s in stars:
-            mag,ra_deg,dec_deg = s[:3]
-            ra_angle = Angle(degrees = ra_deg)
-            dec_angle = Angle(degrees = dec_deg)
-            newstar = Star(ra = ra_angle, dec = dec_angle)
-            stars_to_return.append(newstar)
+def get_stars_with_names(df, mag_limit=100):
+    df_filtered = df[df['magnitude'] <= mag_limit]
+    hip_numbers = df_filtered.index.values.tolist()
+    #Produce a dictionary that takes HIP numbers as keys and returns names
+    name_dict = {v: k for k, v in named_stars.named_star_dict.items()}
+    star_names = []
+    for star in hip_numbers:
+        if star in name_dict:
+            star_names.append(name_dict[star])
+        else:
+            star_names.append("HIP " + str(star))
+    stars = df_filtered.values.tolist()
+    stars_to_return = []
+    for s in stars:
+        mag,ra_deg,dec_deg = s[:3]
+        ra_angle = Angle(degrees = ra_deg)
+        dec_angle = Angle(degrees = dec_deg)
+        newstar = Star(ra = ra_angle, dec = dec_angle)
+        stars_to_return.append(newstar)
     return stars_to_return, star_names, df_filtered['magnitude']
 
 #Gets the phase of the moon, as seen by an observer
@@ -86,24 +72,11 @@ class starmap():
         self.box.setStyleSheet("border:2px solid black; border-radius: 5px;")
         self.box.setBackground(self.color)
 
-        #Load solar system bodies
-        planets = load('de421.bsp')
-        self.earth = planets['earth']
-        self.moon = planets['moon']
-        self.sun = planets['sun']
-
-        #Create the matplotlib graph
+        #Create the matplotlib graph. The stars are drawn in deferred_init, since loading and observing
+        #the whole catalog is slow. Until then, show a placeholder.
         self.fig, self.ax = plt.subplots()
-        self.populate_graph()
+        self.placeholder = self.ax.text(0.5, 0.5, "Loading star catalog...", transform=self.ax.transAxes, ha='center', va='center')
         self.plotWidget = FigureCanvas(self.fig)
-        self.update_plot()
-
-        #Add star annotations to matplotlib graph
-        self.annot = self.ax.annotate("", xy=(0,0), xytext=(20,20),textcoords="offset points",
-                    bbox=dict(boxstyle="round", fc="w"),
-                    arrowprops=dict(arrowstyle="->",color='w'))
-        self.annot.set_visible(False)
-        self.fig.canvas.mpl_connect("motion_notify_event", self.hover)
 
         #Create a plot holder and place the plot inside of it
         self.plotHolder = QVBoxLayout(self.box)
@@ -116,6 +89,8 @@ class starmap():
         self.searchbox.setPlaceholderText("Enter a star name to search for...")
         self.searchbox.returnPressed.connect(self.run_starsearch)
         self.plotHolder.addWidget(self.searchbox)
+        #Nothing to search until the stars are loaded
+        self.searchbox.setEnabled(False)
 
         #Expansion button to make the main widget thing
         self.mainwidgetbutton = QPushButton("⛶",self.box)
@@ -124,14 +99,31 @@ class starmap():
         self.mainwidgetbutton.setStyleSheet("background-color:#bbbbbb")
         self.mainwidgetbutton.clicked.connect(lambda:self.window.set_largeCentralPanel(self))
 
-        #Set up QTimer, every time it runs its cycle (set by self_update_ms) it will run self.update, which updates map
-        self.updater = QtCore.QTimer()
-        self.updater.timeout.connect(self.update_plot)
-        self.updater.start(self.self_update_ms)
-        
+    #The slow part of setup, run by the window once it is on screen
+    def deferred_init(self):
+        #Load solar system bodies
+        planets = self.window.resources.ephemeris
+        self.earth = planets['earth']
+        self.moon = planets['moon']
+        self.sun = planets['sun']
+
+        self.placeholder.remove()
+        self.populate_graph()
+        self.update_plot()
+
+        #Add star annotations to matplotlib graph
+        self.annot = self.ax.annotate("", xy=(0,0), xytext=(20,20),textcoords="offset points",
+                    bbox=dict(boxstyle="round", fc="w"),
+                    arrowprops=dict(arrowstyle="->",color='w'))
+        self.annot.set_visible(False)
+        self.fig.canvas.mpl_connect("motion_notify_event", self.hover)
+        self.searchbox.setEnabled(True)
+
+        #Register with the window's scheduler, which will run self.update_plot every self_update_ms
+        self.window.scheduler.register(self, self.update_plot, self.self_update_ms)
 
     def update_plot(self):
-        plot_time = self.ts.from_datetime(self.window.cross_module_vars['globaltime'].replace(tzinfo=utc))
+        plot_time = self.window.scheduler.state.time
         for i in self.plotted_objects:
             i.remove()
         
@@ -174,11 +166,11 @@ class starmap():
         self.ax.set_ylim(-HALFPI,HALFPI)
         self.ax.set_aspect("equal")
         #Change the axis labels to be standard units - Hours for RA, Degrees for DEC
-        plt.xlabel("Right ascension (HOURS)")
+        self.ax.set_xlabel("Right ascension (HOURS)")
         xtick_locations = np.linspace(0,TWOPI,13)
         self.ax.set_xticks(xtick_locations)
         self.ax.set_xticklabels([round(x * 24 / TWOPI) for x in xtick_locations])
-        plt.ylabel("Declination (DEGREES)")
+        self.ax.set_ylabel("Declination (DEGREES)")
         ytick_locations = np.linspace(-HALFPI,HALFPI,13)
         self.ax.set_yticks(ytick_locations)
         self.ax.set_yticklabels([round(y * RAD2DEG) for y in ytick_locations])
@@ -186,17 +178,17 @@ class starmap():
         self.ax.set_axisbelow(True)
         self.ax.invert_xaxis()
 
-        self.ts = load.timescale()
-        time = self.ts.from_datetime(self.window.cross_module_vars['globaltime'].replace(tzinfo=utc))
+        self.ts = self.window.resources.timescale
+        time = self.window.scheduler.state.time
         self.star_field, self.star_names = self.draw_starmap(self.star_mag_limit,time)
         TLE = self.window.cross_module_vars['TLES'][self.sat_id]
-        self.sat_obj = EarthSatellite(*TLE)
+        self.sat_obj = self.window.resources.satellite(TLE)
 
         self.plotted_objects = []
 
     def draw_starmap(self,magnitude_limit,plot_time):
         global bright_stars
-        bright_stars, star_names, mags = get_stars_with_names(magnitude_limit)
+        bright_stars, star_names, mags = get_stars_with_names(self.window.resources.hipparcos, magnitude_limit)
         ras = []
         decs = []
         for star in bright_stars:
@@ -270,55 +262,12 @@ class starmap():
         earth_angular_radius = np.arcsin(ERAD/distance_to_sat)
         return self.plot_circle(earth_dec, earth_ra, earth_angular_radius, "blue")
     
-    #Given a center lat/long and angular radius, returns a set of longs/lats to represent that circle.
+    #Given a center lat/long and angular radius, draws that circle (in one piece, or two if it wraps
+    #around the sides). Returns the polygons drawn.
     def plot_circle(self, center_lat, center_lon, radius, color):
         plotted_polygons = [] #Keep track of what we end up plotting so we can return them
-        #Use the haversine formula, inverted.
-        points_to_plot = []
-        for lat in np.linspace(-HALFPI, HALFPI, VERTICAL_RESOLUTION):
-            numerator = hav(radius) - hav(lat - center_lat)
-            denom = np.cos(center_lat) * np.cos(lat)
-            lon_shift = archav( numerator / denom ) #will be None if out of bounds of archav
-            if lon_shift is not None:
-                points_to_plot.append([(center_lon + lon_shift)%TWOPI,lat])
-                points_to_plot.append([(center_lon - lon_shift)%TWOPI,lat])
-        #Now that we have all the points, sort them from lowest RA to highest.
-        points_to_plot.sort(key=lambda x: x[0])
-
-        #First need to detect a circle which is wrapped on the sides. Hardest case to math out.
-        #Search for big X jumps (right edge of left half, left edge of right half)
-        x_jumps = [points_to_plot[i][0] - points_to_plot[i-1][0] for i in range(1,len(points_to_plot))]
-        if max(x_jumps) > 2:
-            #We have two halves. We need to split to two shapes to draw in.
-            left_half = [i for i in points_to_plot if i[0] < np.pi]
-            right_half = [i for i in points_to_plot if i[0] > np.pi]
-            #Half-Circle around the center of the side
-            #(used to use 0,0 but failed when the circle wrapped too low/high)
-            #Guesstimate where the circle is touching the axis to evaluate angles to draw circle.
-            #3 is a magic number determined empirically. But the higher the earth center is, the higher you want this to go.
-            average_edge = center_lat * 3
-            left_half.sort(key = lambda x: np.arctan2(x[1] - average_edge,x[0]))
-            #And the same on the right.
-            right_half.sort(key = lambda x: np.arctan2(x[1] - average_edge,x[0]- TWOPI)%TWOPI)
-            plotted_polygons.append(self.ax.add_patch(Polygon(left_half,color='b',alpha=0.5,linewidth=2)))
-            plotted_polygons.append(self.ax.add_patch(Polygon(right_half,color='b',alpha=0.5,linewidth=2)))
-        else: #If we only have one shape (no wrap), draw that single one.
-            #Coming into this we're still sorted left to right.
-            #That works when the earth is a siney thing crossing the 2pi wrap. What if it's a big circle?
-            #Detect a circle by finding the largest y jump between consecutive (left-to-right) points.
-            y_jumps = [points_to_plot[i][1] - points_to_plot[i-1][1] for i in range(1,len(points_to_plot))]
-            if max(y_jumps) > 0.5 * radius: #Circle detected! Re-sort to draw in a ring.
-                points_to_plot.sort(key = lambda x: np.arctan2(x[1] - center_lat,x[0] - center_lon))
-            else:#No circle detected. First extend the "wave" to meet the left/right edges, then add two corners.
-                leftmost_point = points_to_plot[0]
-                rightmost_point = points_to_plot[-1]
-                extra_left_point = [0,leftmost_point[1]]
-                extra_right_point = [TWOPI,rightmost_point[1]]
-                points_to_plot = [extra_left_point,*points_to_plot,extra_right_point]
-                #Do we need to add upper or lower corners? Find out by checking if the satellite is high or low.
-                dec_sign = (1 if center_lat > 0 else -1)
-                points_to_plot = [[TWOPI,dec_sign*HALFPI],[0,dec_sign*HALFPI]] + points_to_plot
-            plotted_polygons.append(self.ax.add_patch(Polygon(points_to_plot,color=color,alpha=0.5,linewidth=2)))
+        for lon, lat in map_polygons(center_lat, center_lon, radius, lon_min=0):
+            plotted_polygons.append(self.ax.add_patch(Polygon(np.column_stack([lon, lat]),color=color,alpha=0.5,linewidth=2)))
         return plotted_polygons
     
     #Used for placing sun and moon images.
@@ -1,11 +1,25 @@
 import sys
+import time
 import json
+import argparse
 #Allows importing a file by name, as specified in config
 import importlib
 #Custom script for grabbing TLE updates
 import load_tle
+#Shared timescale/ephemeris/star catalog, loaded once for all modules
+from resources import ResourceRegistry
+#Batched SGP4 propagation of every satellite at once
+from propagation import PropagationEngine
+#Single timer that drives the clock and every module's updates
+from scheduler import TickScheduler
+#Thread pool for long computations, so they don't freeze the window
+from workers import ComputeWorkers
+#Passes already computed, shared by the modules that need them
+from pass_cache import PassCache
+#Timing of every module's updates
+from performance import PerformanceMonitor, PerformanceDialog
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import QApplication, QGridLayout, QFileDialog
 
 #Less-known publications which could be good to publish in:
@@ -15,6 +29,22 @@ from PyQt5.QtWidgets import QApplication, QGridLayout, QFileDialog
 from PyQt5.QtWidgets import QMainWindow, QMenuBar, QMenu, QAction, QWidget
 import datetime
 
+#Read a configuration file into a dictionary
+def read_config(config_file):
+    with open(config_file, encoding='utf-8') as f:
+        return json.load(f)
+#The globaltime a configuration starts at: its start_time if it has one, otherwise now
+def config_start_time(params):
+    if "start_time" in params:
+        return datetime.datetime(*params['start_time'])
+    return datetime.datetime.utcnow()
+#Import a module file named in a configuration, like "passfinder" or "mapdot.mapdot"
+def import_module_file(file):
+    return importlib.import_module("modules." + file)
+def write_export(data_dump_dict, savefile):
+    with open(savefile, "w") as f:
+        json.dump(data_dump_dict, f, indent=4, default=str)
+
 #The window class that holds everything.
 class Window(QMainWindow):
     def __init__(self):
@@ -37,42 +67,74 @@ class Window(QMainWindow):
 
         loadConfigButton = QAction("Load Configuration",self)
         self.fileMenu.addAction(loadConfigButton)
-        loadConfigButton.triggered.connect(self.load_config)
+        loadConfigButton.triggered.connect(lambda: self.load_config())
 
         dataExportButton = QAction("Export Module State Data",self)
         self.fileMenu.addAction(dataExportButton)
-        dataExportButton.triggered.connect(self.export_module_data)
+        dataExportButton.triggered.connect(lambda: self.export_module_data())
 
         quitButton = QAction("Quit",self)
         self.fileMenu.addAction(quitButton)
         quitButton.triggered.connect(self.close)
 
+        #Live update timings of each module
+        performanceButton = QAction("Performance",self)
+        self.modulesMenu.addAction(performanceButton)
+        performanceButton.triggered.connect(self.show_performance)
+
         #A dictionary that any module can read or write to, in order to exchange data between each other.
         self.cross_module_vars = {}
-    def load_config(self):
+        #Expensive Skyfield resources that every module shares, rather than loading their own copies.
+        self.resources = ResourceRegistry()
+        #Propagates all the TLEs over a time grid in one call, for modules that need many satellites/times
+        self.propagator = PropagationEngine(self.resources)
+        #Modules that need passes over ground stations get them from here, so they aren't searched twice
+        self.pass_cache = PassCache(self.resources)
+        #Modules register their update functions here instead of running their own timers
+        self.scheduler = TickScheduler(self)
+        #Modules submit long computations (pass searches, timelines) here, and get results back on the main thread
+        self.workers = ComputeWorkers()
+        #The scheduler times every update call it makes into this
+        self.performance = PerformanceMonitor()
+        self.performance_dialog = None
+        #Modules whose heavy setup (catalogs, shapefiles, 3D scenes...) hasn't run yet
+        self.pending_deferred_init = []
+        #Per module: seconds spent importing its file, building its widgets, and in its deferred setup
+        self.startup_times = {}
+    #If no configuration file is given, the user is asked to pick one
+    def load_config(self, chosen_config_file = None):
         print("Loading configuration")
-        chosen_config_file = QFileDialog.getOpenFileName(self)[0]
-        self.params=None
-        with open(chosen_config_file, encoding='utf-8') as f:
-            self.params = json.load(f)
-        TLES = {x : load_tle.get_tle(x) for x in self.params['Spacecraft_IDS']}
+        if chosen_config_file is None:
+            chosen_config_file = QFileDialog.getOpenFileName(self)[0]
+        self.params = read_config(chosen_config_file)
+        TLES = load_tle.get_tles(self.params['Spacecraft_IDS'])
         self.cross_module_vars["TLES"] = TLES
+        #Fresh TLEs, so no satellite built from an older configuration is valid any more
+        self.resources.clear_satellites()
+        self.pass_cache.clear()
         # Initialize global time to now, other modules (especially time controller) may change it.
-        if "start_time" in self.params:
-            self.cross_module_vars['globaltime'] = datetime.datetime(*self.params['start_time'])
-        else:
-            self.cross_module_vars['globaltime'] = datetime.datetime.utcnow()
+        self.cross_module_vars['globaltime'] = config_start_time(self.params)
 
+        self.scheduler.reset()
+        self.performance.reset()
         self.all_active_modules = []
+        self.startup_times = {}
         for module in self.params['modules']:
             file = module['source_file']
-            importname = "modules." + file
-            imported_module = importlib.import_module(importname)
+            import_start = time.perf_counter()
+            imported_module = import_module_file(file)
             #Get the class by name, which should be identical to the filename.
             #Split on dot and get last one, for end of file path.
             module_class = getattr(imported_module,file.split(".")[-1])
+            build_start = time.perf_counter()
             module_instance = module_class(self,module['initparams'])
+            build_end = time.perf_counter()
+            self.startup_times[module['initparams']['name']] = {"Import": build_start - import_start,
+                                                                "Build": build_end - build_start}
             self.all_active_modules.append(module_instance)
+        # Modules can split their setup in two: __init__ only builds widgets, and the slow part goes in
+        # deferred_init, which runs once the window is on screen (or right away if the module is enlarged first).
+        self.pending_deferred_init = [m for m in self.all_active_modules if hasattr(m, "deferred_init")]
         # Modules made, now some final geometry work
         self.centralGeometry = self.params['central_geometry']
         self.largeCentralPanel = None
@@ -83,17 +145,45 @@ class Window(QMainWindow):
             self.grid.setRowStretch(i, 1)
         for j in range(max(min_width,self.grid.columnCount())):
             self.grid.setColumnStretch(j, 1)
-        main_window.hide()
-        main_window.show()
+        self.hide()
+        self.show()
+        self.scheduler.start()
+        #Give the window a chance to paint before the first deferred setup
+        QTimer.singleShot(0, self.run_deferred_init)
+    #Run the deferred setup of one module, then come back through the event loop for the next one,
+    #so the window stays responsive in between.
+    def run_deferred_init(self):
+        if len(self.pending_deferred_init) == 0:
+            self.print_startup_times()
+            return
+        self.finish_module_init(self.pending_deferred_init[0])
+        QTimer.singleShot(0, self.run_deferred_init)
+    #Make sure a module's deferred setup has run. Does nothing if it already has.
+    def finish_module_init(self, module):
+        if module not in self.pending_deferred_init:
+            return
+        self.pending_deferred_init.remove(module)
+        start = time.perf_counter()
+        module.deferred_init()
+        self.startup_times[module.name]["Deferred init"] = time.perf_counter() - start
+    def print_startup_times(self):
+        print("Startup time per module (s):")
+        for name, times in self.startup_times.items():
+            print("  " + name + ": " + ", ".join(f"{step} {seconds:.3f}" for step, seconds in times.items()))
     # When the "Export Module state data" button is pressed in the File menu,
     # we iterate over every module in the current configuration. For each one,
     # check if it has a function called "export_data". If it does, call that function.
     # export_data must export a dictionary of all the relevant data to be exported,
     # which will be different from function to function. We then take all those
     # dictionaries, and output them as a single JSON file to be saved to the
-    # hard drive. The user is prompted with where to save it.
-    def export_module_data(self):
+    # hard drive. Unless a file is given, the user is prompted with where to save it.
+    def export_module_data(self, savefile = None):
         data_dump_dict = {"Cross module vars":self.cross_module_vars}
+        data_dump_dict["Resources"] = self.resources.export_data()
+        data_dump_dict["Scheduler"] = self.scheduler.export_data()
+        data_dump_dict["Pass cache"] = self.pass_cache.export_data()
+        data_dump_dict["Startup times (s)"] = self.startup_times
+        data_dump_dict["Performance"] = self.performance.export_data()
         for module in self.all_active_modules:
             print(module.name)
             print("export_data" in dir(module))
@@ -101,19 +191,63 @@ class Window(QMainWindow):
                 exported_data = module.export_data()
                 data_dump_dict[module.name] = exported_data
         #Data is dumped to a dictionary, now write it out as JSON
-        default_file_path = __file__
-        savefile, _ = QFileDialog.getSaveFileName(self,"Save File",default_file_path,"All Files(*)")
+        if savefile is None:
+            default_file_path = __file__
+            savefile, _ = QFileDialog.getSaveFileName(self,"Save File",default_file_path,"All Files(*)")
         if savefile:
-            with open(savefile, "w") as f:
-                json.dump(data_dump_dict, f, indent=4, default=str)
+            write_export(data_dump_dict, savefile)
+    # Replace the TLE of a satellite, for example after a TLE refresh or when a follower moves.
+    # Modules should use this rather than writing cross_module_vars['TLES'] directly, so the
+    # cached satellite object for the old TLE gets dropped.
+    def set_tle(self, sat_id, new_tle):
+        TLES = self.cross_module_vars['TLES']
+        old_tle = TLES.get(sat_id)
+        TLES[sat_id] = new_tle
+        #Another ID (like a follower sitting right on its leader) may still use the old lines
+        if old_tle is not None and old_tle not in TLES.values():
+            self.resources.drop_satellite(old_tle)
+            self.pass_cache.drop_tle(old_tle)
+    def show_performance(self):
+        if self.performance_dialog is None:
+            self.performance_dialog = PerformanceDialog(self.performance, self)
+        self.performance_dialog.show()
+        self.performance_dialog.raise_()
+    def closeEvent(self, event):
+        self.scheduler.timer.stop()
+        self.workers.shutdown()
+        super().closeEvent(event)
     def set_largeCentralPanel(self,newCenterWidget):
+        #A module being looked at up close shouldn't wait its turn for setup
+        self.finish_module_init(newCenterWidget)
         if self.largeCentralPanel is not None:
             self.largeCentralPanel.return_to_normal()
         self.largeCentralPanel = newCenterWidget
         self.largeCentralPanel.enlarge(self.centralGeometry)
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OPTASAT")
+    parser.add_argument("config", nargs="?", help="Configuration file to load. If not given, you are asked to pick one.")
+    parser.add_argument("--headless", metavar="EXPORT_FILE",
+                        help="Don't open a window: compute every module's data and write the export JSON to EXPORT_FILE")
+    parser.add_argument("--export-passes", metavar="PASS_FILE",
+                        help="Don't open a window: write every pass of every satellite over every ground station to PASS_FILE "
+                             "(.csv, or .parquet/.arrow if pyarrow is installed)")
+    parser.add_argument("--days", type=float, default=30, help="How many days --export-passes covers (default 30)")
+    args = parser.parse_args()
+    if args.headless is not None or args.export_passes is not None:
+        if args.config is None:
+            parser.error("--headless and --export-passes need a configuration file")
+        #headless builds on this file, so it can only be imported once this file is loaded
+        from headless import HeadlessWindow
+        headless_window = HeadlessWindow()
+        headless_window.load_config(args.config)
+        if args.headless is not None:
+            headless_window.compute_modules()
+            headless_window.export_module_data(args.headless)
+        if args.export_passes is not None:
+            headless_window.export_passes(args.export_passes, args.days)
+        sys.exit(0)
     app = QApplication(sys.argv)
     main_window = Window()
-    main_window.load_config()
+    main_window.load_config(args.config)
     main_window.showMaximized()
     sys.exit(app.exec_())
@@ -0,0 +1,130 @@
+import threading
+import numpy as np
+from pass_kernel import PASS_DTYPE, StationSet, find_passes
+
+#Passes that ended more than this many days before the start of a request are dropped from the cache.
+#Keeping a little history means small backward jumps of globaltime don't need a new search.
+EVICT_AFTER_DAYS = 1
+#Cache entries (TLE, station, mask) kept at most. The least recently used go first.
+MAX_ENTRIES = 256
+#Cut-off ends of passes closer than this (in days, about 0.1 ms) are the same instant
+SAME_TIME_DAYS = 1e-9
+UNIX_EPOCH_JD = 2440587.5
+
+#Unix timestamps of an array of TT Julian dates, for plotting on date axes
+def unix_time(ts, tt):
+    t = ts.tt_jd(tt)
+    utc_jd = t.whole + (t.tai_fraction - t._leap_seconds() / 86400)
+    return (utc_jd - UNIX_EPOCH_JD) * 86400
+
+#A station's place in cache keys
+def station_key(skyfield_groundstation):
+    return (skyfield_groundstation.latitude.degrees, skyfield_groundstation.longitude.degrees,
+            skyfield_groundstation.elevation.m)
+
+#Find every pass of satellite over skyfield_groundstation between Skyfield Times t0 and t1, above
+#the elevation mask (see pass_kernel.station_mask). Returns an array of PASS_DTYPE.
+def search_passes(satellite, skyfield_groundstation, mask, t0, t1):
+    return find_passes(satellite.model, t0.ts, StationSet([(skyfield_groundstation, mask)]), t0.tt, t1.tt)[0]
+
+#Join two sorted pass arrays covering neighbouring windows. A pass cut off at the end of the first
+#and one cut off at the start of the second, at the same time, are the same pass.
+def join_passes(earlier, later):
+    if len(earlier) > 0 and len(later) > 0:
+        last, first = earlier[-1], later[0]
+        if last['open_end'] and first['open_start'] and abs(last['los'] - first['aos']) < SAME_TIME_DAYS:
+            joined = last.copy()
+            joined['los'] = first['los']
+            joined['open_end'] = first['open_end']
+            if first['max_el'] > last['max_el']:
+                joined['tca'], joined['max_el'] = first['tca'], first['max_el']
+            return np.concatenate([earlier[:-1], [joined], later[1:]])
+    return np.concatenate([earlier, later])
+
+# The passes computed so far for one (TLE, station, mask), over the window [start, end] in TT
+class CachedPasses():
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.passes = np.zeros(0, dtype=PASS_DTYPE)
+        self.lock = threading.Lock()
+        self.last_used = 0
+
+# Remembers computed passes, so asking again for a window that moved a little only searches the newly
+# exposed edge. Entries are keyed by (TLE, station, elevation mask), so a new TLE never reuses old passes.
+# Safe to use from the background workers.
+class PassCache():
+    def __init__(self, resources):
+        self.resources = resources
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.uses = 0
+        self.searches = 0
+        self.searched_days = 0
+
+    #Passes of the satellite with this TLE over skyfield_groundstation (a wgs84.latlon) that overlap
+    #Skyfield Times start to end, as an array of PASS_DTYPE sorted by AOS.
+    def passes(self, tle, skyfield_groundstation, start, end, mask = 0.0):
+        entry = self.entry((tuple(tle), station_key(skyfield_groundstation), mask))
+        with entry.lock:
+            self.extend(entry, self.resources.satellite(tle), skyfield_groundstation, mask, start.tt, end.tt)
+            passes = entry.passes
+            return passes[(passes['los'] >= start.tt) & (passes['aos'] <= end.tt)]
+
+    def entry(self, key):
+        with self.lock:
+            self.uses += 1
+            if key not in self.entries:
+                if len(self.entries) >= MAX_ENTRIES:
+                    oldest = min(self.entries, key=lambda k: self.entries[k].last_used)
+                    del self.entries[oldest]
+                self.entries[key] = CachedPasses()
+            self.entries[key].last_used = self.uses
+            return self.entries[key]
+
+    #Grow the entry's window to cover [start, end], searching only the parts it doesn't have yet
+    def extend(self, entry, satellite, skyfield_groundstation, mask, start, end):
+        ts = self.resources.timescale
+        #Nothing usable: start over
+        if entry.start is None or start > entry.end or end < entry.start:
+            entry.passes = self.search(satellite, skyfield_groundstation, mask, ts.tt_jd(start), ts.tt_jd(end))
+            entry.start, entry.end = start, end
+            return
+        if start < entry.start:
+            earlier = self.search(satellite, skyfield_groundstation, mask, ts.tt_jd(start), ts.tt_jd(entry.start))
+            entry.passes = join_passes(earlier, entry.passes)
+            entry.start = start
+        if end > entry.end:
+            later = self.search(satellite, skyfield_groundstation, mask, ts.tt_jd(entry.end), ts.tt_jd(end))
+            entry.passes = join_passes(entry.passes, later)
+            entry.end = end
+        #Drop passes far behind the window. One that straddles the new start of the window is cut off there.
+        evict_before = start - EVICT_AFTER_DAYS
+        if entry.start < evict_before:
+            passes = entry.passes[entry.passes['los'] >= evict_before]
+            straddling = passes['aos'] < evict_before
+            passes['aos'][straddling] = evict_before
+            passes['tca'][straddling] = np.maximum(passes['tca'][straddling], evict_before)
+            passes['open_start'][straddling] = True
+            entry.passes = passes
+            entry.start = evict_before
+
+    def search(self, satellite, skyfield_groundstation, mask, t0, t1):
+        self.searches += 1
+        self.searched_days += float(t1.tt - t0.tt)
+        return search_passes(satellite, skyfield_groundstation, mask, t0, t1)
+
+    #Forget every entry computed from a TLE that has been replaced
+    def drop_tle(self, tle):
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == tuple(tle)]:
+                del self.entries[key]
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def export_data(self):
+        return {"Entries": len(self.entries),
+                "Requests": self.uses,
+                "Searches": self.searches,
+                "Days searched": self.searched_days}
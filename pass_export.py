@@ -0,0 +1,128 @@
+import csv
+import os
+import numpy as np
+from skyfield.api import EarthSatellite
+from pass_cache import SAME_TIME_DAYS, unix_time
+from pass_kernel import StationSet, station_mask, satellite_itrs
+from access_matrix import AccessMatrix, compute_access_matrix, skyfield_station
+
+#The horizon is searched and written this many days at a time. Memory use depends on this, not on the horizon.
+CHUNK_DAYS = 1
+#Columns of a pass file, in order. Times are UTC, azimuths and elevations in degrees.
+COLUMNS = ["sat_id", "station", "aos_utc", "tca_utc", "los_utc", "duration_s", "max_el_deg",
+           "aos_az_deg", "tca_az_deg", "los_az_deg", "aos_range_km", "tca_range_km", "los_range_km",
+           "open_start", "open_end"]
+TIME_COLUMNS = ["aos_utc", "tca_utc", "los_utc"]
+
+# Writes pass columns to a CSV file, chunk by chunk
+class CSVPassWriter():
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(COLUMNS)
+    def write(self, columns):
+        columns = dict(columns)
+        for name in TIME_COLUMNS:
+            milliseconds = np.round(columns[name] * 1000).astype('int64').astype('datetime64[ms]')
+            columns[name] = np.char.add(np.datetime_as_string(milliseconds, unit='ms'), "Z")
+        self.writer.writerows(zip(*[columns[name] for name in COLUMNS]))
+        self.file.flush()
+    def close(self):
+        self.file.close()
+
+# Writes pass columns to a Parquet file (one row group per chunk), or an Arrow IPC file.
+# Needs pyarrow, which is optional: it is only imported when one of these files is asked for.
+class ArrowPassWriter():
+    def __init__(self, path, parquet):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            import pyarrow.ipc
+        except ImportError:
+            raise ImportError("Writing " + path + " needs pyarrow (pip install pyarrow). CSV files don't.")
+        self.pa = pyarrow
+        self.schema = pyarrow.schema([(name, pyarrow.timestamp('us', tz='UTC')) if name in TIME_COLUMNS else
+                                      (name, pyarrow.string()) if name in ("sat_id", "station") else
+                                      (name, pyarrow.bool_()) if name.startswith("open") else
+                                      (name, pyarrow.float64()) for name in COLUMNS])
+        if parquet:
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pyarrow.ipc.new_file(path, self.schema)
+    def write(self, columns):
+        arrays = []
+        for field in self.schema:
+            values = columns[field.name]
+            if field.name in TIME_COLUMNS:
+                values = np.round(values * 1e6).astype('int64')
+            elif field.name in ("sat_id", "station"):
+                values = values.astype(str)
+            arrays.append(self.pa.array(values, type=field.type))
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+    def close(self):
+        self.writer.close()
+
+#A writer for path, picked by its extension: .csv, .parquet, or .arrow/.feather
+def open_pass_writer(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        return ArrowPassWriter(path, parquet=True)
+    if extension in (".arrow", ".feather"):
+        return ArrowPassWriter(path, parquet=False)
+    return CSVPassWriter(path)
+
+#The columns of a pass file for rows of an AccessMatrix (array of ACCESS_DTYPE), sorted by AOS.
+#Azimuth and range at AOS, TCA and LOS are computed for each satellite's passes all at once.
+def pass_columns(ts, ids, satrecs, stations, station_set, rows):
+    rows = rows[np.argsort(rows['aos'], kind='stable')]
+    times = np.stack([rows['aos'], rows['tca'], rows['los']], axis=1)
+    az = np.zeros(times.shape)
+    range_km = np.zeros(times.shape)
+    for sat_index in np.unique(rows['sat']):
+        chosen = rows['sat'] == sat_index
+        position, velocity = satellite_itrs(satrecs[sat_index], ts, times[chosen].ravel())
+        station_index = np.repeat(rows['station'][chosen], 3)
+        alt, pass_az, pass_range, range_rate = station_set.look_angles(station_index, position, velocity)
+        az[chosen] = pass_az.reshape(-1, 3)
+        range_km[chosen] = pass_range.reshape(-1, 3)
+    unix = unix_time(ts, times.ravel()).reshape(times.shape)
+    return {"sat_id": np.array([ids[i] for i in rows['sat']], dtype=object),
+            "station": np.array([stations[i]['Name'] for i in rows['station']], dtype=object),
+            "aos_utc": unix[:, 0], "tca_utc": unix[:, 1], "los_utc": unix[:, 2],
+            "duration_s": (rows['los'] - rows['aos']) * 86400,
+            "max_el_deg": rows['max_el'],
+            "aos_az_deg": az[:, 0], "tca_az_deg": az[:, 1], "los_az_deg": az[:, 2],
+            "aos_range_km": range_km[:, 0], "tca_range_km": range_km[:, 1], "los_range_km": range_km[:, 2],
+            "open_start": rows['open_start'], "open_end": rows['open_end']}
+
+#Stream every pass of every satellite in tles ({ID: TLE}) over every station dictionary in stations,
+#between Skyfield Times start and end, to path. The horizon is searched CHUNK_DAYS at a time, and each
+#chunk's finished passes are written before the next is searched. A pass still going at the end of a
+#chunk is held back and joined to its rest in the next one. Returns the number of passes written.
+def export_passes(path, tles, stations, start, end, chunk_days = CHUNK_DAYS, max_workers = None):
+    ts = start.ts
+    ids = list(tles.keys())
+    satrecs = [EarthSatellite(*tles[sat_id], ts=ts).model for sat_id in ids]
+    station_set = StationSet([(skyfield_station(gs), station_mask(gs)) for gs in stations])
+    writer = open_pass_writer(path)
+    count = 0
+    held = None
+    try:
+        chunk_start = start.tt
+        while chunk_start < end.tt:
+            chunk_end = min(chunk_start + chunk_days, end.tt)
+            chunk = compute_access_matrix(tles, stations, ts.tt_jd(chunk_start), ts.tt_jd(chunk_end), max_workers)
+            if held is not None:
+                chunk = held.joined(chunk)
+            intervals = chunk.intervals
+            if chunk_end < end.tt:
+                still_going = intervals['open_end'] & (np.abs(intervals['los'] - chunk_end) < SAME_TIME_DAYS)
+                held = AccessMatrix(ids, chunk.tles, stations, chunk_start, chunk_end, intervals[still_going])
+                intervals = intervals[~still_going]
+            if len(intervals) > 0:
+                writer.write(pass_columns(ts, ids, satrecs, stations, station_set, intervals))
+                count += len(intervals)
+            chunk_start = chunk_end
+    finally:
+        writer.close()
+    return count
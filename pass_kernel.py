@@ -0,0 +1,219 @@
+import numpy as np
+from skyfield.constants import DAY_S, tau
+from skyfield.sgp4lib import theta_GMST1982
+
+#One row per pass. Times are TT Julian dates. A pass that was already under way at the start of the
+#searched window, or still going at its end, is cut off there and flagged with open_start/open_end.
+PASS_DTYPE = np.dtype([('aos', 'f8'), ('tca', 'f8'), ('los', 'f8'), ('max_el', 'f8'),
+                       ('open_start', '?'), ('open_end', '?')])
+#The coarse grid samples each orbit this many times (the same as Skyfield's find_events), but never
+#less than every MAX_STEP_DAYS, since the earth turning can bring a slow satellite into view too
+STEPS_PER_ORBIT = 20
+MAX_STEP_DAYS = 0.25
+#Refined times are good to this (in days, 1 ms)
+TOLERANCE_DAYS = 0.001 / DAY_S
+#Slopes are taken from points this far (1 s) either side
+FINITE_STEP_DAYS = 1 / DAY_S
+STENCIL = np.array([-FINITE_STEP_DAYS, 0, FINITE_STEP_DAYS])
+
+#The elevation mask of a station, from its optional "Elevation_mask" config entry. Either a single
+#elevation in degrees, or a terrain mask: a list of [azimuth, elevation] points in degrees, interpolated
+#in between (and around through north). Returned in a form that can be part of a cache key.
+def station_mask(gs):
+    mask = gs.get("Elevation_mask", 0)
+    if isinstance(mask, (list, tuple)):
+        return tuple(sorted((float(az) % 360, float(el)) for az, el in mask))
+    return float(mask)
+
+# Where a set of ground stations are, and how to turn ITRS positions into look angles from each of them
+class StationSet():
+    #stations is a list of (skyfield_groundstation, mask), mask as returned by station_mask
+    def __init__(self, stations):
+        lat = np.array([gs.latitude.radians for gs, mask in stations])
+        lon = np.array([gs.longitude.radians for gs, mask in stations])
+        self.itrs_km = np.array([gs.itrs_xyz.km for gs, mask in stations]) #[station, xyz]
+        #East, north and up unit vectors of each station, [station, enu, xyz]
+        self.enu = np.stack([np.stack([-np.sin(lon), np.cos(lon), np.zeros_like(lon)], axis=-1),
+                             np.stack([-np.sin(lat)*np.cos(lon), -np.sin(lat)*np.sin(lon), np.cos(lat)], axis=-1),
+                             np.stack([np.cos(lat)*np.cos(lon), np.cos(lat)*np.sin(lon), np.sin(lat)], axis=-1)], axis=1)
+        self.masks = [mask for gs, mask in stations]
+        #Flat masks as one array, looked up by station index. NaN for stations with a terrain mask.
+        self.flat_masks = np.array([np.nan if isinstance(mask, tuple) else mask for mask in self.masks])
+        self.terrain = [i for i, mask in enumerate(self.masks) if isinstance(mask, tuple)]
+
+    def __len__(self):
+        return len(self.masks)
+
+    #Altitude and azimuth (degrees), range (km) and range rate (km/s) of ITRS positions and velocities
+    #([..., xyz]) seen from the stations with the given indices (broadcast against the positions)
+    def look_angles(self, index, itrs_km, itrs_km_per_s):
+        offset = itrs_km - self.itrs_km[index]
+        east, north, up = [np.sum(offset * self.enu[index, axis], axis=-1) for axis in range(3)]
+        range_km = np.sqrt(np.sum(offset * offset, axis=-1))
+        alt = np.degrees(np.arctan2(up, np.sqrt(east*east + north*north)))
+        az = np.degrees(np.arctan2(east, north)) % 360
+        range_rate = np.sum(offset * itrs_km_per_s, axis=-1) / range_km
+        return alt, az, range_km, range_rate
+
+    #Degrees above each station's mask, at the given azimuths
+    def mask_at(self, index, az):
+        index, az = np.broadcast_arrays(index, az)
+        mask = self.flat_masks[index]
+        for i in self.terrain:
+            chosen = index == i
+            points = np.array(self.masks[i])
+            mask[chosen] = np.interp(az[chosen], points[:, 0], points[:, 1], period=360)
+        return mask
+
+#ITRS position (km) and velocity (km/s) of an SGP4 model at an array of TT Julian dates, [time, xyz].
+#The same TEME to ITRS rotation Skyfield uses for its satellites, without polar motion.
+#Times where SGP4 fails (a decayed orbit...) come back as NaN.
+def satellite_itrs(satrec, ts, tt):
+    times = ts.tt_jd(tt)
+    errors, r, v = satrec.sgp4_array(times.whole, times.tai_fraction - times._leap_seconds() / DAY_S)
+    theta, theta_dot = theta_GMST1982(times.whole, times.ut1_fraction)
+    cos_theta, sin_theta = np.cos(theta), np.sin(theta)
+    position = np.stack([cos_theta * r[:, 0] + sin_theta * r[:, 1],
+                         cos_theta * r[:, 1] - sin_theta * r[:, 0],
+                         r[:, 2]], axis=-1)
+    spin = theta_dot / DAY_S
+    velocity = np.stack([cos_theta * v[:, 0] + sin_theta * v[:, 1] + spin * position[:, 1],
+                         cos_theta * v[:, 1] - sin_theta * v[:, 0] - spin * position[:, 0],
+                         v[:, 2]], axis=-1)
+    position[errors != 0] = np.nan
+    velocity[errors != 0] = np.nan
+    return position, velocity
+
+#Spacing (days) of the coarse grid for a satellite
+def coarse_step(satrec):
+    orbits_per_day = satrec.no_kozai / tau * 24 * 60
+    return min(1 / max(orbits_per_day, 1) / STEPS_PER_ORBIT, MAX_STEP_DAYS)
+
+#Safeguarded Newton's method, vectorized over many brackets at once. Finds a zero of g in each bracket
+#[lo, hi], where g has the sign lo_sign at lo. g_and_slope(which, tt) gives g and its slope at times tt
+#for the brackets with indices which. A Newton step that would leave the bracket is replaced by a
+#bisection, so every bracket converges even where g is badly behaved. Returns the zeros.
+def newton(g_and_slope, lo, hi, lo_sign, start):
+    lo, hi, t = lo.copy(), hi.copy(), start.copy()
+    active = np.arange(len(t))
+    while len(active) > 0:
+        g, slope = g_and_slope(active, t[active])
+        on_lo_side = np.sign(g) == lo_sign[active]
+        lo[active] = np.where(on_lo_side, t[active], lo[active])
+        hi[active] = np.where(on_lo_side, hi[active], t[active])
+        step = -np.divide(g, slope, out=np.full(len(g), np.inf), where=slope != 0)
+        done = (np.abs(step) < TOLERANCE_DAYS) | (hi[active] - lo[active] < TOLERANCE_DAYS)
+        new = t[active] + step
+        outside = ~((new > lo[active]) & (new < hi[active]))
+        new = np.where(outside, (lo[active] + hi[active]) / 2, new)
+        t[active] = np.where(done, t[active], new)
+        active = active[~done]
+    return t
+
+#In these, height_at(which, tt) gives heights for the brackets with indices which, at times tt shaped
+#[bracket, point].
+#Times where height_at crosses zero, one in each bracket [lo, hi] whose ends have heights
+#lo_height and hi_height. Starts from where the straight line between the ends crosses.
+def find_crossings(height_at, lo, hi, lo_height, hi_height):
+    def g_and_slope(which, tt):
+        heights = height_at(which, tt[:, None] + STENCIL)
+        return heights[:, 1], (heights[:, 2] - heights[:, 0]) / (2 * FINITE_STEP_DAYS)
+    start = lo + (hi - lo) * lo_height / (lo_height - hi_height)
+    return newton(g_and_slope, lo, hi, np.sign(lo_height), start)
+
+#Times and heights of the highest point of height_at in each bracket [lo, hi], where the slope is zero,
+#or at an end of the bracket if height_at only climbs or only falls inside it
+def find_peaks(height_at, lo, hi):
+    def g_and_slope(which, tt):
+        heights = height_at(which, tt[:, None] + STENCIL)
+        return ((heights[:, 2] - heights[:, 0]) / (2 * FINITE_STEP_DAYS),
+                (heights[:, 2] - 2 * heights[:, 1] + heights[:, 0]) / FINITE_STEP_DAYS**2)
+    everything = np.arange(len(lo))
+    lo_slope = g_and_slope(everything, lo)[0]
+    hi_slope = g_and_slope(everything, hi)[0]
+    inside = np.nonzero((lo_slope > 0) & (hi_slope < 0))[0]
+    peak = np.where(lo_slope <= 0, lo, hi)
+    peak[inside] = newton(lambda which, tt: g_and_slope(inside[which], tt), lo[inside], hi[inside],
+                          np.ones(len(inside)), (lo[inside] + hi[inside]) / 2)
+    return peak, height_at(everything, peak[:, None])[:, 0]
+
+#Every pass of the satellite modelled by satrec over each station of a StationSet, between TT Julian
+#dates t0 and t1. Returns a list with an array of PASS_DTYPE per station, sorted by AOS.
+#Elevation above each station's mask is sampled on a coarse grid for all stations at once. Then rises,
+#sets and culminations are refined by Newton's method, in batches of every pass found.
+def find_passes(satrec, ts, stations, t0, t1):
+    step = coarse_step(satrec)
+    grid = np.linspace(t0, t1, max(int(np.ceil((t1 - t0) / step)), 1) + 1)
+
+    #Altitude and azimuth from station number index at times tt, which broadcast together
+    def altitude(index, tt):
+        index, tt = np.broadcast_arrays(index, tt)
+        position, velocity = satellite_itrs(satrec, ts, tt.ravel())
+        alt, az, range_km, range_rate = stations.look_angles(index.ravel(), position, velocity)
+        return np.nan_to_num(alt, nan=-90).reshape(tt.shape), az.reshape(tt.shape)
+    #Degrees above the mask
+    def above_mask(index, tt):
+        alt, az = altitude(index, tt)
+        return alt - stations.mask_at(index, az)
+
+    every_station = np.arange(len(stations))[:, None]
+    alt, az = altitude(every_station, grid[None])
+    height = alt - stations.mask_at(every_station, az) #[station, grid]
+    up = height > 0
+
+    #A short pass can rise and set between two grid points. It shows up as a peak below the mask in
+    #the grid, so every such peak is refined to see if it really pokes above.
+    peak_station, peak = np.nonzero((height[:, 1:-1] >= height[:, :-2]) & (height[:, 1:-1] > height[:, 2:]) & ~up[:, 1:-1])
+    peak_time, peak_height = find_peaks(lambda which, tt: above_mask(peak_station[which, None], tt), grid[peak], grid[peak + 2])
+    hidden = peak_height > 0
+    hidden_station, hidden_peak, hidden_time, hidden_height = peak_station[hidden], peak[hidden], peak_time[hidden], peak_height[hidden]
+
+    #Brackets of every rise and set, across all stations: grid steps where the sign changes, and both
+    #sides of each hidden peak
+    rise_station, rise_step = np.nonzero(~up[:, :-1] & up[:, 1:])
+    set_station, set_step = np.nonzero(up[:, :-1] & ~up[:, 1:])
+    bracket_station = np.concatenate([rise_station, set_station, hidden_station, hidden_station])
+    lo = np.concatenate([grid[rise_step], grid[set_step], grid[hidden_peak], hidden_time])
+    hi = np.concatenate([grid[rise_step + 1], grid[set_step + 1], hidden_time, grid[hidden_peak + 2]])
+    lo_height = np.concatenate([height[rise_station, rise_step], height[set_station, set_step],
+                                height[hidden_station, hidden_peak], hidden_height])
+    hi_height = np.concatenate([height[rise_station, rise_step + 1], height[set_station, set_step + 1],
+                                hidden_height, height[hidden_station, hidden_peak + 2]])
+    is_rise = lo_height <= 0
+    crossing = find_crossings(lambda which, tt: above_mask(bracket_station[which, None], tt), lo, hi, lo_height, hi_height)
+
+    #Pair up rises and sets of each station. The window's ends stand in for those outside it.
+    aos, los, pass_station, open_start, open_end = [], [], [], [], []
+    for i in range(len(stations)):
+        mine = bracket_station == i
+        order = np.argsort(crossing[mine])
+        times, rising = crossing[mine][order], is_rise[mine][order]
+        if up[i, 0]:
+            times, rising = np.concatenate([[t0], times]), np.concatenate([[True], rising])
+        if up[i, -1]:
+            times, rising = np.concatenate([times, [t1]]), np.concatenate([rising, [False]])
+        count = len(times) // 2
+        aos.append(times[0::2])
+        los.append(times[1::2])
+        pass_station.append(np.full(count, i))
+        open_start.append(np.arange(count) == 0 if up[i, 0] else np.zeros(count, bool))
+        open_end.append(np.arange(count) == count - 1 if up[i, -1] else np.zeros(count, bool))
+    aos, los, pass_station = np.concatenate(aos), np.concatenate(los), np.concatenate(pass_station)
+
+    #Culminations: the highest point of each pass (in plain altitude, whatever the mask), searched for
+    #around the highest grid point inside it, or across the whole pass if it is shorter than a grid step.
+    #Near the zenith, altitude over time comes to a sharp point, which Newton's method handles badly.
+    #The square of the zenith distance is smooth there, and has its lowest point at the same time.
+    lo, hi = aos.copy(), los.copy()
+    first_inside, last_inside = np.searchsorted(grid, aos, 'right'), np.searchsorted(grid, los, 'left')
+    for j in np.nonzero(last_inside > first_inside)[0]:
+        best = first_inside[j] + np.argmax(alt[pass_station[j], first_inside[j]:last_inside[j]])
+        lo[j] = max(grid[max(best - 1, 0)], aos[j])
+        hi[j] = min(grid[min(best + 1, len(grid) - 1)], los[j])
+    tca, zenith_squared = find_peaks(lambda which, tt: -(90 - altitude(pass_station[which, None], tt)[0])**2, lo, hi)
+    max_el = 90 - np.sqrt(-zenith_squared)
+
+    passes = np.zeros(len(aos), dtype=PASS_DTYPE)
+    passes['aos'], passes['tca'], passes['los'], passes['max_el'] = aos, tca, los, max_el
+    passes['open_start'], passes['open_end'] = np.concatenate(open_start), np.concatenate(open_end)
+    return [passes[pass_station == i] for i in range(len(stations))]
@@ -0,0 +1,115 @@
+import sys
+import time
+from collections import deque
+import numpy as np
+from PyQt5 import QtCore
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QTableWidget, QTableWidgetItem, QHeaderView
+
+#Statistics are taken over this many of the most recent calls of each module
+ROLLING_WINDOW = 500
+#Bucket edges (ms) of the exported duration histograms. The last bucket holds everything slower.
+HISTOGRAM_EDGES_MS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+#How often the Performance window refreshes
+REFRESH_MS = 1000
+
+# Timing record of one module's update callback
+class CallStats():
+    def __init__(self, name, callback_name):
+        self.name = name
+        self.callback_name = callback_name
+        self.calls = 0
+        self.total_ms = 0
+        #Rolling windows of the latest calls
+        self.durations_ms = deque(maxlen=ROLLING_WINDOW)
+        #Change in the interpreter's count of allocated memory blocks over each call. Positive means the
+        #call left objects behind (caches, plot items...), so a steady climb points at a leak.
+        self.allocated_blocks = deque(maxlen=ROLLING_WINDOW)
+
+    def record(self, duration_ms, allocated_blocks):
+        self.calls += 1
+        self.total_ms += duration_ms
+        self.durations_ms.append(duration_ms)
+        self.allocated_blocks.append(allocated_blocks)
+
+    def percentile(self, q):
+        if len(self.durations_ms) == 0:
+            return 0
+        return float(np.percentile(self.durations_ms, q))
+
+    #Counts of the rolling window's durations in each bucket of HISTOGRAM_EDGES_MS
+    def histogram(self):
+        counts, _ = np.histogram(self.durations_ms, bins=HISTOGRAM_EDGES_MS + [np.inf])
+        return counts.tolist()
+
+    def export_data(self):
+        return {"Callback": self.callback_name,
+                "Calls": self.calls,
+                "Total (ms)": self.total_ms,
+                "p50 (ms)": self.percentile(50),
+                "p99 (ms)": self.percentile(99),
+                "Max (ms)": max(self.durations_ms, default=0),
+                "Mean allocated blocks": float(np.mean(self.allocated_blocks)) if len(self.allocated_blocks) > 0 else 0,
+                "Histogram edges (ms)": HISTOGRAM_EDGES_MS,
+                "Histogram counts": self.histogram()}
+
+# Measures every update call the scheduler makes, per module
+class PerformanceMonitor():
+    def __init__(self):
+        self.stats = {}
+
+    def reset(self):
+        self.stats = {}
+
+    #Run callback for the named module, and record how long it took. Returns the duration in ms.
+    def measure(self, name, callback):
+        if name not in self.stats:
+            self.stats[name] = CallStats(name, callback.__name__)
+        blocks_before = sys.getallocatedblocks()
+        start = time.perf_counter()
+        callback()
+        duration_ms = (time.perf_counter() - start) * 1000
+        self.stats[name].record(duration_ms, sys.getallocatedblocks() - blocks_before)
+        return duration_ms
+
+    def export_data(self):
+        return {name: stats.export_data() for name, stats in self.stats.items()}
+
+# Live table of each module's update times, opened from the Modules menu
+class PerformanceDialog(QDialog):
+    COLUMNS = ["Module", "Callback", "Calls", "p50 (ms)", "p99 (ms)", "Max (ms)", "Mean allocated blocks"]
+    def __init__(self, monitor, parent = None):
+        super().__init__(parent)
+        self.monitor = monitor
+        self.setWindowTitle("Performance")
+        self.setWindowModality(False) #enables interacting with main window even while dialog is up
+        self.table = QTableWidget(0, len(self.COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.verticalHeader().setVisible(False)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.table)
+        self.resize(700, 300)
+
+        #Only refreshes while it is open
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+
+    def refresh(self):
+        #Slowest modules first
+        all_stats = sorted(self.monitor.stats.values(), key=lambda s: s.percentile(99), reverse=True)
+        self.table.setRowCount(len(all_stats))
+        for row, stats in enumerate(all_stats):
+            summary = stats.export_data()
+            values = [stats.name, stats.callback_name, str(stats.calls),
+                      f"{summary['p50 (ms)']:.1f}", f"{summary['p99 (ms)']:.1f}", f"{summary['Max (ms)']:.1f}",
+                      f"{summary['Mean allocated blocks']:.0f}"]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start(REFRESH_MS)
+        super().showEvent(event)
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
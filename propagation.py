@@ -0,0 +1,128 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from sgp4.api import SatrecArray
+from skyfield.api import wgs84
+from skyfield.constants import DAY_S, ERAD
+from skyfield.geometry import intersect_line_and_sphere
+from skyfield.sgp4lib import TEME, theta_GMST1982
+
+#WGS84 constants for turning ITRS positions into geodetic latitude and height
+WGS84_RADIUS_KM = wgs84.radius.km
+WGS84_E2 = (2 - 1/298.257223563) / 298.257223563
+#SatrecArrays kept for reuse, least recently used dropped first
+SATREC_CACHE_SIZE = 16
+#Precession/nutation and the sun's direction change slowly, so on long time grids they are only
+#evaluated this often (in days) and interpolated in between. The error is far below a meter.
+SLOW_KNOT_SPACING = 1/24
+
+# The output of one propagation: every satellite, at every time of the grid.
+# Arrays are indexed [satellite, time, (xyz)], satellites in the same order as ids.
+class PropagationResult():
+    def __init__(self, ids, t, position_km, velocity_km_per_s, itrs_km, errors, sunlit):
+        self.ids = ids
+        self.t = t
+        self.position_km = position_km #GCRS
+        self.velocity_km_per_s = velocity_km_per_s #GCRS
+        self.itrs_km = itrs_km
+        self.errors = errors #SGP4 error codes, 0 where propagation succeeded
+        self.sunlit = sunlit #None unless an ephemeris was given
+        self.lat_deg, self.lon_deg, self.height_km = geodetic_of(itrs_km)
+    #Row of the arrays that belongs to a satellite ID
+    def index(self, sat_id):
+        return self.ids.index(sat_id)
+
+#Geodetic latitude, longitude and height of ITRS positions, shaped [..., xyz].
+#Same iteration Skyfield's wgs84.latlon_of uses, but over whole arrays at once.
+def geodetic_of(itrs_km):
+    x, y, z = itrs_km[..., 0], itrs_km[..., 1], itrs_km[..., 2]
+    R = np.sqrt(x*x + y*y)
+    lat = np.arctan2(z, R)
+    for iteration in 0,1,2:
+        e2_sin_lat = WGS84_E2 * np.sin(lat)
+        aC = WGS84_RADIUS_KM / np.sqrt(1.0 - e2_sin_lat * np.sin(lat))
+        hyp = z + aC * e2_sin_lat
+        lat = np.arctan2(hyp, R)
+    lon = (np.arctan2(y, x) - np.pi) % (2*np.pi) - np.pi
+    height = np.sqrt(hyp*hyp + R*R) - aC
+    return np.degrees(lat), np.degrees(lon), height
+
+# Propagates every satellite over a shared time grid with one call into SGP4's satellite-array
+# backend, instead of each module propagating each satellite with its own Skyfield calls.
+class PropagationEngine():
+    def __init__(self, resources):
+        self.resources = resources
+        #SatrecArrays already built, keyed by the TLEs they hold. Most callers ask for the same few sets.
+        #Worker threads propagate too, so the cache is only touched while holding the lock.
+        self._satrec_arrays = OrderedDict()
+        self._satrec_lock = threading.Lock()
+
+    #A new SatrecArray, reusing the SGP4 models already initialized in the satellite cache
+    def build_satrec_array(self, tles):
+        return SatrecArray([self.resources.satellite(tle).model for tle in tles])
+
+    def satrec_array(self, tles):
+        tle_key = tuple(tuple(tle) for tle in tles)
+        with self._satrec_lock:
+            satrecs = self._satrec_arrays.get(tle_key)
+            if satrecs is not None:
+                self._satrec_arrays.move_to_end(tle_key)
+                return satrecs
+        satrecs = self.build_satrec_array(tles)
+        with self._satrec_lock:
+            self._satrec_arrays[tle_key] = satrecs
+            #Stale sets (from replaced TLEs) pile up otherwise
+            while len(self._satrec_arrays) > SATREC_CACHE_SIZE:
+                self._satrec_arrays.popitem(last=False)
+        return satrecs
+
+    #tles is a dictionary of {ID: TLE}, like cross_module_vars['TLES']. times is a Skyfield Time,
+    #normally an array of times. If an ephemeris is given, sunlit flags are computed too.
+    #satrecs is a SatrecArray already built for tles, for callers that don't want it in the shared cache.
+    def propagate(self, tles, times, ephemeris = None, satrecs = None):
+        ids = list(tles.keys())
+        ts = self.resources.timescale
+        #Work with a 1-D array of times even if given a single time
+        times = ts.tt_jd(np.atleast_1d(times.whole), np.atleast_1d(times.tt_fraction))
+        #SGP4 wants UTC Julian dates. This is the same split Skyfield's own EarthSatellite uses.
+        jd = times.whole
+        fraction = times.tai_fraction - times._leap_seconds() / DAY_S
+        if satrecs is None:
+            satrecs = self.satrec_array([tles[i] for i in ids])
+        errors, r_teme, v_teme = satrecs.sgp4(jd, fraction)
+
+        #Rotation matrices are the same for every satellite, so build them once per time.
+        #TEME -> GCRS holds no earth rotation (only precession and nutation), so it is interpolated.
+        teme_rotation = slowly_varying(times, TEME.rotation_at) #[3, 3, time], GCRS -> TEME
+        position_km = np.einsum('jit,stj->sti', teme_rotation, r_teme)
+        velocity_km_per_s = np.einsum('jit,stj->sti', teme_rotation, v_teme)
+        #TEME -> ITRS is just the earth's rotation angle (Skyfield's ITRS, without polar motion)
+        theta, theta_dot = theta_GMST1982(times.whole, times.ut1_fraction)
+        cos_theta, sin_theta = np.cos(theta), np.sin(theta)
+        itrs_km = np.stack([cos_theta * r_teme[..., 0] + sin_theta * r_teme[..., 1],
+                            cos_theta * r_teme[..., 1] - sin_theta * r_teme[..., 0],
+                            r_teme[..., 2]], axis=-1)
+
+        sunlit = None
+        if ephemeris is not None:
+            sun_km = slowly_varying(times, lambda t: (ephemeris['sun'] - ephemeris['earth']).at(t).position.km) #[xyz, time]
+            #Same test as Skyfield's is_sunlit: does the line from the satellite to the sun cross the earth?
+            earth_km = -np.moveaxis(position_km, 2, 0) #[xyz, sat, time]
+            near, far = intersect_line_and_sphere(sun_km[:, None, :] + earth_km, earth_km, ERAD / 1000)
+            sunlit = np.nan_to_num(far) <= 0
+        return PropagationResult(ids, times, position_km, velocity_km_per_s, itrs_km, errors, sunlit)
+
+#Evaluate function(t) (returning an array whose last axis is time) on a sparse subset of times,
+#and linearly interpolate the rest. Falls back to evaluating every time on short grids.
+def slowly_varying(times, function):
+    tt = times.tt
+    knot_count = int(np.ptp(tt) / SLOW_KNOT_SPACING) + 2
+    if knot_count >= len(tt):
+        return function(times)
+    #Knots are picked in time order, so grids running backward in time work too
+    order = np.argsort(tt)
+    knot_indices = order[np.unique(np.linspace(0, len(tt) - 1, knot_count).round().astype(int))]
+    knot_values = function(times[knot_indices])
+    flat_knots = knot_values.reshape(-1, len(knot_indices))
+    interpolated = [np.interp(tt, tt[knot_indices], row) for row in flat_knots]
+    return np.array(interpolated).reshape(knot_values.shape[:-1] + (len(tt),))
@@ -0,0 +1,68 @@
+import time
+from skyfield.api import load, EarthSatellite
+from skyfield.data import hipparcos
+
+# Holds the expensive Skyfield resources (timescale, ephemeris, star catalog) for the whole window.
+# Each one is loaded the first time a module asks for it, and then every module shares that same handle,
+# instead of re-parsing files on every update tick.
+class ResourceRegistry():
+    def __init__(self, ephemeris_file = 'de421.bsp'):
+        self.ephemeris_file = ephemeris_file
+        self._timescale = None
+        self._ephemeris = None
+        self._hipparcos = None
+        #Prebuilt EarthSatellite objects, keyed by the tuple of their TLE lines
+        self._satellites = {}
+        #Seconds it took to load each resource, keyed by resource name
+        self.load_times = {}
+
+    #Run a loader function, and record and report how long it took
+    def timed_load(self, resource_name, loader):
+        start = time.perf_counter()
+        loaded = loader()
+        elapsed = time.perf_counter() - start
+        self.load_times[resource_name] = elapsed
+        print(f"Loaded {resource_name} in {elapsed:.3f} s")
+        return loaded
+
+    @property
+    def timescale(self):
+        if self._timescale is None:
+            self._timescale = self.timed_load("timescale", load.timescale)
+        return self._timescale
+
+    # The planetary ephemeris, used for sun/moon/earth positions and sunlit checks
+    @property
+    def ephemeris(self):
+        if self._ephemeris is None:
+            self._ephemeris = self.timed_load(self.ephemeris_file, lambda: load(self.ephemeris_file))
+        return self._ephemeris
+
+    # The full Hipparcos catalog as a pandas dataframe. Modules filter it by magnitude themselves.
+    @property
+    def hipparcos(self):
+        if self._hipparcos is None:
+            def load_catalog():
+                with load.open(hipparcos.URL) as f:
+                    return hipparcos.load_dataframe(f)
+            self._hipparcos = self.timed_load("hipparcos", load_catalog)
+        return self._hipparcos
+
+    # Get the EarthSatellite for a TLE. Building one re-runs the SGP4 initialization, so every module
+    # shares a single object per TLE, and each update only has to pay for the propagation itself.
+    def satellite(self, tle):
+        key = tuple(tle)
+        satellite = self._satellites.get(key)
+        #Kept in a local, since another thread can drop it from the cache right after it is stored
+        if satellite is None:
+            satellite = EarthSatellite(*key, ts=self.timescale)
+            self._satellites[key] = satellite
+        return satellite
+    # Forget the satellite built for a TLE that has been replaced
+    def drop_satellite(self, tle):
+        self._satellites.pop(tuple(tle), None)
+    def clear_satellites(self):
+        self._satellites.clear()
+
+    def export_data(self):
+        return {"Load times (s)": self.load_times}
@@ -0,0 +1,177 @@
+import time
+import datetime
+from PyQt5 import QtCore
+from skyfield.api import utc
+
+#Modules run in order of priority on each tick, lowest number first
+DEFAULT_PRIORITY = 10
+#The scheduler's own timer never ticks faster than this
+MIN_TICK_MS = 50
+#If one tick has already taken this many base intervals, the remaining modules wait until the next one
+TICK_BUDGET_INTERVALS = 2
+
+# Everything about "now" that several modules need each tick. Values are computed the first time a
+# module asks for them, and then shared by every other module during the same tick.
+class TickState():
+    def __init__(self, window, globaltime, jumped):
+        self.window = window
+        self.globaltime = globaltime
+        #True if globaltime was set by hand (time controller, clicking a pass...) since the last tick
+        self.jumped = jumped
+        self._time = None
+        self._positions = None
+    #globaltime as a Skyfield Time
+    @property
+    def time(self):
+        if self._time is None:
+            self._time = self.window.resources.timescale.from_datetime(self.globaltime.replace(tzinfo=utc))
+        return self._time
+    #PropagationResult of every satellite in cross_module_vars['TLES'] at this tick's time
+    @property
+    def positions(self):
+        if self._positions is None:
+            self._positions = self.window.propagator.propagate(self.window.cross_module_vars['TLES'], self.time)
+        return self._positions
+
+# One module's registration with the scheduler, and its timing record
+class ScheduledModule():
+    def __init__(self, module, callback, period_ms, priority):
+        self.module = module
+        self.name = getattr(module, "name", type(module).__name__)
+        self.callback = callback
+        self.period_ms = period_ms
+        self.priority = priority
+        self.next_due = None
+        self.runs = 0
+        #Periods that passed while we were behind, and were merged into a single run
+        self.merged_ticks = 0
+        #Runs that finished after the module's next run was already due
+        self.deadline_misses = 0
+        #Times the module was due but was put off to the next tick because the tick ran over budget
+        self.deferrals = 0
+        #A module put off last tick runs this tick no matter what, so it can't be starved
+        self.deferred = False
+        self.last_duration_ms = 0
+
+# One timer for the whole window, replacing a QTimer per module. Each tick advances globaltime once,
+# builds the shared TickState, and then runs each module that is due, in priority order.
+class TickScheduler():
+    def __init__(self, window):
+        self.window = window
+        self.entries = []
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self.tick)
+        #The clock only runs if a module (the time controller) asks for it with drive_clock
+        self.clock_period_ms = None
+        self.clock_step = datetime.timedelta(seconds=1)
+        self.clock_next_due = None
+        self.clock_paused = False
+        #The globaltime we left at the end of the last tick, used to spot jumps
+        self.last_globaltime = None
+        self._state = None
+
+    def reset(self):
+        self.timer.stop()
+        self.entries = []
+        self.clock_period_ms = None
+        self.clock_paused = False
+        self.last_globaltime = None
+        self._state = None
+
+    #Run callback every period_ms. Lower priorities run first within a tick. Unless given here, the priority
+    #comes from the module's update_priority (settable in its initparams), or DEFAULT_PRIORITY.
+    def register(self, module, callback, period_ms, priority = None):
+        if priority is None:
+            priority = getattr(module, "update_priority", DEFAULT_PRIORITY)
+        entry = ScheduledModule(module, callback, period_ms, priority)
+        self.entries.append(entry)
+        self.entries.sort(key=lambda e: e.priority)
+        if self.timer.isActive():
+            self.start()
+        return entry
+
+    #Advance globaltime by step every period_ms of real time
+    def drive_clock(self, period_ms, step = datetime.timedelta(seconds=1)):
+        self.clock_period_ms = period_ms
+        self.clock_step = step
+        self.clock_next_due = None
+        if self.timer.isActive():
+            self.start()
+
+    def start(self):
+        periods = [e.period_ms for e in self.entries]
+        if self.clock_period_ms is not None:
+            periods.append(self.clock_period_ms)
+        if len(periods) == 0:
+            return
+        self.timer.start(max(MIN_TICK_MS, min(periods)))
+
+    #The shared state for the current globaltime. Rebuilt if something changed globaltime mid-tick.
+    @property
+    def state(self):
+        globaltime = self.window.cross_module_vars['globaltime']
+        if self._state is None or self._state.globaltime != globaltime:
+            jumped = self.last_globaltime is not None and globaltime != self.last_globaltime
+            self._state = TickState(self.window, globaltime, jumped)
+        return self._state
+
+    def tick(self):
+        now = time.monotonic() * 1000
+        self.advance_clock(now)
+        #Fresh shared state for this tick
+        self._state = None
+        if self.state.jumped:
+            #Background work for the old time is no longer wanted
+            self.window.workers.time_jumped()
+        budget_ms = TICK_BUDGET_INTERVALS * self.timer.interval()
+        for entry in self.entries:
+            if entry.next_due is None:
+                entry.next_due = now
+            if now < entry.next_due:
+                continue
+            elapsed = time.monotonic() * 1000 - now
+            if elapsed > budget_ms and not entry.deferred:
+                entry.deferrals += 1
+                entry.deferred = True
+                continue
+            entry.deferred = False
+            #If several periods went by while we were behind, do them as one run
+            behind = int((now - entry.next_due) // entry.period_ms)
+            entry.merged_ticks += behind
+            entry.next_due += (behind + 1) * entry.period_ms
+            entry.last_duration_ms = self.window.performance.measure(entry.name, entry.callback)
+            finish = time.monotonic() * 1000
+            entry.runs += 1
+            if finish > entry.next_due:
+                entry.deadline_misses += 1
+        self.last_globaltime = self.window.cross_module_vars['globaltime']
+
+    def advance_clock(self, now):
+        if self.clock_period_ms is None:
+            return
+        if self.clock_next_due is None:
+            self.clock_next_due = now + self.clock_period_ms
+            return
+        if now < self.clock_next_due:
+            return
+        steps = int((now - self.clock_next_due) // self.clock_period_ms) + 1
+        self.clock_next_due += steps * self.clock_period_ms
+        if self.clock_paused:
+            return
+        #Don't count our own step as a jump
+        jumped = self.last_globaltime is not None and self.window.cross_module_vars['globaltime'] != self.last_globaltime
+        self.window.cross_module_vars['globaltime'] += steps * self.clock_step
+        if not jumped:
+            self.last_globaltime = self.window.cross_module_vars['globaltime']
+
+    def export_data(self):
+        modules_data = {}
+        for entry in self.entries:
+            modules_data[entry.name] = {"Period (ms)": entry.period_ms,
+                                        "Priority": entry.priority,
+                                        "Runs": entry.runs,
+                                        "Merged ticks": entry.merged_ticks,
+                                        "Deadline misses": entry.deadline_misses,
+                                        "Deferrals": entry.deferrals,
+                                        "Last duration (ms)": entry.last_duration_ms}
+        return modules_data
@@ -0,0 +1,110 @@
+import numpy as np
+
+TWOPI = 2 * np.pi
+HALFPI = np.pi / 2
+#Rings are sampled about this often along their edge (radians), so big circles get more points than small ones
+RING_STEP = np.radians(0.5)
+RING_MIN_SAMPLES = 16
+RING_MAX_SAMPLES = 1000
+
+# Circles on a sphere (footprints, the earth seen from orbit, keepout zones), all in radians: latitude and
+# longitude (or dec and RA) of the center, and the angular radius. Everything is done on whole arrays.
+
+#The haversine function
+def hav(value):
+    return (1 - np.cos(value)) / 2
+
+#The archaversine function. NaN where value is outside [0, 1].
+def archav(value):
+    with np.errstate(invalid='ignore'):
+        return np.arccos(1 - 2 * value)
+
+#Angle between points (lat1, lon1) and (lat2, lon2), by the haversine formula. Any of them can be arrays.
+def angular_distance(lat1, lon1, lat2, lon2):
+    hav_theta = hav(lat2 - lat1) + np.cos(lat1) * np.cos(lat2) * hav(lon2 - lon1)
+    #Rounding can push it a hair outside [0, 1] for points on top of each other or opposite
+    return archav(np.clip(hav_theta, 0, 1))
+
+#How many points to draw a circle of this radius with
+def ring_samples(radius, step = RING_STEP):
+    return int(np.clip(np.ceil(TWOPI * abs(np.sin(radius)) / step), RING_MIN_SAMPLES, RING_MAX_SAMPLES))
+
+#Points around the edge of a circle, as lat and lon arrays. The ring is closed (the last point is the
+#first one again), and lon is continuous: it isn't wrapped, so a ring around a pole ends a whole turn
+#away from where it started.
+def small_circle(center_lat, center_lon, radius, step = RING_STEP):
+    #Walk out radius from the center in every compass direction
+    bearings = np.linspace(0, TWOPI, ring_samples(radius, step) + 1)
+    sin_lat = np.sin(center_lat) * np.cos(radius) + np.cos(center_lat) * np.sin(radius) * np.cos(bearings)
+    lat = np.arcsin(np.clip(sin_lat, -1, 1))
+    lon_shift = np.arctan2(np.sin(bearings) * np.sin(radius) * np.cos(center_lat),
+                           np.cos(radius) - np.sin(center_lat) * sin_lat)
+    return lat, center_lon + np.unwrap(lon_shift)
+
+#The part of a closed ring (lon, lat) on one side of the meridian at edge (the low side if below, otherwise
+#the high side), with points added where the ring crosses it. A circle crosses a meridian at most twice,
+#so what's left is still one closed shape, running along the edge where the rest was cut off.
+def clip_ring(lon, lat, edge, below):
+    inside = lon <= edge if below else lon >= edge
+    crossings = np.nonzero(inside[:-1] != inside[1:])[0]
+    fraction = (edge - lon[crossings]) / (lon[crossings + 1] - lon[crossings])
+    crossing_lat = lat[crossings] + fraction * (lat[crossings + 1] - lat[crossings])
+    lon = np.insert(lon, crossings + 1, edge)
+    lat = np.insert(lat, crossings + 1, crossing_lat)
+    inside = np.insert(inside, crossings + 1, True)
+    lon, lat = lon[inside], lat[inside]
+    if len(lon) > 0 and (lon[0] != lon[-1] or lat[0] != lat[-1]):
+        lon, lat = np.append(lon, lon[0]), np.append(lat, lat[0])
+    return lon, lat
+
+#A circle drawn on a flat map whose longitude runs from lon_min to lon_min + 2 pi, as a list of closed
+#polygons, each a (lon, lat) pair of arrays. Usually that's one polygon. A circle over the edge of the map
+#is cut in two, one piece on each side. A circle around a pole is a wave across the whole map, closed
+#along the top (or bottom) edge, so it can be filled.
+def map_polygons(center_lat, center_lon, radius, lon_min = -np.pi, step = RING_STEP):
+    lon_max = lon_min + TWOPI
+    #Put the center on the map, and the ring around it
+    center_on_map = (center_lon - lon_min) % TWOPI + lon_min
+    lat, lon = small_circle(center_lat, center_on_map, radius, step)
+    turns = int(np.rint((lon[-1] - lon[0]) / TWOPI))
+    if turns != 0:
+        #Around a pole, longitude only ever goes one way. Lay the ring end to end a few times so it
+        #spans the map, then cut it at the edges.
+        lon = np.concatenate([lon[:-1] + copy * turns * TWOPI for copy in (-1, 0, 1)])
+        lat = np.concatenate([lat[:-1]] * 3)
+        order = np.argsort(lon)
+        lon, lat = lon[order], lat[order]
+        keep = (lon > lon_min) & (lon < lon_max)
+        edge_lat = np.interp([lon_min, lon_max], lon, lat)
+        pole = HALFPI if center_lat > 0 else -HALFPI
+        lon = np.concatenate([[lon_min], lon[keep], [lon_max, lon_max, lon_min, lon_min]])
+        lat = np.concatenate([[edge_lat[0]], lat[keep], [edge_lat[1], pole, pole, edge_lat[0]]])
+        return [(lon, lat)]
+    if lon.max() > lon_max:
+        return [clip_ring(lon, lat, lon_max, True), clip_ring(lon - TWOPI, lat, lon_min, False)]
+    if lon.min() < lon_min:
+        return [clip_ring(lon, lat, lon_min, False), clip_ring(lon + TWOPI, lat, lon_max, True)]
+    return [(lon, lat)]
+
+#A line on a flat map whose longitude runs from lon_min to lon_min + period (radians, or degrees with
+#period 360), wrapped so it's one array however many times it goes around: wherever it crosses the edge
+#of the map, it runs to the edge, a NaN breaks it, and it carries on from the other edge. Meant for
+#plotting with connect='finite'. lon can be wrapped or continuous; steps between points have to be
+#less than half a turn.
+def break_at_wrap(lon, lat, lon_min = -np.pi, period = TWOPI):
+    lon = np.unwrap(np.asarray(lon, dtype=float), period=period)
+    lat = np.asarray(lat, dtype=float)
+    turn = np.floor((lon - lon_min) / period)
+    crossings = np.nonzero(np.diff(turn))[0]
+    eastward = turn[crossings + 1] > turn[crossings]
+    #Where each crossing meets the edge, in the same continuous longitude as the line
+    edge = lon_min + np.maximum(turn[crossings], turn[crossings + 1]) * period
+    fraction = (edge - lon[crossings]) / (lon[crossings + 1] - lon[crossings])
+    edge_lat = lat[crossings] + fraction * (lat[crossings + 1] - lat[crossings])
+    lon_max = lon_min + period
+    #To the edge on one side, a break, and from the edge on the other
+    new_lon = np.column_stack([np.where(eastward, lon_max, lon_min), np.full(len(crossings), np.nan),
+                               np.where(eastward, lon_min, lon_max)])
+    new_lat = np.column_stack([edge_lat, np.full(len(crossings), np.nan), edge_lat])
+    at = np.repeat(crossings + 1, 3)
+    return np.insert(lon - turn * period, at, new_lon.ravel()), np.insert(lat, at, new_lat.ravel())
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import load_tle
+from tle_catalog import TLECatalog
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+
+def bundled_tle(ID_number):
+    with open(os.path.join(REPO_DIR, str(ID_number) + ".tle")) as f:
+        return f.read().split("\n")[:2]
+
+class FakeResponse():
+    def __init__(self, text):
+        self.text = text
+    def raise_for_status(self):
+        pass
+
+#One fetch of a batch failing on the network doesn't lose the others: they are stored and returned,
+#and the failed ID falls back to the TLE the catalog already had
+def test_failed_fetch_keeps_rest_of_batch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    good = {25544: bundled_tle(25544), 20580: bundled_tle(20580)}
+    def fake_get(session, url, timeout = None):
+        assert timeout is not None
+        ID_number = int(url.split("CATNR=")[1])
+        if ID_number in good:
+            return FakeResponse("NAME\r\n" + good[ID_number][0] + "\r\n" + good[ID_number][1] + "\r\n")
+        raise requests.ConnectionError("connection reset")
+    monkeypatch.setattr(requests.Session, "get", fake_get)
+    catalog = TLECatalog(str(tmp_path / "catalog.db"))
+    #An old TLE of the satellite whose fetch fails, stored long ago so it's stale
+    older = bundled_tle(51850)
+    catalog.upsert({51850: older}, fetched=0)
+
+    tles = load_tle.get_tles([25544, 51850, 20580, 99998], catalog=catalog)
+    assert tles == {25544: good[25544], 51850: older, 20580: good[20580]}
+    assert catalog.get_many([25544, 20580, 99998]) == good
@@ -0,0 +1,31 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+from tle_catalog import TLECatalog, tle_epoch
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+
+def bundled_tle(ID_number):
+    with open(os.path.join(REPO_DIR, str(ID_number) + ".tle")) as f:
+        return f.read().split("\n")[:2]
+
+#A legacy .tle file freshly copied (mtime now) but with an old epoch must still be refetched
+def test_imported_file_with_recent_mtime_is_stale(tmp_path):
+    tle = bundled_tle(25544)
+    file_path = tmp_path / "25544.tle"
+    file_path.write_text("\n".join(tle) + "\n")
+    now = time.time()
+    os.utime(file_path, (now, now))
+    catalog = TLECatalog(str(tmp_path / "catalog.db"))
+    assert catalog.import_tle_file(25544, str(tmp_path)) == tle
+    assert tle_epoch(tle[0]) < now - 3 * 86400
+    assert catalog.stale_ids([25544], 3, now) == [25544]
+
+#A real fetch does hold off the next one, even for an old epoch
+def test_recent_fetch_is_fresh(tmp_path):
+    catalog = TLECatalog(str(tmp_path / "catalog.db"))
+    now = time.time()
+    catalog.upsert({25544: bundled_tle(25544)}, fetched=now)
+    assert catalog.stale_ids([25544], 3, now) == []
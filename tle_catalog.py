@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+#Celestrak asks that the same object not be re-downloaded more often than this, and a TLE
+#that is old on Celestrak's side too (a decayed object, say) shouldn't be re-fetched on every start.
+MIN_REFETCH_SECONDS = 2 * 3600
+
+#Parse the epoch field of TLE line 1 (YYDDD.DDDDDDDD) into a unix timestamp.
+#Two-digit years follow the TLE convention: 57-99 are 1957-1999, 00-56 are 2000-2056.
+def tle_epoch(line1):
+    two_digit_year = int(line1[18:20])
+    year = (1900 if two_digit_year >= 57 else 2000) + two_digit_year
+    day_of_year = float(line1[20:32])
+    epoch = datetime(year, 1, 1, tzinfo=timezone.utc) + timedelta(days=day_of_year - 1)
+    return epoch.timestamp()
+
+#Whether tle looks like a TLE: two lines, starting "1 " and "2 ". Celestrak answers an unknown or
+#decayed catalog number with "No GP data found" (or nothing) instead.
+def valid_tle(tle):
+    return (len(tle) == 2 and all(isinstance(line, str) for line in tle)
+            and tle[0].startswith("1 ") and tle[1].startswith("2 "))
+
+# One SQLite file holding every TLE we know about, indexed by catalog number, with the parsed epoch
+# and the time it was fetched. Replaces keeping a separate <ID>.tle file for every satellite.
+class TLECatalog():
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS tles (
+                                   catnr INTEGER PRIMARY KEY,
+                                   line1 TEXT NOT NULL,
+                                   line2 TEXT NOT NULL,
+                                   epoch REAL NOT NULL,
+                                   fetched REAL NOT NULL)""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS tles_epoch ON tles (epoch)")
+        self.connection.commit()
+
+    #Returns the TLE for one catalog number as a list of its two lines, or None if we don't have it
+    def get(self, catnr):
+        row = self.connection.execute("SELECT line1, line2 FROM tles WHERE catnr = ?", (int(catnr),)).fetchone()
+        return list(row) if row is not None else None
+
+    #Returns {catnr: TLE} for whichever of the catalog numbers are stored
+    def get_many(self, catnrs):
+        found = {}
+        for catnr, line1, line2 in self._query_ids("SELECT t.catnr, t.line1, t.line2 FROM tles t", catnrs):
+            found[catnr] = [line1, line2]
+        return found
+
+    #Of the given catalog numbers, return those which are missing, or whose TLE epoch is more than
+    #acceptable_age days before now (and which haven't been re-fetched very recently).
+    def stale_ids(self, catnrs, acceptable_age, now = None):
+        now = time.time() if now is None else now
+        fresh = set()
+        query = "SELECT t.catnr FROM tles t"
+        condition = "t.epoch >= ? OR t.fetched >= ?"
+        for (catnr,) in self._query_ids(query, catnrs, condition, (now - acceptable_age * 86400, now - MIN_REFETCH_SECONDS)):
+            fresh.add(catnr)
+        return [c for c in catnrs if int(c) not in fresh]
+
+    #Insert or replace many TLEs at once. tles is {catnr: [line1, line2]}. Anything that isn't a valid
+    #TLE is left out, without stopping the rest being stored; the catalog numbers left out are returned.
+    def upsert(self, tles, fetched = None):
+        fetched = time.time() if fetched is None else fetched
+        rows = [(int(catnr), tle[0], tle[1], tle_epoch(tle[0]), fetched) for catnr, tle in tles.items() if valid_tle(tle)]
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO tles VALUES (?, ?, ?, ?, ?)", rows)
+        return [catnr for catnr, tle in tles.items() if not valid_tle(tle)]
+
+    #Pull an old-style <ID>.tle file into the catalog, if one exists. Returns the TLE, or None.
+    #It is stored as never fetched: a file's mtime says nothing about when its TLE came from Celestrak
+    #(a fresh clone makes them all "now"), and only a real fetch should hold off the next one.
+    def import_tle_file(self, catnr, directory = "."):
+        file_path = os.path.join(directory, str(catnr) + ".tle")
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path) as f:
+            loaded_tle = f.read().split("\n")[:2]
+        if len(self.upsert({catnr: loaded_tle}, fetched=0)) > 0:
+            return None
+        return loaded_tle
+
+    #Run a query restricted to a (possibly very long) list of catalog numbers, by joining against
+    #a temporary table rather than building a huge IN (...) clause.
+    def _query_ids(self, select, catnrs, condition = None, params = ()):
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (catnr INTEGER PRIMARY KEY)")
+        self.connection.execute("DELETE FROM wanted")
+        self.connection.executemany("INSERT OR IGNORE INTO wanted VALUES (?)", [(int(c),) for c in catnrs])
+        query = select + " JOIN wanted w ON w.catnr = t.catnr"
+        if condition is not None:
+            query += " WHERE " + condition
+        return self.connection.execute(query, params).fetchall()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM tles").fetchone()[0]
@@ -0,0 +1,87 @@
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5 import QtCore
+
+#How many long computations can run at the same time
+MAX_WORKERS = 4
+
+# Lives on the Qt main thread. Worker threads emit its signal, and Qt queues the call
+# so that results are always handed to modules on the main thread.
+class ResultRelay(QtCore.QObject):
+    finished = QtCore.pyqtSignal(object, object, object) #job, result, error
+
+# One piece of work submitted by a module
+class ComputeJob():
+    def __init__(self, key, function, args, on_result, on_cancel, follows_time):
+        self.key = key
+        self.function = function
+        self.args = args
+        self.on_result = on_result
+        self.on_cancel = on_cancel
+        self.follows_time = follows_time
+        self.cancelled = False
+        self.future = None
+
+# Runs long computations (pass searches, access windows, eclipse timelines...) off the Qt main thread,
+# so the window keeps painting while they run. Results come back through a Qt signal.
+class ComputeWorkers():
+    def __init__(self, max_workers = MAX_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.relay = ResultRelay()
+        self.relay.finished.connect(self.deliver)
+        #The latest job for each key. Submitting with a key that is in use replaces the old job.
+        self.jobs = {}
+
+    #Run function(*args) in the background, then on_result(result) on the main thread.
+    #Jobs with follows_time=True depend on globaltime: when globaltime jumps they are cancelled,
+    #and on_cancel() is called (on the main thread) so the module can resubmit for the new time.
+    def submit(self, key, function, on_result, *args, on_cancel = None, follows_time = False):
+        self.cancel(key)
+        job = ComputeJob(key, function, args, on_result, on_cancel, follows_time)
+        self.jobs[key] = job
+        job.future = self.executor.submit(self.run, job)
+        return job
+
+    def run(self, job):
+        if job.cancelled:
+            return
+        try:
+            result = job.function(*job.args)
+            self.relay.finished.emit(job, result, None)
+        except Exception:
+            self.relay.finished.emit(job, None, traceback.format_exc())
+
+    def deliver(self, job, result, error):
+        #Anything cancelled or replaced while it was running is thrown away
+        if job.cancelled or self.jobs.get(job.key) is not job:
+            return
+        del self.jobs[job.key]
+        if error is not None:
+            print("Background job " + str(job.key) + " failed:")
+            print(error)
+            return
+        job.on_result(result)
+
+    #A job that hasn't started yet never runs. One that is already running finishes, but its result is dropped.
+    def cancel(self, key):
+        job = self.jobs.pop(key, None)
+        if job is not None:
+            job.cancelled = True
+            job.future.cancel()
+        return job
+
+    def is_pending(self, key):
+        return key in self.jobs
+
+    #Called by the scheduler when globaltime jumps
+    def time_jumped(self):
+        for key, job in list(self.jobs.items()):
+            if job.follows_time:
+                self.cancel(key)
+                if job.on_cancel is not None:
+                    job.on_cancel()
+
+    def shutdown(self):
+        for key in list(self.jobs):
+            self.cancel(key)
+        self.executor.shutdown(wait=False, cancel_futures=True)